@@ -4,3 +4,5 @@ datetime=`date +%Y-%m-%d_%H-%M`
 python $report_base/mysql_watcher.py -p $report_base/dbset101.ini  -s html>$report_base/mysql_watcher101_$datetime.html
 python $report_base/mysql_watcher.py -p $report_base/dbset102.ini  -s html>$report_base/mysql_watcher102_$datetime.html
 python $report_base/SendEmail.py -p $report_base/emailset101.ini -f $report_base/mysql_watcher101_$datetime.html,$report_base/mysql_watcher102_$datetime.html
+#or collect every instance at once, one report per dbset file, at most 8 instances in parallel:
+#python3 $report_base/mysql_watcher3.py -f $report_base/dbset101.ini,$report_base/dbset102.ini -s html -o $report_base -n 8
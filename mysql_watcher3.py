@@ -9,6 +9,7 @@
 import getopt
 import sys
 import MySQLdb
+import MySQLdb.cursors
 import configparser
 import math
 import time
@@ -17,9 +18,26 @@ import prettytable
 import psutil
 import platform
 import glob
+import multiprocessing
+import sqlite3
+import gzip
+import json
+import hashlib
+import heapq
+import csv
+import io
+import resource
+from decimal import Decimal
+from array import array
 import re
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
 from collections import OrderedDict
 from collections import namedtuple
+from collections import deque
 from warnings import filterwarnings
 
 filterwarnings('ignore', category = MySQLdb.Warning)
@@ -28,6 +46,38 @@ tab1="="
 tab2="*"
 linesize=104
 
+# one report section: fn(conn, *args) when needs_conn, else fn(*args)
+# deferred sections close the sampling window and run after all the others
+Job = namedtuple('Job', ['fn', 'args', 'needs_conn', 'deferred', 'cost', 'name'], defaults=[False, 'light', None])
+# what one job cost the watcher: seconds spent in total (the sampling window sleep of a deferred
+# section left out) and waiting on the server, rows fetched and bytes rendered
+SelfCost = namedtuple('SelfCost', ['name', 'wall', 'query', 'rows', 'bytes'])
+self_cost = threading.local()
+
+# catalog entry of one report section, see SECTIONS:
+# option      dbset.ini [option] key, ON or a topN number enables it
+# query/style sql and column style of a plain query section, {db} {topN} {perfor_or_infor} are filled in
+# fn/args     collector for the other sections, args are names of report values passed after conn
+# begin       called (with conn when needs_conn) when the report starts, its result is passed to fn before args;
+#             begin_args are names of report values passed to it after conn; sections with the same begin and
+#             begin_args share one call and its result; a begin that starts a sampler thread returns a tuple
+#             ending in (stop event, thread) so that the thread is stopped when its section is shed
+# min_version/max_version/needs_sys/formats  when the section can run at all
+# cost        light, medium or heavy, heavy sections are started first
+# cacheable   result changes slowly and may be served from a local cache for <option>_ttl/cache_ttl seconds
+# units       {column: 'time'|'bytes'|'text'} of a sys section, with fast_path ON its sys.x$ view is read
+#             instead and those columns are formatted when rendered
+Section = namedtuple('Section', ['option', 'title', 'query', 'style', 'min_version', 'max_version', 'needs_sys', 'cost',
+                                 'cacheable', 'formats', 'fn', 'args', 'needs_conn', 'begin', 'deferred', 'units',
+                                 'begin_args'],
+                     defaults=[None, None, None, None, False, 'light', False, None, None, (), True, None, False, None,
+                               ()])
+
+COST_ORDER = {'heavy': 0, 'medium': 1, 'light': 2}
+
+# query interrupted, MAX_EXECUTION_TIME exceeded, MariaDB max_statement_time exceeded
+TIMEOUT_ERRORS = (1317, 3024, 1969)
+
 SYS_PARM_FILTER = (
     'autocommit',
     'binlog_cache_size',
@@ -165,14 +215,39 @@ SYS_PARM_FILTER = (
     'show_compatibility_56'
 )
 
+def f_get_option(config, name, default):
+    if config.has_option("option", name):
+        return config.get("option", name)
+    return default
+
+def f_get_dbinfo(config):
+    #host,user,passwd,db,port
+    return [config.get("database","host"), config.get("database","user"), config.get("database","passwd"),
+            config.get("database","db"), config.get("database", "port")]
+
+def f_connect(dbinfo):
+    return MySQLdb.connect(host=dbinfo[0],user=dbinfo[1],passwd=dbinfo[2],db=dbinfo[3],port=int(dbinfo[4]))
+
 def f_get_conn(dbinfo):
     try:
-        conn = MySQLdb.connect(host=dbinfo[0],user=dbinfo[1],passwd=dbinfo[2],db=dbinfo[3],port=int(dbinfo[4]))
+        conn = f_connect(dbinfo)
         return conn
     except MySQLdb.Error as e:
         print ("Error %d: %s" % (e.args[0], e.args[1]))
         sys.exit(1)
 
+def f_get_conn_pool(conn, dbinfo, size):
+    # the main connection serves as the first pool member
+    pool = queue.Queue()
+    pool.put(conn)
+    for i in range(size - 1):
+        pool.put(f_get_conn(dbinfo))
+    return pool
+
+def f_close_conn_pool(pool):
+    while not pool.empty():
+        pool.get().close()
+
 def f_get_query_value(conn, query):
     cursor = conn.cursor()
     getNum = cursor.execute(query)
@@ -183,89 +258,454 @@ def f_get_query_value(conn, query):
     cursor.close()
     return result[0]
 
+def f_count_query(start, rows):
+    # charge the server time and rows to the job running in this thread
+    if getattr(self_cost, 'query', None) is not None:
+        self_cost.query += time.time() - start
+        self_cost.rows += rows
+
 def f_get_query_record(conn, query):
+    start = time.time()
     cursor = conn.cursor()
     cursor.execute(query)
     records = cursor.fetchall()
     cursor.close()
+    f_count_query(start, len(records))
     return records
 
+def f_iter_query_record(conn, query, size=1000):
+    # rows are streamed from the server and rendered in batches instead of one fetchall()
+    cursor = conn.cursor(MySQLdb.cursors.SSCursor)
+    try:
+        start = time.time()
+        cursor.execute(query)
+        f_count_query(start, 0)
+        while True:
+            start = time.time()
+            records = cursor.fetchmany(size)
+            f_count_query(start, len(records))
+            if not records:
+                break
+            for record in records:
+                yield record
+    finally:
+        cursor.close()
+
 def f_print_title(title):
     print ()
     print (int((linesize-4)/2 - int(len(title)/2)) * tab1, title, int((linesize-4)/2+1 - int(len(title)/2)) * tab1)
     print ()
 
+def f_parse_style(style):
+    # style values are 'name,align' or 'name,width,align', parsed once per table
+    columns = []
+    for k in sorted(style.keys()):
+        v = style[k].split(',')
+        columns.append((v[0], int(v[1]) if len(v) > 2 else 0, v[-1]))
+    return columns
+
+def f_write_lines(lines, rows_per_chunk=1000):
+    # write rendered rows in chunks instead of one call per cell
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= rows_per_chunk:
+            sys.stdout.write(''.join(chunk))
+            chunk = []
+    if chunk:
+        sys.stdout.write(''.join(chunk))
+
 def f_print_table_body(rows, style,tab):
-    for row in rows:
-        k = 0
-        for col in row:
-            k += 1
-            print (tab,end='')
-            if style[k].split(',')[2] == 'l':
-                print (str(col).ljust(int(style[k].split(',')[1])),end='')
-            elif style[k].split(',')[2] == 'r':
-                print (str(col).rjust(int(style[k].split(',')[1])),end='')
-            else:
-                print (str(col).center(int(style[k].split(',')[1])),end='')
-        print (tab)
+    columns = f_parse_style(style)
+    def lines():
+        for row in rows:
+            cells = []
+            for (name, width, align), col in zip(columns, row):
+                if align == 'l':
+                    cells.append(tab + str(col).ljust(width))
+                elif align == 'r':
+                    cells.append(tab + str(col).rjust(width))
+                else:
+                    cells.append(tab + str(col).center(width))
+            yield ''.join(cells) + tab + '\n'
+    f_write_lines(lines())
 
 def f_print_table_txt(rows, title, style):
-    field_names = []
+    columns = f_parse_style(style)
     f_print_title(title)
     table = prettytable.PrettyTable()
-    for k in style.keys():
-        field_names.append(style[k].split(',')[0])
-    table.field_names = field_names
-    for k in style.keys():
-        table.align[style[k].split(',')[0]] = style[k].split(',')[1]
+    table.field_names = [name for name, width, align in columns]
+    for name, width, align in columns:
+        table.align[name] = align
     for row in rows:
         table.add_row(row)
     print (table)
 
 def f_print_table_html(rows, title, style):
-    print ("""<p /><h3 class="awr"><a class="awr" name="99999"></a>""" + title + "</h3><p />")
-    print ("""<table border="1">""")
-
-    print ("""<tr>""",end='')
-    for k in style.keys():
-        v = style[k]
-        print ("""<th class="awrbg">""",end='')
-        print (v.split(',')[0],end='')
-        print ("""</th>""",end='')
-    print ("""</tr>""")
-
-    linenum = 0
-    for row in rows:
-        k = 0
-        linenum += 1
-        print ("<tr>",end='')
-        if linenum % 2 == 0:
-            classs='awrc'
-        else:
-            classs='awrnc'
-
-        for col in row:
-            k += 1
-            if style[k].split(',')[1] == 'r':
-                print ("""<td align="right" class='"""+classs+"'>"+str(col)+"</td>",end='')
-            else:
-                print ("""<td class='"""+classs+"'>"+str(col)+"</td>",end='')
-        print ("</tr>")
+    columns = f_parse_style(style)
+    sys.stdout.write("""<p /><h3 class="awr"><a class="awr" name="99999"></a>""" + title + "</h3><p />\n")
+    sys.stdout.write("""<table border="1">\n""")
+    sys.stdout.write("<tr>" + ''.join("""<th class="awrbg">""" + name + "</th>" for name, width, align in columns) + "</tr>\n")
+    cells = [("""<td align="right" class='""" if align == 'r' else """<td class='""") for name, width, align in columns]
+    def lines():
+        linenum = 0
+        for row in rows:
+            linenum += 1
+            classs = "awrc'>" if linenum % 2 == 0 else "awrnc'>"
+            yield "<tr>" + ''.join(cell + classs + str(col) + "</td>" for cell, col in zip(cells, row)) + "</tr>\n"
+    f_write_lines(lines())
     print ("""</table>
 <br /><a class="awr" href="#top">Back to Top</a>
 <p />
 <p />
         """)
 
+def f_native(value):
+    # numbers stay numbers in the machine readable formats
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return str(value)
+
+def f_record_names(columns):
+    # record keys for a table, repeated column names get their position appended
+    names = []
+    for i, (name, width, align) in enumerate(columns):
+        names.append(name + '_' + str(i + 1) if name in names or name == 'section' else name)
+    return names
+
+def f_print_table_json(rows, title, style, save_as):
+    # one record per row; json rows follow the header record written by f_print_document_begin
+    names = f_record_names(f_parse_style(style))
+    prefix = ',\n' if save_as == 'json' else ''
+    suffix = '' if save_as == 'json' else '\n'
+    def lines():
+        for row in rows:
+            record = OrderedDict([('section', title)])
+            record.update(zip(names, map(f_native, row)))
+            yield prefix + json.dumps(record, ensure_ascii=False) + suffix
+    f_write_lines(lines())
+
+def f_print_table_csv(rows, title, style):
+    # a header line per table, the first column names the section
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator='\n')
+    def lines():
+        for row in rows:
+            writer.writerow([title] + [f_native(col) for col in row])
+            line = buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            yield line
+    # blank separator and header first, so that a section without rows still shows up
+    writer.writerow([])
+    writer.writerow(['section'] + f_record_names(f_parse_style(style)))
+    sys.stdout.write(buf.getvalue())
+    buf.seek(0)
+    buf.truncate()
+    f_write_lines(lines())
+
 def f_print_table(rows,title,style,save_as):
     if save_as == "txt":
         f_print_table_txt(rows, title, style)
     elif save_as == "html":
         f_print_table_html(rows, title, style)
+    elif save_as in ("json", "ndjson"):
+        f_print_table_json(rows, title, style, save_as)
+    elif save_as == "csv":
+        f_print_table_csv(rows, title, style)
+
+def f_print_document_begin(save_as):
+    if save_as == "json":
+        sys.stdout.write('[' + json.dumps({'section': 'MySQL Watcher', 'version': '1.3.0', 'time': time.strftime('%Y-%m-%d %H:%M:%S')}))
+
+def f_print_document_end(save_as):
+    if save_as == "json":
+        sys.stdout.write('\n]\n')
+
+def f_kill_query(dbinfo, thread_id, state):
+    # watchdog: interrupt the section query from a side connection
+    with state['lock']:
+        if state['done']:
+            return
+        try:
+            side = f_connect(dbinfo)
+            try:
+                f_get_query_record(side, "KILL QUERY " + str(int(thread_id)))
+            finally:
+                side.close()
+        except MySQLdb.Error:
+            pass
+
+def f_get_limited_records(conn, query, limits):
+    # limits = (timeout seconds, dbinfo, server has MAX_EXECUTION_TIME); rows stream like
+    # f_iter_query_record while the KILL QUERY watchdog stays armed until the last one is read
+    timeout, dbinfo, max_execution_time = limits
+    grace = 0
+    if max_execution_time:
+        query = re.sub(r'^\s*SELECT', 'SELECT /*+ MAX_EXECUTION_TIME(' + str(int(timeout * 1000)) + ') */', query,
+                       count=1, flags=re.I)
+        grace = 2
+    state = {'lock': threading.Lock(), 'done': False}
+    killer = threading.Timer(timeout + grace, f_kill_query, (dbinfo, conn.thread_id(), state))
+    killer.daemon = True
+    killer.start()
+    try:
+        for record in f_iter_query_record(conn, query):
+            yield record
+    finally:
+        with state['lock']:
+            state['done'] = True
+        killer.cancel()
+
+def f_get_section_records(conn, query, limits):
+    if limits and limits[0] > 0:
+        return f_get_limited_records(conn, query, limits)
+    return f_iter_query_record(conn, query)
+
+def f_print_timed_out(title, limits, save_as):
+    f_print_table([["timed out after %gs" % limits[0]]], title, {1: 'note,l'}, save_as)
+
+def f_format_statement(text, length=64):
+    # same shortening as sys.format_statement() with the default statement_truncate_len
+    text = str(text or '')
+    if len(text) <= length:
+        return text
+    half = (length - 5) // 2
+    return text[:half] + ' ... ' + text[-half:]
+
+UNIT_FORMATS = {'time': lambda value: f_format_time(value), 'bytes': lambda value: f_format_bytes(value),
+                'text': f_format_statement}
+
+def f_format_units(rows, units, save_as):
+    # raw x$ values are formatted for people only, json/ndjson/csv keep the numbers
+    if save_as not in ("txt", "html"):
+        return rows
+    formats = [(column - 1, UNIT_FORMATS[unit]) for column, unit in sorted(units.items())]
+    def formatted():
+        for row in rows:
+            row = list(row)
+            for i, fmt in formats:
+                if row[i] is not None:
+                    row[i] = fmt(row[i])
+            yield row
+    return formatted()
+
+def f_fast_query(query):
+    # sys.<view> -> sys.x$<view>: same columns with picoseconds and bytes as numbers
+    return re.sub(r'\bsys\.(?!x\$)(\w+)', r'sys.x$\1', query)
+
+def f_print_query_table(conn, title, query, style,save_as,limits=None,units=None):
+    try:
+        rows = f_get_section_records(conn, query, limits)
+        if units:
+            rows = f_format_units(rows, units, save_as)
+        f_print_table(rows,title,style,save_as)
+    except MySQLdb.Error as e:
+        if e.args[0] not in TIMEOUT_ERRORS or not limits:
+            raise
+        f_print_timed_out(title, limits, save_as)
+
+def f_print_cached_query_table(conn, title, query, style, save_as, state_dir, key, ttl, limits=None):
+    # rows are reused for ttl seconds without touching the server: on a large data dictionary even
+    # a fingerprint of information_schema.tables costs about as much as the section itself
+    cache = f_load_state(state_dir, 'cache_' + key)
+    age = time.time() - cache.get('time', 0)
+    if age < ttl and 'rows' in cache:
+        f_print_table(cache['rows'], title + ' (cached ' + f_sec2dhms(age) + ' ago)', style, save_as)
+        return
+    try:
+        rows = [[col if col is None or isinstance(col, (int, float, str)) else str(col) for col in row]
+                for row in f_get_section_records(conn, query, limits)]
+    except MySQLdb.Error as e:
+        if e.args[0] not in TIMEOUT_ERRORS or not limits:
+            raise
+        f_print_timed_out(title, limits, save_as)
+        return
+    f_save_state(state_dir, 'cache_' + key, {'time': time.time(), 'rows': rows})
+    f_print_table(rows, title, style, save_as)
 
-def f_print_query_table(conn, title, query, style,save_as):
-    rows = f_get_query_record(conn, query)
-    f_print_table(rows,title,style,save_as)
+def f_get_query_dicts(conn, query):
+    # rows as {column: value}, for SHOW statements whose columns differ between versions
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query)
+        names = [col[0] for col in cursor.description or ()]
+        return [dict(zip(names, record)) for record in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+def f_get_replica_lag(conn, replica_status):
+    # seconds behind the source (the worst channel), None when this is not a replica or the SQL thread is stopped
+    lags = [status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+            for status in f_get_query_dicts(conn, replica_status)]
+    lags = [int(lag) for lag in lags if lag is not None]
+    return max(lags) if lags else None
+
+def f_check_load(conn, guard, failed):
+    # why the server is too busy for an expensive section right now, None if it is not;
+    # a check the server refuses (e.g. no REPLICATION CLIENT) counts as passed and is added to failed
+    if guard['threads_running'] > 0:
+        try:
+            threads_running = int(f_get_query_record(conn, "SHOW GLOBAL STATUS LIKE 'Threads_running'")[0][1])
+            if threads_running > guard['threads_running']:
+                return 'Threads_running ' + str(threads_running) + ' > ' + str(guard['threads_running'])
+        except MySQLdb.Error as e:
+            failed.append('Threads_running check failed: ' + str(e))
+    if guard['replica_lag'] > 0:
+        try:
+            lag = f_get_replica_lag(conn, guard['replica_status'])
+            if lag is not None and lag > guard['replica_lag']:
+                return 'replica lag ' + str(lag) + 's > ' + str(guard['replica_lag']) + 's'
+        except MySQLdb.Error as e:
+            failed.append('replica lag check failed: ' + str(e))
+    if guard['load_per_cpu'] > 0:
+        load = os.getloadavg()[0] / (psutil.cpu_count() or 1)
+        if load > guard['load_per_cpu']:
+            return 'load %.2f per cpu > %g' % (load, guard['load_per_cpu'])
+    return None
+
+def f_stop_sampler(begin_result):
+    # a begin hook that starts a sampler thread returns a tuple ending in (stop event, thread)
+    if isinstance(begin_result, tuple) and len(begin_result) >= 2 and isinstance(begin_result[-2], threading.Event):
+        begin_result[-2].set()
+        begin_result[-1].join()
+
+def f_print_guarded(conn, guard, shed, failed, title, style, save_as, state_dir, key, job):
+    # run job unless the server is stressed, then fall back to stale cached rows or skip it;
+    # checks the server refused are added to failed
+    reason = f_check_load(conn, guard, failed)
+    if reason is None:
+        if job.needs_conn:
+            job.fn(conn, *job.args)
+        else:
+            job.fn(*job.args)
+        return
+    if job.deferred and job.args:
+        f_stop_sampler(job.args[0])
+    cache = f_load_state(state_dir, 'cache_' + key) if key else {}
+    if 'rows' in cache:
+        shed.append((job.name, 'stale cache', reason))
+        age = time.time() - cache.get('time', 0)
+        f_print_table(cache['rows'], title + ' (stale, cached ' + f_sec2dhms(age) + ' ago)', style, save_as)
+    else:
+        shed.append((job.name, 'skipped', reason))
+        f_print_table([["skipped: " + reason]], title, {1: 'note,l'}, save_as)
+
+REPLICATION_SAMPLE_PERIOD = 1.0
+
+def f_count_gtids(gtid_set):
+    # number of transactions in a GTID set like 'uuid:1-100:105,uuid2:1-5'
+    total = 0
+    for member in (gtid_set or '').replace('\n', '').split(','):
+        for interval in member.strip().split(':')[1:]:
+            if interval and interval[0].isdigit():
+                low, _, high = interval.partition('-')
+                total += int(high or low) - int(low) + 1
+    return total
+
+def f_get_replication_sample(conn, replica_status):
+    # {channel: (time, lag or None, relay log bytes, unapplied bytes or None, executed gtids, exec position)}, {(channel, worker): row}
+    sample = {}
+    now = time.time()
+    for status in f_get_query_dicts(conn, replica_status):
+        get = lambda source, master: status.get(source, status.get(master))
+        lag = get('Seconds_Behind_Source', 'Seconds_Behind_Master')
+        read_file, exec_file = get('Source_Log_File', 'Master_Log_File'), get('Relay_Source_Log_File', 'Relay_Master_Log_File')
+        read_pos, exec_pos = int(get('Read_Source_Log_Pos', 'Read_Master_Log_Pos') or 0), int(get('Exec_Source_Log_Pos', 'Exec_Master_Log_Pos') or 0)
+        sample[status.get('Channel_Name') or ''] = (now, None if lag is None else int(lag), int(status.get('Relay_Log_Space') or 0),
+                                                   read_pos - exec_pos if read_file == exec_file else None,
+                                                   f_count_gtids(status.get('Executed_Gtid_Set')), (exec_file, exec_pos))
+    workers = {}
+    if sample:
+        try:
+            for row in f_get_query_dicts(conn, "SELECT * FROM performance_schema.replication_applier_status_by_worker"):
+                workers[(row.get('CHANNEL_NAME') or '', row.get('WORKER_ID'))] = row
+        except MySQLdb.Error:
+            pass
+    return sample, workers
+
+def f_add_worker_sample(applied, workers):
+    # per worker: transactions seen applied, longest apply time in seconds, last applied transaction
+    for key, row in workers.items():
+        last = row.get('LAST_APPLIED_TRANSACTION', row.get('LAST_SEEN_TRANSACTION')) or ''
+        entry = applied.setdefault(key, [set(), 0.0, ''])
+        if last:
+            entry[0].add(last)
+            entry[2] = last
+        begin, end = row.get('LAST_APPLIED_TRANSACTION_START_APPLY_TIMESTAMP'), row.get('LAST_APPLIED_TRANSACTION_END_APPLY_TIMESTAMP')
+        if begin and end and hasattr(end, 'year') and end.year > 1970:
+            entry[1] = max(entry[1], (end - begin).total_seconds())
+
+def f_sample_replication(dbinfo, samples, applied, errors, period, stop):
+    # runs on its own connection so that no pooled connection is held for the sampling window
+    try:
+        conn = f_connect(dbinfo)
+    except MySQLdb.Error as e:
+        errors.append(str(e))
+        return
+    try:
+        try:
+            replica_status = "SHOW REPLICA STATUS"
+            sample, workers = f_get_replication_sample(conn, replica_status)
+        except MySQLdb.Error:
+            replica_status = "SHOW SLAVE STATUS"
+            sample, workers = f_get_replication_sample(conn, replica_status)
+        while sample:
+            samples.append(sample)
+            f_add_worker_sample(applied, workers)
+            if stop.wait(period):
+                break
+            sample, workers = f_get_replication_sample(conn, replica_status)
+    except MySQLdb.Error as e:
+        errors.append(str(e))
+    finally:
+        conn.close()
+
+def f_start_replication_sampler(dbinfo):
+    samples, applied, errors = [], {}, []
+    stop = threading.Event()
+    sampler = threading.Thread(target=f_sample_replication,
+                               args=(dbinfo, samples, applied, errors, REPLICATION_SAMPLE_PERIOD, stop))
+    sampler.daemon = True
+    sampler.start()
+    return samples, applied, errors, stop, sampler
+
+def f_print_replication_lag(replication_sampler, start, interval, save_as):
+    samples, applied, errors, stop, sampler = replication_sampler
+    interval = f_wait_interval(start, interval)
+    stop.set()
+    sampler.join()
+    title = "Replication lag"
+    if not samples:
+        f_print_table([[errors[0] if errors else "not a replica"]], title, {1: 'note,l'}, save_as)
+        return
+
+    rows = []
+    for channel in sorted(samples[0]):
+        series = [s[channel] for s in samples if channel in s]
+        first, last = series[0], series[-1]
+        seconds = max(last[0] - first[0], 0.001)
+        for name, values in (('lag s', [s[1] for s in series if s[1] is not None]),
+                             ('relay log bytes', [s[2] for s in series]),
+                             ('unapplied bytes', [s[3] for s in series if s[3] is not None])):
+            if values:
+                rows.append([channel, name, min(values), round(sum(values) / float(len(values)), 2), max(values), len(values)])
+        if last[4] or first[4]:
+            rows.append([channel, 'applied GTIDs/s', '', round((last[4] - first[4]) / seconds, 2), '', len(series)])
+        elif last[5][0] == first[5][0]:
+            rows.append([channel, 'applied binlog bytes/s', '', round((last[5][1] - first[5][1]) / seconds, 2), '', len(series)])
+    style = {1: 'channel,l', 2: 'metric,l', 3: 'min,r', 4: 'avg,r', 5: 'max,r', 6: 'samples,r'}
+    f_print_table(rows, title + " every " + '%gs' % REPLICATION_SAMPLE_PERIOD + " in last " + str(interval) + "s", style, save_as)
+
+    if len(applied) > 1:
+        rows = [[channel, worker, len(entry[0]), round(entry[1], 3), entry[2]]
+                for (channel, worker), entry in sorted(applied.items(), key=lambda item: item[1][1], reverse=True)]
+        style = {1: 'channel,l', 2: 'worker,r', 3: 'trx_seen,r', 4: 'max_apply_s,r', 5: 'last_applied,l'}
+        f_print_table(rows, "Replication workers, slowest first", style, save_as)
 
 def f_is_sys_schema_exist(conn):
     query = "SHOW DATABASES"
@@ -287,24 +727,78 @@ def f_print_optimizer_switch(conn,save_as,perfor_or_infor):
         rows.append([col.split('=')[0],col.split('=')[1]])
     f_print_table(rows, title, style,save_as)
 
-def f_print_log_error(conn,perfor_or_infor,save_as):
+def f_load_state(state_dir, name):
+    state_file = os.path.join(state_dir, re.sub(r'[^A-Za-z0-9_.-]', '_', name) + '.json')
+    if os.path.exists(state_file):
+        with open(state_file) as f:
+            return json.load(f)
+    return {}
+
+def f_save_state(state_dir, name, state):
+    if not os.path.isdir(state_dir):
+        os.makedirs(state_dir)
+    state_file = os.path.join(state_dir, re.sub(r'[^A-Za-z0-9_.-]', '_', name) + '.json')
+    with open(state_file + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(state_file + '.tmp', state_file)
+
+def f_get_file_head(f, stat):
+    # first bytes of the file, tells a rewritten file from an appended one
+    f.seek(0)
+    return hashlib.md5(f.read(min(stat.st_size, 256))).hexdigest()
+
+def f_open_incremental(filename, state):
+    # open filename positioned after what the previous run already read;
+    # rotation (new inode) and truncation start over from the beginning
+    f = open(filename, 'rb')
+    stat = os.fstat(f.fileno())
+    head = f_get_file_head(f, stat)
+    if (state.get('inode') != stat.st_ino or state.get('offset', 0) > stat.st_size
+            or state.get('head') != head and state.get('offset', 0) >= 256):
+        state.clear()
+    state['inode'] = stat.st_ino
+    state['head'] = head
+    f.seek(state.get('offset', 0))
+    return f
+
+def f_read_new_lines(f, state):
+    # complete lines only, a partial last line is read again next run
+    offset = state.get('offset', 0)
+    for line in f:
+        if not line.endswith(b'\n'):
+            break
+        offset += len(line)
+        yield line.decode('utf-8', 'replace')
+    state['offset'] = offset
+
+def f_print_log_error(conn,perfor_or_infor,state_dir,save_as):
     title = "Log file Statistics"
     style = {1: 'start & shutdown:,l'}
     rows =[]
-    WarnLog = 0
-    ErrLog  = 0
     query = "SELECT variable_value FROM " + perfor_or_infor + ".global_variables where variable_name ='log_error'"
     filename = f_get_query_value(conn, query)
     if os.path.exists(filename):
-        with open(filename, 'r') as f:
-            for line in f:
+        state = f_load_state(state_dir, 'log_error_' + filename)
+        with f_open_incremental(filename, state) as f:
+            events = state.get('events', [])
+            WarnLog = state.get('warnings', 0)
+            ErrLog = state.get('errors', 0)
+            for line in f_read_new_lines(f, state):
                 if ('ready for connections' in line or 'Shutdown completed' in line):
-                    rows.append([line])
+                    events.append(line)
                 if ('Warning' in line):
                     WarnLog += 1
                 if ('error' in line):
                     ErrLog += 1
+        state['events'] = events[-200:]
+        state['warnings'] = WarnLog
+        state['errors'] = ErrLog
+        f_save_state(state_dir, 'log_error_' + filename, state)
+        for line in state['events']:
+            rows.append([line])
     else:
+        WarnLog = 0
+        ErrLog  = 0
         rows.append([filename + " not exists"])
 
     rows.append(['Warning & Error Statistics:'])
@@ -312,6 +806,130 @@ def f_print_log_error(conn,perfor_or_infor,save_as):
     rows.append([filename + ' contains ' + str(ErrLog) + ' error(s).'])
     f_print_table(rows, title, style,save_as)
 
+# slow query log: statements are fingerprinted and aggregated into at most SLOW_LOG_MAX_DIGESTS entries
+# [fingerprint, db, count, total s, max s, rows examined, rows sent, {latency bucket: count}],
+# latency buckets are quarter powers of two of microseconds for the p95
+SLOW_LOG_MAX_DIGESTS = 1000
+SLOW_LOG_MAX_STATEMENT = 65536
+SLOW_LOG_TIME = re.compile(r'^# Time: (\d{4}-\d\d-\d\d)T(\d\d:\d\d:\d\d(?:\.\d+)?)|^# Time: (\d\d)(\d\d)(\d\d) +(\d+:\d\d:\d\d)')
+SLOW_LOG_METRICS = re.compile(r'^# Query_time: ([\d.]+)\s+Lock_time: [\d.]+\s+Rows_sent: (\d+)\s+Rows_examined: (\d+)')
+SLOW_LOG_SKIP = re.compile(r'^(?:SET timestamp=\d+;|/\S+, Version: |Tcp port: |Time\s+Id\s+Command)', re.I)
+SLOW_LOG_USE = re.compile(r'^use (`?)([^`;]+)\1;$', re.I)
+FINGERPRINT_RULES = (
+    # quoted strings and comments in one pass, strings first so that '#' or '--' inside a literal is not a comment;
+    # '--' starts a comment only when followed by whitespace, as in MySQL
+    (re.compile(r"""(?P<string>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")|/\*.*?\*/|--(?=\s|$)[^\n]*|#[^\n]*""", re.S),
+     lambda match: '?' if match.group('string') is not None else ' '),
+    (re.compile(r'\b0x[0-9a-f]+\b|\b\d+(?:\.\d+)?(?:e[+-]?\d+)?\b', re.I), '?'),
+    (re.compile(r'\s+'), ' '),
+    (re.compile(r'\b(in|values)\s*\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*', re.I), r'\1(?+)'),
+)
+
+def f_fingerprint(statement):
+    # literal values replaced by ?, comments and whitespace folded, like pt-fingerprint
+    text = statement.strip().rstrip(';')
+    for pattern, replacement in FINGERPRINT_RULES:
+        text = pattern.sub(replacement, text)
+    return text.strip().lower()
+
+def f_add_slow_entry(digests, entry, db):
+    query_time, rows_sent, rows_examined, statement = entry
+    fingerprint = f_fingerprint(statement)
+    key = hashlib.md5((db + ':' + fingerprint).encode('utf-8')).hexdigest()[:16]
+    if key not in digests and len(digests) >= SLOW_LOG_MAX_DIGESTS:
+        key, fingerprint, db = 'other', '(other statements, digest limit reached)', ''
+    digest = digests.setdefault(key, [fingerprint[:1024], db, 0, 0.0, 0.0, 0, 0, {}])
+    digest[2] += 1
+    digest[3] += query_time
+    digest[4] = max(digest[4], query_time)
+    digest[5] += rows_examined
+    digest[6] += rows_sent
+    bucket = str(int(math.log(max(query_time * 1e6, 1), 2) * 4))
+    digest[7][bucket] = digest[7].get(bucket, 0) + 1
+
+def f_parse_slow_log(lines, digests, state, since=None):
+    # stream slow log lines into digests; entries stamped at or before since were counted already,
+    # state['first_time'] keeps the oldest stamp counted
+    entry = None
+    statement = []
+    stamp = ''
+    db = state.get('db', '')
+    def add(entry, statement, stamp, db):
+        if since is None or stamp > since:
+            f_add_slow_entry(digests, entry + (''.join(statement),), db)
+            if stamp:
+                state['first_time'] = min(state.get('first_time', stamp[:19]), stamp[:19])
+    for line in lines:
+        if line.startswith('#'):
+            if entry is not None and statement:
+                add(entry, statement, stamp, db)
+                entry = None
+                statement = []
+            match = SLOW_LOG_TIME.match(line)
+            if match:
+                if match.group(1):
+                    stamp = match.group(1) + ' ' + match.group(2)
+                else:
+                    stamp = '20' + match.group(3) + '-' + match.group(4) + '-' + match.group(5) + ' ' + match.group(6).rjust(8, '0')
+                state['last_time'] = max(state.get('last_time', ''), stamp)
+                continue
+            match = SLOW_LOG_METRICS.match(line)
+            if match:
+                entry = (float(match.group(1)), int(match.group(2)), int(match.group(3)))
+        elif entry is not None and not SLOW_LOG_SKIP.match(line):
+            match = SLOW_LOG_USE.match(line.strip())
+            if match and not statement:
+                db = match.group(2)
+            elif sum(map(len, statement)) < SLOW_LOG_MAX_STATEMENT:
+                statement.append(line)
+    if entry is not None and statement:
+        add(entry, statement, stamp, db)
+    state['db'] = db
+
+def f_get_bucket_percentile(buckets, pct):
+    # upper bound of the latency bucket holding the pct percentile, in seconds
+    total = sum(buckets.values())
+    seen = 0
+    for bucket in sorted(buckets, key=int):
+        seen += buckets[bucket]
+        if seen >= pct / 100.0 * total:
+            return 2 ** ((int(bucket) + 1) / 4.0) / 1e6
+    return 0.0
+
+def f_print_slow_log(conn, state_dir, topN, save_as):
+    filename = f_get_query_value(conn, "SELECT @@slow_query_log_file")
+    title = "Slow log top" + str(topN)
+    if not os.path.exists(filename):
+        f_print_table([[filename + " not exists"]], title, {1: 'note,l'}, save_as)
+        return
+    state = f_load_state(state_dir, 'slow_log_' + filename)
+    digests = state.pop('digests', {})
+    since = state.get('last_time', '')
+    # rotated and compressed copies not seen yet, only their entries newer than what was already read
+    gz_mtime = state.get('gz_mtime', 0)
+    for gz_file in sorted(glob.glob(filename + '*.gz'), key=os.path.getmtime):
+        mtime = os.path.getmtime(gz_file)
+        if mtime > gz_mtime:
+            with gzip.open(gz_file, 'rt', encoding='utf-8', errors='replace') as f:
+                f_parse_slow_log(f, digests, state, since)
+            state['gz_mtime'] = mtime
+    log_state = state.setdefault('log', {})
+    with f_open_incremental(filename, log_state) as f:
+        f_parse_slow_log(f_read_new_lines(f, log_state), digests, state)
+    state['digests'] = digests
+    f_save_state(state_dir, 'slow_log_' + filename, state)
+
+    rows = []
+    for digest in heapq.nlargest(topN, digests.values(), key=lambda digest: digest[3]):
+        rows.append([f_format_statement(digest[0]), digest[1], digest[2], round(digest[3], 3), round(digest[3] / digest[2], 3),
+                     round(min(f_get_bucket_percentile(digest[7], 95), digest[4]), 3), round(digest[4], 3),
+                     digest[5] // digest[2], digest[6] // digest[2]])
+    style = {1: 'fingerprint,l', 2: 'db,l', 3: 'count,r', 4: 'total_s,r', 5: 'avg_s,r', 6: 'p95_s,r', 7: 'max_s,r',
+             8: 'rows_exm_avg,r', 9: 'rows_sent_avg,r'}
+    if 'first_time' in state:
+        title += " since " + state['first_time']
+    f_print_table(rows, title, style, save_as)
+
 def f_print_caption(dbinfo,mysql_version,save_as):
     if save_as == "txt":
         print (tab2 * linesize)
@@ -354,6 +972,8 @@ table.tdiff {  border_collapse: collapse; }
 WORKLOAD REPOSITORY report for
 </h1>
        """)
+    else:
+        f_print_document_begin(save_as)
 
     title = "Basic Information"
     style = {1: 'host,c', 2: 'user,c', 3: 'db,c', 4: 'mysql version,c'}
@@ -369,56 +989,88 @@ def f_print_ending(save_as):
     End of Report
     </body></html>
              """)
-
-def size(device):
-    nr_sectors = open(device+'/size').read().rstrip('\n')
-    sect_size = open(device+'/queue/hw_sector_size').read().rstrip('\n')
-    return (float(nr_sectors)*float(sect_size))/(1024.0*1024.0*1024.0)
+    else:
+        f_print_document_end(save_as)
+
+# host collector: /proc and /sys read once per call with compiled parsers, no subprocesses
+CpuInfo = namedtuple('CpuInfo', ['model', 'count'])
+NetDevice = namedtuple('NetDevice', ['name', 'rx_bytes', 'rx_packets', 'tx_bytes', 'tx_packets'])
+BlockDevice = namedtuple('BlockDevice', ['path', 'size'])
+Mount = namedtuple('Mount', ['device', 'mountpoint', 'fstype', 'size', 'used', 'avail', 'pct'])
+
+CPUINFO_MODEL = re.compile(r'^model name\s*:\s*(.*)$', re.M)
+MEMINFO_LINE = re.compile(r'^([\w()]+):\s+(\d+)', re.M)
+NETDEV_LINE = re.compile(r'^\s*([^:\s]+):\s*(\d+)\s+(\d+)(?:\s+\d+){6}\s+(\d+)\s+(\d+)', re.M)
+MOUNTS_LINE = re.compile(r'^(\S+) (\S+) (\S+) ', re.M)
+MOUNTS_ESCAPE = re.compile(r'\\([0-7]{3})')
+BLOCK_DEVICE = re.compile(r'sd.*|mmcblk*')
+
+def f_read_proc(path):
+    with open(path) as f:
+        return f.read()
+
+def f_get_cpu_info():
+    models = CPUINFO_MODEL.findall(f_read_proc('/proc/cpuinfo'))
+    return CpuInfo(models[0] if models else platform.processor(), len(models) or os.cpu_count())
+
+def f_get_meminfo():
+    # {field: kB}
+    return dict((name, int(value)) for name, value in MEMINFO_LINE.findall(f_read_proc('/proc/meminfo')))
+
+def f_get_net_devices(text=None):
+    text = f_read_proc('/proc/net/dev') if text is None else text
+    return [NetDevice(name, int(rx_bytes), int(rx_packets), int(tx_bytes), int(tx_packets))
+            for name, rx_bytes, rx_packets, tx_bytes, tx_packets in NETDEV_LINE.findall(text)]
+
+def f_get_block_devices():
+    devices = []
+    for device in sorted(glob.glob('/sys/block/*')):
+        if BLOCK_DEVICE.match(os.path.basename(device)):
+            sectors = int(f_read_proc(device + '/size'))
+            sector_size = int(f_read_proc(device + '/queue/hw_sector_size'))
+            devices.append(BlockDevice(device, sectors * sector_size))
+    return devices
+
+def f_get_mounts():
+    # like df: filesystems with blocks, the last mount of a mountpoint wins
+    mounts = OrderedDict()
+    for device, mountpoint, fstype in MOUNTS_LINE.findall(f_read_proc('/proc/mounts')):
+        mountpoint = MOUNTS_ESCAPE.sub(lambda m: chr(int(m.group(1), 8)), mountpoint)
+        try:
+            st = os.statvfs(mountpoint)
+        except OSError:
+            continue
+        if st.f_blocks == 0:
+            continue
+        used = (st.f_blocks - st.f_bfree) * st.f_frsize
+        avail = st.f_bavail * st.f_frsize
+        pct = int(math.ceil(used * 100.0 / (used + avail))) if used + avail else 0
+        mounts.pop(mountpoint, None)
+        mounts[mountpoint] = Mount(device, mountpoint, fstype, st.f_blocks * st.f_frsize, used, avail, pct)
+    return list(mounts.values())
 
 def f_print_linux_info(save_as):
     title = "Linux info"
     style = {1: 'Linux,l',2: 'Info,l'}
     rows =[]
     #version
-    rows.append(["Version",platform.uname()[0]+' '+platform.uname()[2]+' '+platform.uname()[4]])
+    uname = platform.uname()
+    rows.append(["Version",uname[0]+' '+uname[2]+' '+uname[4]])
     #cpu
-    cpu_count = 0
-    with open('/proc/cpuinfo') as f:
-        for line in f:
-            if line.strip():
-                if line.rstrip('\n').startswith('model name'):
-                    model_name = line.rstrip('\n').split(':')[1]
-                    cpu_count +=1
-    rows.append(["CPU",model_name + ' X '+str(cpu_count)])
+    cpu = f_get_cpu_info()
+    rows.append(["CPU",cpu.model + ' X '+str(cpu.count)])
     #mem
-    meminfo = OrderedDict()
-    with open('/proc/meminfo') as f:
-        for line in f:
-            meminfo[line.split(':')[0]] = line.split(':')[1].strip()
-    rows.append(["Memory",'Total: {0}'.format(meminfo['MemTotal'])+' Free: {0}'.format(meminfo['MemFree'])])
+    meminfo = f_get_meminfo()
+    rows.append(["Memory",'Total: {0} kB Free: {1} kB'.format(meminfo.get('MemTotal', 0), meminfo.get('MemFree', 0))])
     #net
-    with open('/proc/net/dev') as f:
-        net_dump = f.readlines()
-    device_data = {}
-    data = namedtuple('data', ['rx', 'tx'])
-    for line in net_dump[2:]:
-        line = line.split(':')
-        if line[0].strip() != 'lo':
-            device_data[line[0].strip()] = data(float(line[1].split()[0]) / (1024.0 * 1024.0),
-                                                float(line[1].split()[8]) / (1024.0 * 1024.0))
-    for dev in device_data.keys():
-        rows.append(["Net",'{0}: {1} MiB {2} MiB'.format(dev, device_data[dev].rx, device_data[dev].tx)])
+    for dev in f_get_net_devices():
+        if dev.name != 'lo':
+            rows.append(["Net",'{0}: {1} MiB {2} MiB'.format(dev.name, dev.rx_bytes / (1024.0 * 1024.0), dev.tx_bytes / (1024.0 * 1024.0))])
     #Device
-    dev_pattern = ['sd.*', 'mmcblk*']
-    for device in glob.glob('/sys/block/*'):
-        for pattern in dev_pattern:
-            if re.compile(pattern).match(os.path.basename(device)):
-                rows.append(["Device",'{0}, Size: {1} GiB'.format(device, size(device))])
+    for device in f_get_block_devices():
+        rows.append(["Device",'{0}, Size: {1} GiB'.format(device.path, device.size / (1024.0 * 1024.0 * 1024.0))])
     #process
-    pids = []
-    for subdir in os.listdir('/proc'):
-        if subdir.isdigit():
-            pids.append(subdir)
+    pids = [subdir for subdir in os.listdir('/proc') if subdir.isdigit()]
     rows.append(["Processes",'Total number of running : {0}'.format(len(pids))])
 
     f_print_table(rows, title, style,save_as)
@@ -426,19 +1078,141 @@ def f_print_linux_info(save_as):
 def f_print_filesystem_info(save_as):
     title = "Filesystem info"
     style = {1: 'Filesystem,l',2: 'Size,r',3: 'Used,r',4: 'Avail,r',5: 'Use %,r',6: ' Mounted on,l'}
-    rows =[]
-    file_info = []
-    j = 0
-    for line in os.popen('df -h').readlines():
-        for eachList in line.strip().split():
-            file_info.append(eachList)
-            j +=1
-    i = 6
-    while i<j-6:
-        rows.append([file_info[i+1],file_info[i+2],file_info[i+3],file_info[i+4],file_info[i+5],file_info[i+6]])
-        i += 6
+    rows = [[mount.device, f_format_bytes(mount.size), f_format_bytes(mount.used), f_format_bytes(mount.avail),
+             str(mount.pct) + '%', mount.mountpoint] for mount in f_get_mounts()]
     f_print_table(rows, title, style,save_as)
 
+def f_get_task_cpu(pid):
+    # {tid: (thread name, utime + stime clock ticks)} of a local process, {} when it is not on this host
+    tasks = {}
+    for stat_file in glob.glob('/proc/' + str(pid) + '/task/*/stat'):
+        try:
+            stat = f_read_proc(stat_file)
+        except (IOError, OSError):
+            continue
+        comm_end = stat.rindex(')')
+        fields = stat[comm_end + 2:].split()
+        tasks[int(os.path.basename(os.path.dirname(stat_file)))] = (stat[stat.index('(') + 1:comm_end], int(fields[11]) + int(fields[12]))
+    return tasks
+
+def f_is_local_mysqld(pid):
+    # a watcher on another host may find an unrelated local process with the same pid
+    try:
+        return f_read_proc('/proc/' + str(pid) + '/comm').strip() in ('mysqld', 'mariadbd')
+    except (IOError, OSError):
+        return False
+
+def f_get_mysqld_task_cpu(conn):
+    # the main thread's OS id is the mysqld pid
+    pid = f_get_query_value(conn, "SELECT THREAD_OS_ID FROM performance_schema.threads WHERE NAME='thread/sql/main'")
+    return pid, time.time(), f_get_task_cpu(pid) if f_is_local_mysqld(pid) else {}
+
+def f_print_mysqld_thread_cpu(conn, task_cpu1, start, interval, topN, save_as):
+    # threads ranked by CPU used during the window, joined to performance_schema.threads on THREAD_OS_ID
+    pid, time1, tasks1 = task_cpu1
+    interval = f_wait_interval(start, interval)
+    tasks2 = f_get_task_cpu(pid) if tasks1 and f_is_local_mysqld(pid) else {}
+    title = "mysqld thread CPU top" + str(topN) + " in last " + str(interval) + "s"
+    if not tasks1 or not tasks2:
+        f_print_table([["mysqld (pid " + str(pid) + ") is not running on this host"]], title, {1: 'note,l'}, save_as)
+        return
+    ticks = float(os.sysconf('SC_CLK_TCK'))
+    seconds = max(time.time() - time1, 0.001)
+    used = [(tid, comm, (cpu - tasks1[tid][1] if tid in tasks1 else cpu) / ticks) for tid, (comm, cpu) in tasks2.items()]
+    top = heapq.nlargest(topN, used, key=lambda task: task[2])
+    threads = {}
+    if top:
+        query = """SELECT THREAD_OS_ID,NAME,PROCESSLIST_ID,PROCESSLIST_USER,PROCESSLIST_HOST,PROCESSLIST_DB,PROCESSLIST_INFO
+                   FROM performance_schema.threads WHERE THREAD_OS_ID IN (""" + ','.join(str(task[0]) for task in top) + ")"
+        threads = dict((row[0], row) for row in f_get_query_record(conn, query))
+    rows = []
+    for i, (tid, comm, cpu) in enumerate(top):
+        thread = threads.get(tid, (tid, comm, None, None, None, None, None))
+        rows.append([i + 1, tid, thread[1], thread[2], thread[3], thread[4], thread[5], '%.2f' % cpu,
+                     format(cpu / seconds, '.2%'), f_format_statement(thread[6])])
+    style = {1: 'No,r', 2: 'tid,r', 3: 'thread,l', 4: 'conn_id,r', 5: 'user,l', 6: 'host,l', 7: 'db,l', 8: 'cpu_s,r',
+             9: 'cpu %,r', 10: 'statement,l'}
+    f_print_table(rows, title, style, save_as)
+
+# host time series: /proc counters sampled every HOST_SAMPLE_PERIOD seconds during the interval,
+# each metric kept as an array of doubles
+HOST_SAMPLE_PERIOD = 0.5
+HOST_SERIES = ('cpu busy %', 'cpu user %', 'cpu system %', 'cpu iowait %', 'cpu steal %', 'procs running', 'procs blocked',
+               'context switches/s', 'disk read KiB/s', 'disk write KiB/s', 'disk read IOPS', 'disk write IOPS',
+               'disk busy % (max device)', 'net rx KiB/s', 'net tx KiB/s', 'swap in pages/s', 'swap out pages/s',
+               'major faults/s')
+# disks: summed reads, sectors read, writes, sectors written, io ticks; busy: io ticks per disk
+HostCounters = namedtuple('HostCounters', ['time', 'cpu', 'ctxt', 'procs_running', 'procs_blocked', 'disks', 'busy', 'net',
+                                           'vmstat'])
+
+PROC_STAT_CPU = re.compile(r'^cpu\s+(.*)$', re.M)
+PROC_STAT_VALUE = re.compile(r'^(ctxt|procs_running|procs_blocked)\s+(\d+)', re.M)
+DISKSTATS_LINE = re.compile(r'^\s*\d+\s+\d+\s+(\S+)\s+(\d+)\s+\d+\s+(\d+)\s+\d+\s+(\d+)\s+\d+\s+(\d+)\s+\d+\s+\d+\s+(\d+)', re.M)
+VMSTAT_LINE = re.compile(r'^(pswpin|pswpout|pgmajfault)\s+(\d+)', re.M)
+VIRTUAL_DISK = re.compile(r'loop|ram|zram|dm-|md')
+
+def f_get_host_counters(disks):
+    stat = f_read_proc('/proc/stat')
+    values = dict((name, int(value)) for name, value in PROC_STAT_VALUE.findall(stat))
+    # user nice system idle iowait irq softirq steal
+    cpu = [int(x) for x in PROC_STAT_CPU.search(stat).group(1).split()[:8]]
+    diskstats = [tuple(int(x) for x in fields[1:]) for fields in DISKSTATS_LINE.findall(f_read_proc('/proc/diskstats'))
+                 if fields[0] in disks]
+    net = [dev for dev in f_get_net_devices() if dev.name != 'lo']
+    vmstat = dict((name, int(value)) for name, value in VMSTAT_LINE.findall(f_read_proc('/proc/vmstat')))
+    return HostCounters(time.time(), cpu, values.get('ctxt', 0), values.get('procs_running', 0), values.get('procs_blocked', 0),
+                        [sum(col) for col in zip(*diskstats)] if diskstats else [0] * 5, [d[4] for d in diskstats],
+                        (sum(dev.rx_bytes for dev in net), sum(dev.tx_bytes for dev in net)), vmstat)
+
+def f_host_sample(c1, c2):
+    # one value per HOST_SERIES from two consecutive counter reads
+    seconds = max(c2.time - c1.time, 0.001)
+    cpu = [b - a for a, b in zip(c1.cpu, c2.cpu)]
+    total = float(sum(cpu)) or 1.0
+    disk = [b - a for a, b in zip(c1.disks, c2.disks)]
+    busy = max([b - a for a, b in zip(c1.busy, c2.busy)] or [0])
+    vm = lambda name: (c2.vmstat.get(name, 0) - c1.vmstat.get(name, 0)) / seconds
+    return (100.0 * (total - cpu[3] - cpu[4]) / total, 100.0 * (cpu[0] + cpu[1]) / total, 100.0 * (cpu[2] + cpu[5] + cpu[6]) / total,
+            100.0 * cpu[4] / total, 100.0 * cpu[7] / total, c2.procs_running, c2.procs_blocked, (c2.ctxt - c1.ctxt) / seconds,
+            disk[1] / 2.0 / seconds, disk[3] / 2.0 / seconds, disk[0] / seconds, disk[2] / seconds,
+            min(100.0, busy / 10.0 / seconds), (c2.net[0] - c1.net[0]) / 1024.0 / seconds,
+            (c2.net[1] - c1.net[1]) / 1024.0 / seconds, vm('pswpin'), vm('pswpout'), vm('pgmajfault'))
+
+def f_sample_host(series, period, stop):
+    disks = set(name for name in os.listdir('/sys/block') if not VIRTUAL_DISK.match(name))
+    counters1 = f_get_host_counters(disks)
+    while not stop.wait(period):
+        counters2 = f_get_host_counters(disks)
+        for values, value in zip(series, f_host_sample(counters1, counters2)):
+            values.append(value)
+        counters1 = counters2
+
+def f_start_host_sampler():
+    series = [array('d') for name in HOST_SERIES]
+    stop = threading.Event()
+    sampler = threading.Thread(target=f_sample_host, args=(series, HOST_SAMPLE_PERIOD, stop))
+    sampler.daemon = True
+    sampler.start()
+    return series, stop, sampler
+
+def f_percentile(values, pct):
+    values = sorted(values)
+    return values[max(0, int(math.ceil(pct / 100.0 * len(values))) - 1)]
+
+def f_print_host_series(host_sampler, start, interval, save_as):
+    series, stop, sampler = host_sampler
+    interval = f_wait_interval(start, interval)
+    stop.set()
+    sampler.join()
+    title = "Host time series in last " + str(interval) + "s, every " + str(int(HOST_SAMPLE_PERIOD * 1000)) + "ms"
+    style = {1: 'metric,l', 2: 'min,r', 3: 'avg,r', 4: 'p95,r', 5: 'max,r', 6: 'samples,r'}
+    rows = []
+    for name, values in zip(HOST_SERIES, series):
+        if values:
+            rows.append([name, round(min(values), 2), round(sum(values) / len(values), 2), round(f_percentile(values, 95), 2),
+                         round(max(values), 2), len(values)])
+    f_print_table(rows, title, style, save_as)
+
 def f_print_linux_status(save_as):
     ###获取参数###################################################################
     #scputimes(user=, nice, system, idle, iowait, irq, softirq,steal, guest, guest_nice)
@@ -480,21 +1254,204 @@ def f_print_linux_status(save_as):
         f_print_table_body(rows, style1,' ')
     elif save_as == "html":
         f_print_table_html(rows, title, style)
-
-def f_print_host_memory_topN(topN,save_as):
-    ps_result = list()
-    for proc in psutil.process_iter():
-        ps_result.append({'name': proc.name(), 'pid': proc.pid, 'cpu_percent': proc.cpu_percent(),
-                          'memory_percent': proc.memory_percent()})
-    rows = []
-    for i, item in enumerate(sorted(ps_result, key=lambda x: x['memory_percent'], reverse=True)):
-        if i >= topN:
-            break
-        rows.append([i + 1, item['name'], item['pid'], format(item['memory_percent'] / 100, '.2%')])
-
-    style = {1: 'No,r', 2: 'Name,l',3: 'Pid,r', 4: 'Memory percent,r'}
-    title = "Host memory top"+str(topN)
-    f_print_table(rows, title, style, save_as)
+    else:
+        # label/value pairs become one record each
+        pairs = [[row[i], row[i + 1]] for i in range(0, 12, 2) for row in rows]
+        f_print_table(pairs, title, {1: 'name,l', 2: 'value,r'}, save_as)
+
+def f_get_process_cpu_times():
+    # (time, {pid: (create_time, cpu seconds)}) to diff over the sampling window
+    times = {}
+    for proc in psutil.process_iter(attrs=['pid', 'create_time', 'cpu_times'], ad_value=None):
+        info = proc.info
+        if info['cpu_times'] is not None:
+            times[info['pid']] = (info['create_time'], info['cpu_times'].user + info['cpu_times'].system)
+    return time.time(), times
+
+def f_print_host_topN(cpu_times1, start, interval, topN, save_as):
+    # one pass over the processes, CPU% is what each used during the window (100% = one core)
+    f_wait_interval(start, interval)
+    time1, times1 = cpu_times1
+    total_memory = psutil.virtual_memory().total
+    procs = []
+    for proc in psutil.process_iter(attrs=['pid', 'name', 'create_time', 'cpu_times', 'memory_info'], ad_value=None):
+        info = proc.info
+        if info['cpu_times'] is None or info['memory_info'] is None:
+            continue
+        cpu = info['cpu_times'].user + info['cpu_times'].system
+        old = times1.get(info['pid'])
+        if old is not None and old[0] == info['create_time']:
+            cpu -= old[1]
+        procs.append((info['pid'], info['name'], cpu, info['memory_info'].rss))
+    seconds = max(time.time() - time1, 0.001)
+
+    rows = [[i + 1, name, pid, format(float(rss) / total_memory, '.2%'), f_format_bytes(rss)]
+            for i, (pid, name, cpu, rss) in enumerate(heapq.nlargest(topN, procs, key=lambda proc: proc[3]))]
+    style = {1: 'No,r', 2: 'Name,l',3: 'Pid,r', 4: 'Memory percent,r', 5: 'RSS,r'}
+    f_print_table(rows, "Host memory top"+str(topN), style, save_as)
+
+    rows = [[i + 1, name, pid, format(cpu / seconds, '.2%'), '%.2f' % cpu]
+            for i, (pid, name, cpu, rss) in enumerate(heapq.nlargest(topN, procs, key=lambda proc: proc[2]))]
+    style = {1: 'No,r', 2: 'Name,l',3: 'Pid,r', 4: 'CPU percent,r', 5: 'CPU seconds,r'}
+    f_print_table(rows, "Host CPU top" + str(topN) + " in last " + str(int(round(seconds))) + "s", style, save_as)
+
+class ReportWriter(object):
+    # sys.stdout replacement: report text is encoded once, collected in chunks and
+    # written to the binary stream (optionally gzip compressed) once chunk_size is reached.
+    # A section running in a worker thread writes straight through while it is next in
+    # report order (turn), otherwise into its thread's buffer until its turn comes, so
+    # sections can run concurrently and still be printed in report order
+    def __init__(self, stream, compress=False, chunk_size=65536):
+        self.raw = stream
+        self.stream = gzip.GzipFile(fileobj=stream, mode='wb') if compress else stream
+        self.chunk_size = chunk_size
+        self.chunk = []
+        self.chunk_len = 0
+        self.turn = None
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def write(self, s):
+        local = self.local
+        capture = getattr(local, 'capture', None)
+        if capture is not None:
+            capture.append(s)
+            return len(s)
+        data = s.encode('utf-8')
+        index = getattr(local, 'index', None)
+        with self.lock:
+            if index is not None:
+                local.bytes += len(data)
+                if index != self.turn:
+                    local.buf.append(data)
+                    return len(s)
+                if local.buf:
+                    self.add(b''.join(local.buf))
+                    local.buf = []
+            self.add(data)
+        return len(s)
+
+    def add(self, data):
+        self.chunk.append(data)
+        self.chunk_len += len(data)
+        if self.chunk_len >= self.chunk_size:
+            self.write_chunk()
+
+    def write_chunk(self):
+        if self.chunk:
+            self.stream.write(b''.join(self.chunk))
+            self.chunk = []
+            self.chunk_len = 0
+
+    def start_job(self, index):
+        self.local.index = index
+        self.local.buf = []
+        self.local.bytes = 0
+
+    def end_job(self):
+        # what the job left buffered and how many bytes it wrote in total
+        buf, size = self.local.buf, self.local.bytes
+        self.local.index = self.local.buf = None
+        return buf, size
+
+    def end_turn(self, buf):
+        # the job in turn finished: write what it left buffered and hand the turn to the next one
+        with self.lock:
+            if buf:
+                self.add(b''.join(buf))
+            self.turn += 1
+
+    def flush(self):
+        with self.lock:
+            self.write_chunk()
+            self.stream.flush()
+
+    def close(self):
+        self.flush()
+        if self.stream is not self.raw:
+            self.stream.close()
+        self.raw.flush()
+
+def f_capture(fn, *args):
+    # run fn with this thread's output captured, return what it printed
+    buf = []
+    sys.stdout.local.capture = buf
+    try:
+        fn(*args)
+    finally:
+        sys.stdout.local.capture = None
+    return ''.join(buf)
+
+def f_run_job(pool, job, index):
+    # returns what the job left buffered and its SelfCost
+    conn = pool.get() if job.needs_conn else None
+    self_cost.query = 0.0
+    self_cost.rows = 0
+    self_cost.waited = 0.0
+    start = time.time()
+    sys.stdout.start_job(index)
+    try:
+        if job.needs_conn:
+            job.fn(conn, *job.args)
+        else:
+            job.fn(*job.args)
+    finally:
+        buf, size = sys.stdout.end_job()
+        if conn is not None:
+            pool.put(conn)
+    cost = SelfCost(job.name or job.fn.__name__, time.time() - start - self_cost.waited, self_cost.query, self_cost.rows,
+                    size)
+    self_cost.query = None
+    return buf, cost
+
+def f_run_jobs(pool, jobs, parallelism):
+    # write the job outputs in order, return their SelfCost records
+    costs = []
+    sys.stdout.turn = 0
+    try:
+        with ThreadPoolExecutor(max_workers=parallelism) as executor:
+            # expensive sections start first, the output keeps the catalog order
+            futures = [None] * len(jobs)
+            for i in sorted(range(len(jobs)), key=lambda i: COST_ORDER[jobs[i].cost]):
+                if not jobs[i].deferred:
+                    futures[i] = executor.submit(f_run_job, pool, jobs[i], i)
+            for i, job in enumerate(jobs):
+                if futures[i] is None:
+                    # everything else is collected inside the sampling window,
+                    # the deferred sections take their closing snapshots now
+                    wait([future for future in futures if future is not None])
+                    futures = [future if future is not None else executor.submit(f_run_job, pool, job, n)
+                               for n, (future, job) in enumerate(zip(futures, jobs))]
+                buf, cost = futures[i].result()
+                sys.stdout.end_turn(buf)
+                costs.append(cost)
+    finally:
+        sys.stdout.turn = None
+    return costs
+
+def f_print_self_cost(costs, save_as):
+    rows = [[cost.name, '%.3f' % cost.wall, '%.3f' % cost.query, '%.3f' % max(0, cost.wall - cost.query),
+             cost.rows, f_format_bytes(cost.bytes)]
+            for cost in sorted(costs, key=lambda cost: cost.wall, reverse=True)]
+    style = {1: 'section,l', 2: 'wall s,r', 3: 'query s,r', 4: 'render s,r', 5: 'rows,r', 6: 'output,r'}
+    # peak RSS is process wide, one number for the whole report
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    f_print_table(rows, 'Watcher self-cost, process peak RSS ' + f_format_bytes(peak_rss), style, save_as)
+
+def f_print_shed_sections(shed, failed, save_as):
+    style = {1: 'section,l', 2: 'action,l', 3: 'reason,l'}
+    if shed:
+        f_print_table(sorted(shed), 'Shed sections', style, save_as)
+    if failed:
+        # counted as passed, once per guarded section that ran the check
+        rows = [[failure, failed.count(failure)] for failure in sorted(set(failed))]
+        f_print_table(rows, 'Load checks failed', {1: 'check,l', 2: 'sections,r'}, save_as)
+
+def f_save_self_cost(costs, json_file):
+    with open(json_file + '.tmp', 'w') as f:
+        json.dump({'time': time.time(), 'process_peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+                   'sections': [cost._asdict() for cost in costs]}, f, indent=1)
+    os.replace(json_file + '.tmp', json_file)
 
 def f_sec2dhms(sec):
     day = 24*60*60
@@ -518,264 +1475,1300 @@ def f_get_mysql_status(conn):
     mysqlstatus = dict(rows)
     return mysqlstatus
 
-def f_print_mysql_status(conn,perfor_or_infor,interval,save_as):
-    ###获取参数###################################################################
-    mysqlstatus1 = f_get_mysql_status(conn)
-    time.sleep(interval)
-    mysqlstatus2 = f_get_mysql_status(conn)
-
-    # 执行查询的总次数
-    Questions1 = int(mysqlstatus1["Questions"])
-    Questions2 = int(mysqlstatus2["Questions"])
-    # 服务器已经运行的时间（以秒为单位）
-    Uptime2 = int(mysqlstatus2["Uptime"])
-    Com_commit1 = int(mysqlstatus1["Com_commit"])
-    Com_commit2 = int(mysqlstatus2["Com_commit"])
-    Com_rollback1 = int(mysqlstatus1["Com_rollback"])
-    Com_rollback2 = int(mysqlstatus2["Com_rollback"])
-    # 从硬盘读取键的数据块的次数。如果Key_reads较大，则Key_buffer_size值可能太小。
-    # 可以用Key_reads/Key_read_requests计算缓存损失率
-    #Key_reads1 = int(mysqlstatus1["Key_reads"])
-    #Key_reads2 = int(mysqlstatus2["Key_reads"])
-    # 从缓存读键的数据块的请求数
-    #Key_read_requests1 = int(mysqlstatus1["Key_read_requests"])
-    #Key_read_requests2 = int(mysqlstatus2["Key_read_requests"])
-    # 向硬盘写入将键的数据块的物理写操作的次数
-    #Key_writes1 = int(mysqlstatus1["Key_writes"])
-    #Key_writes2 = int(mysqlstatus2["Key_writes"])
-    # 将键的数据块写入缓存的请求数
-    #Key_write_requests1 = int(mysqlstatus1["Key_write_requests"])
-    #Key_write_requests2 = int(mysqlstatus2["Key_write_requests"])
-    # 不能满足InnoDB必须单页读取的缓冲池中的逻辑读数量。
-    Innodb_buffer_pool_reads1 = int(mysqlstatus1["Innodb_buffer_pool_reads"])
-    Innodb_buffer_pool_reads2 = int(mysqlstatus2["Innodb_buffer_pool_reads"])
-    # InnoDB已经完成的逻辑读请求数
-    Innodb_buffer_pool_read_requests1 = int(mysqlstatus1["Innodb_buffer_pool_read_requests"])
-    Innodb_buffer_pool_read_requests2 = int(mysqlstatus2["Innodb_buffer_pool_read_requests"])
-
-    # 当前打开的表的数量
-    Open_tables1 = int(mysqlstatus2["Open_tables"])-int(mysqlstatus1["Open_tables"])
-    Open_tables2 = int(mysqlstatus2["Open_tables"])
-    # 已经打开的表的数量。如果Opened_tables较大，table_cache 值可能太小
-    Opened_tables1 = int(mysqlstatus2["Opened_tables"])-int(mysqlstatus1["Opened_tables"])
-    Opened_tables2 = int(mysqlstatus2["Opened_tables"])
-    # 创建用来处理连接的线程数。如果Threads_created较大，你可能要
-    # 增加thread_cache_size值。缓存访问率的计算方法Threads_created/Connections
-    Threads_created1 = int(mysqlstatus1["Threads_created"])
-    Threads_created2 = int(mysqlstatus2["Threads_created"])
-    # 试图连接到(不管是否成功)MySQL服务器的连接数。缓存访问率的计算方法Threads_created/Connections
-    Connections1 = int(mysqlstatus1["Connections"])
-    Connections2 = int(mysqlstatus2["Connections"])
-    Threads_connected1 = str(int(mysqlstatus2["Threads_connected"])-int(mysqlstatus1["Threads_connected"]))
-    Threads_connected2 = mysqlstatus2["Threads_connected"]
-    Aborted_connects1 = str(int(mysqlstatus2["Aborted_connects"])-int(mysqlstatus1["Aborted_connects"]))
-    Aborted_connects2 = mysqlstatus2["Aborted_connects"]
-    # Com_select/s：平均每秒select语句执行次数
-    # Com_insert/s：平均每秒insert语句执行次数
-    # Com_update/s：平均每秒update语句执行次数
-    # Com_delete/s：平均每秒delete语句执行次数
-    Com_select1 = int(mysqlstatus1["Com_select"])
-    Com_select2 = int(mysqlstatus2["Com_select"])
-    Com_insert1 = int(mysqlstatus1["Com_insert"])
-    Com_insert2 = int(mysqlstatus2["Com_insert"])
-    Com_update1 = int(mysqlstatus1["Com_update"])
-    Com_update2 = int(mysqlstatus2["Com_update"])
-    Com_delete1 = int(mysqlstatus1["Com_delete"])
-    Com_delete2 = int(mysqlstatus2["Com_delete"])
-    Com_replace1 = int(mysqlstatus1["Com_replace"])
-    Com_replace2 = int(mysqlstatus2["Com_replace"])
-    # 不能立即获得的表的锁的次数。如果该值较高，并且有性能问题，你应首先优化查询，然后拆分表或使用复制。
-    #Table_locks_waited1 = int(mysqlstatus1["Table_locks_waited"])
-    #Table_locks_waited2 = int(mysqlstatus2["Table_locks_waited"])
-    # 立即获得的表的锁的次数
-    #Table_locks_immediate1 = int(mysqlstatus1["Table_locks_immediate"])
-    #Table_locks_immediate2 = int(mysqlstatus2["Table_locks_immediate"])
-    # 服务器执行语句时自动创建的内存中的临时表的数量。如果Created_tmp_disk_tables较大，
-    # 你可能要增加tmp_table_size值使临时 表基于内存而不基于硬盘
-    Created_tmp_tables1 = int(mysqlstatus1["Created_tmp_tables"])
-    Created_tmp_tables2 = int(mysqlstatus2["Created_tmp_tables"])
-    # 服务器执行语句时在硬盘上自动创建的临时表的数量
-    Created_tmp_disk_tables1 = int(mysqlstatus1["Created_tmp_disk_tables"])
-    Created_tmp_disk_tables2 = int(mysqlstatus2["Created_tmp_disk_tables"])
-    # 查询时间超过long_query_time秒的查询的个数 缓慢查询个数
-    Slow_queries1 = int(mysqlstatus1["Slow_queries"])
-    Slow_queries2 = int(mysqlstatus2["Slow_queries"])
-    # 没有主键（key）联合（Join）的执行。该值可能是零。这是捕获开发错误的好方法，因为一些这样的查询可能降低系统的性能。
-    Select_full_join1 = int(mysqlstatus1["Select_full_join"])
-    Select_full_join2 = int(mysqlstatus2["Select_full_join"])
-    #  Percentage of full table scans
-    Handler_read_rnd_next1 = int(mysqlstatus1["Handler_read_rnd_next"])
-    Handler_read_rnd_next2 = int(mysqlstatus2["Handler_read_rnd_next"])
-    Handler_read_rnd1 = int(mysqlstatus1["Handler_read_rnd"])
-    Handler_read_rnd2 = int(mysqlstatus2["Handler_read_rnd"])
-    Handler_read_first1 = int(mysqlstatus1["Handler_read_first"])
-    Handler_read_first2 = int(mysqlstatus2["Handler_read_first"])
-    Handler_read_next1 = int(mysqlstatus1["Handler_read_next"])
-    Handler_read_next2 = int(mysqlstatus2["Handler_read_next"])
-    Handler_read_key1 = int(mysqlstatus1["Handler_read_key"])
-    Handler_read_key2 = int(mysqlstatus2["Handler_read_key"])
-    Handler_read_prev1 = int(mysqlstatus1["Handler_read_prev"])
-    Handler_read_prev2 = int(mysqlstatus2["Handler_read_prev"])
-    # 缓冲池利用率
-    Innodb_buffer_pool_pages_total1 = int(mysqlstatus1["Innodb_buffer_pool_pages_total"])
-    Innodb_buffer_pool_pages_total2 = int(mysqlstatus2["Innodb_buffer_pool_pages_total"])
-    Innodb_buffer_pool_pages_free1 = int(mysqlstatus1["Innodb_buffer_pool_pages_free"])
-    Innodb_buffer_pool_pages_free2 = int(mysqlstatus2["Innodb_buffer_pool_pages_free"])
-
-    ###计算参数###################################################################
-    Uptimes1 = str(interval) + "s"
-    Uptimes2 = f_sec2dhms(Uptime2)
+def f_wait_interval(start, interval):
+    # sleep only for what is left of the sampling window, return its real length;
+    # the sleep is not charged to the job's self-cost
+    remaining = start + interval - time.time()
+    if remaining > 0:
+        time.sleep(remaining)
+        if getattr(self_cost, 'query', None) is not None:
+            self_cost.waited += remaining
+    return max(1, int(round(time.time() - start)))
+
+def f_get_timed_mysql_status(conn):
+    # the snapshot and when it was taken, rates divide by the real gap between two of them
+    before = time.time()
+    mysqlstatus = f_get_mysql_status(conn)
+    return (before + time.time()) / 2, mysqlstatus
+
+def f_print_mysql_status(conn,timed_status1,start,interval,save_as):
+    f_wait_interval(start, interval)
+    time2, mysqlstatus2 = f_get_timed_mysql_status(conn)
+    time1, mysqlstatus1 = timed_status1
+    f_print_mysql_overview(mysqlstatus1, mysqlstatus2, max(time2 - time1, 0.001), save_as)
+
+# derived metrics of MySQL Overview, each declared once over SHOW GLOBAL STATUS counters:
+# rate       sum(num) per second
+# ratio      sum(num) / sum(den)
+# pct        sum(num) / sum(den) in percent
+# hit        1 - sum(num) / sum(den) in percent
+# count      counter increase, the total column shows the counter itself
+# gauge      level change, the total column shows the level itself
+# level_pct  sum(num) / sum(den) of levels in percent, averaged over the interval
+# a counter name starting with '-' is subtracted
+Metric = namedtuple('Metric', ['key', 'label', 'kind', 'num', 'den'], defaults=[()])
+
+MYSQL_METRICS = (
+    Metric('uptime', 'Uptimes', 'uptime', ('Uptime',)),
     # QPS = Questions / Seconds
-    QPS1 = str(round((Questions2-Questions1) * 1.0 / interval, 2))+' ('+str(Questions2-Questions1)+'/'+str(interval)+')'
-    QPS2 = str(round(Questions2* 1.0 / Uptime2, 2))+' ('+str(Questions2)+'/'+str(Uptime2)+')'
-
-    TPS1 = str(round((Com_commit2 + Com_rollback2-Com_commit1 - Com_rollback1) * 1.0 / interval, 2))+' (('+str(Com_commit2 -Com_commit1)+'+'+str(Com_rollback2- Com_rollback1)+')/'+str(interval)+')'
-    TPS2 = str(round((Com_commit2 + Com_rollback2)* 1.0 / Uptime2, 2))+' (('+str(Com_commit2)+'+'+str(Com_rollback2)+')/'+str(Uptime2)+')'
-
-    Read1 = Com_select2 -Com_select1
-    Read2 = Com_select2 
-    ReadS1 = str(round(Read1 * 1.0 / interval, 2))+' ('+str(Read1)+'/'+str(interval)+')'
-    ReadS2 = str(round(Read2* 1.0 / Uptime2, 2))+' ('+str(Read2)+'/'+str(Uptime2)+')'
-
-    Write1 = Com_insert2 + Com_update2 + Com_delete2 + Com_replace2-Com_insert1 - Com_update1 - Com_delete1 - Com_replace1
-    Write2 = Com_insert2 + Com_update2 + Com_delete2 + Com_replace2
-    WriteS1 = str(round(Write1 * 1.0 / interval, 2))+' ('+str(Write1)+'/'+str(interval)+')'
-    WriteS2 = str(round(Write2* 1.0 / Uptime2, 2))+' ('+str(Write2)+'/'+str(Uptime2)+')'
-    # Read/Write Ratio
-    if Write1!=0:
-        rwr1 = str(round(Read1 * 1.0 / Write1,2))+' ('+str(Read1)+'/'+str(Write1)+')'
-    else:
-        rwr1 ='0.0%'
+    Metric('qps', 'QPS (Questions / Seconds)', 'rate', ('Questions',)),
+    Metric('tps', 'TPS ((Commit + Rollback)/ Seconds)', 'rate', ('Com_commit', 'Com_rollback')),
+    # Com_select/s：平均每秒select语句执行次数
+    Metric('reads_per_second', 'Reads per second', 'rate', ('Com_select',)),
+    # Com_insert/s Com_update/s Com_delete/s Com_replace/s
+    Metric('writes_per_second', 'Writes per second', 'rate', ('Com_insert', 'Com_update', 'Com_delete', 'Com_replace')),
+    Metric('read_write_ratio', 'Read/Writes', 'ratio', ('Com_select',), ('Com_insert', 'Com_update', 'Com_delete', 'Com_replace')),
+    # 查询时间超过long_query_time秒的查询的个数
+    Metric('slow_queries_per_second', 'Slow queries per second', 'rate', ('Slow_queries',)),
+    Metric('slow_queries_pct', 'Slow_queries/Questions', 'pct', ('Slow_queries',), ('Questions',)),
+    Metric('threads_connected', 'Threads connected', 'gauge', ('Threads_connected',)),
+    Metric('aborted_connects', 'Aborted connects', 'count', ('Aborted_connects',)),
+    # 如果Threads_created较大，你可能要增加thread_cache_size值
+    Metric('thread_cache_hit_pct', 'Thread cache hits (>90%)', 'hit', ('Threads_created',), ('Connections',)),
+    # 不能满足InnoDB必须单页读取的缓冲池中的逻辑读数量 / InnoDB已经完成的逻辑读请求数
+    Metric('innodb_buffer_hit_pct', 'Innodb buffer hits(96% - 99%)', 'hit', ('Innodb_buffer_pool_reads',), ('Innodb_buffer_pool_read_requests',)),
+    Metric('innodb_buffer_pool_utilization_pct', 'Innodb buffer pool utilization', 'level_pct',
+           ('Innodb_buffer_pool_pages_total', '-Innodb_buffer_pool_pages_free'), ('Innodb_buffer_pool_pages_total',)),
+    # 没有主键（key）联合（Join）的执行
+    Metric('select_full_join_per_second', 'Select full join per second', 'rate', ('Select_full_join',)),
+    Metric('full_join_pct', 'full select in all select', 'pct', ('Select_full_join',), ('Com_select',)),
+    # (Handler_read_rnd_next + Handler_read_rnd) / (Handler_read_rnd_next + Handler_read_rnd + Handler_read_first + Handler_read_next + Handler_read_key + Handler_read_prev)
+    Metric('full_table_scans_pct', 'full table scans', 'pct', ('Handler_read_rnd_next', 'Handler_read_rnd'),
+           ('Handler_read_rnd_next', 'Handler_read_rnd', 'Handler_read_first', 'Handler_read_next', 'Handler_read_key', 'Handler_read_prev')),
+    Metric('open_tables', 'Current open tables', 'gauge', ('Open_tables',)),
+    # 如果Opened_tables较大，table_cache 值可能太小
+    Metric('opened_tables', 'Accumulative open tables', 'count', ('Opened_tables',)),
+    # 如果Created_tmp_disk_tables较大，你可能要增加tmp_table_size值
+    Metric('tmp_tables_to_disk_pct', 'Temp tables to disk(<10%)', 'pct', ('Created_tmp_disk_tables',), ('Created_tmp_tables',)),
+)
 
-    if Write2!=0:
-        rwr2 = str(round(Read2 * 1.0 / Write2,2))+' ('+str(Read2)+'/'+str(Write2)+')'
-    else:
-        rwr2 ='0.0%'
+METRIC_COUNTERS = sorted(set(name.lstrip('-') for metric in MYSQL_METRICS for name in metric.num + metric.den))
+# status values that are levels rather than monotonic counters
+LEVEL_COUNTERS = set(name.lstrip('-') for metric in MYSQL_METRICS if metric.kind in ('gauge', 'level_pct')
+                     for name in metric.num + metric.den)
+# metrics that only mean something over a window, exported by /metrics as gauges of the last exporter_window
+WINDOW_METRICS = tuple(metric for metric in MYSQL_METRICS if metric.kind in ('rate', 'ratio', 'pct', 'hit'))
+
+# what a daemon ring sample keeps of SHOW GLOBAL STATUS: the metric counters and the status samples' gauge
+RING_COUNTERS = METRIC_COUNTERS + ['Threads_running']
+
+def f_status_vector(mysqlstatus, names=METRIC_COUNTERS):
+    # the counters the metrics need, parsed once per snapshot
+    return dict((name, int(mysqlstatus.get(name, 0) or 0)) for name in names)
+
+def f_format_seconds(seconds):
+    # whole seconds as they are, a measured window to a tenth
+    return str(int(seconds)) if seconds == int(seconds) else '%.1f' % seconds
+
+def f_sum_counters(vector, names):
+    total = 0
+    for name in names:
+        if name.startswith('-'):
+            total -= vector[name[1:]]
+        else:
+            total += vector[name]
+    return total
+
+def f_eval_metrics(vector1, vector2, seconds, metrics=MYSQL_METRICS):
+    # vector1 None means since server start: deltas are the counters themselves
+    # returns [(metric, value, text)]
+    results = []
+    for metric in metrics:
+        num2 = f_sum_counters(vector2, metric.num)
+        den2 = f_sum_counters(vector2, metric.den)
+        if vector1 is None:
+            num, den = num2, den2
+        else:
+            num = num2 - f_sum_counters(vector1, metric.num)
+            den = den2 - f_sum_counters(vector1, metric.den)
+        if metric.kind == 'uptime':
+            value = seconds
+            text = f_sec2dhms(seconds) if vector1 is None else f_format_seconds(seconds) + "s"
+        elif metric.kind == 'rate':
+            value = num * 1.0 / seconds
+            text = str(round(value, 2)) + ' (' + str(num) + '/' + f_format_seconds(seconds) + ')'
+        elif metric.kind in ('count', 'gauge'):
+            value = num
+            text = str(num)
+        elif metric.kind == 'level_pct':
+            if vector1 is not None:
+                num = (num2 + f_sum_counters(vector1, metric.num)) / 2.0
+                den = (den2 + f_sum_counters(vector1, metric.den)) / 2.0
+            else:
+                num, den = num2, den2
+            value = num * 100.0 / den if den else 0.0
+            text = str(round(value, 2)) + '% (' + str(int(num)) + '/' + str(int(den)) + ')'
+        elif not den:
+            value = 0.0
+            text = '0.0%' if metric.kind != 'ratio' else '0.0'
+        elif metric.kind == 'ratio':
+            value = num * 1.0 / den
+            text = str(round(value, 2)) + ' (' + str(num) + '/' + str(den) + ')'
+        elif metric.kind == 'pct':
+            value = num * 100.0 / den
+            text = str(round(value, 2)) + '% (' + str(num) + '/' + str(den) + ')'
+        else:
+            value = (1 - num * 1.0 / den) * 100
+            text = str(round(value, 2)) + '% (1-' + str(num) + '/' + str(den) + ')'
+        results.append((metric, value, text))
+    return results
+
+def f_eval_metric_series(samples, metrics=MYSQL_METRICS):
+    # samples [(time, mysqlstatus)] -> [(time, seconds, [(metric, value, text)])] for each consecutive pair
+    vectors = [(t, f_status_vector(mysqlstatus)) for t, mysqlstatus in samples]
+    series = []
+    for (t1, vector1), (t2, vector2) in zip(vectors, vectors[1:]):
+        seconds = max(t2 - t1, 0.001)
+        series.append((t2, seconds, f_eval_metrics(vector1, vector2, seconds, metrics)))
+    return series
+
+def f_print_mysql_overview(mysqlstatus1,mysqlstatus2,interval,save_as):
+    vector1 = f_status_vector(mysqlstatus1)
+    vector2 = f_status_vector(mysqlstatus2)
+    uptime = max(1, vector2['Uptime'])
+    title = "MySQL Overview"
+    style = {1: 'Key,l', 2: 'In '+f_format_seconds(interval)+'s,r', 3: 'Total,r'}
+    rows = []
+    for (metric, value1, text1), (metric, value2, text2) in zip(f_eval_metrics(vector1, vector2, interval),
+                                                                 f_eval_metrics(None, vector2, uptime)):
+        rows.append([metric.label, text1, text2])
+    f_print_table(rows, title, style,save_as)
 
-    Slow_queries_per_second1 = str(round((Slow_queries2-Slow_queries1) * 1.0 / interval, 2))+' ('+str(Slow_queries2-Slow_queries1)+'/'+str(interval)+')'
-    Slow_queries_per_second2 = str(round(Slow_queries2 * 1.0 / Uptime2, 2))+' ('+str(Slow_queries2)+'/'+str(Uptime2)+')'
-    #Slow_queries / Questions
-    SQ1 = str(round(((Slow_queries2-Slow_queries1) * 1.0 / (Questions2-Questions1)) * 100, 2)) + "%"+' ('+str(Slow_queries2-Slow_queries1)+'/'+str(Questions2-Questions1)+')'
-    SQ2 = str(round((Slow_queries2 * 1.0 / Questions2) * 100, 2)) + "%"+' ('+str(Slow_queries2)+'/'+str(Questions2)+')'
+REPOSITORY_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS snapshot (snap_id INTEGER PRIMARY KEY AUTOINCREMENT, host TEXT, port TEXT, snap_time REAL)",
+    "CREATE TABLE IF NOT EXISTS global_status (snap_id INTEGER, name TEXT, value TEXT)",
+    "CREATE TABLE IF NOT EXISTS global_variables (snap_id INTEGER, name TEXT, value TEXT)",
+    "CREATE TABLE IF NOT EXISTS digest (snap_id INTEGER, schema_name TEXT, digest TEXT, digest_text TEXT, count_star INTEGER, \
+     sum_timer_wait INTEGER, sum_rows_examined INTEGER, sum_rows_sent INTEGER, sum_created_tmp_tables INTEGER, \
+     sum_created_tmp_disk_tables INTEGER, sum_errors INTEGER, first_seen TEXT, last_seen TEXT)",
+    "CREATE TABLE IF NOT EXISTS table_size (snap_id INTEGER, table_schema TEXT, table_name TEXT, table_rows INTEGER, \
+     data_length INTEGER, index_length INTEGER)",
+    "CREATE INDEX IF NOT EXISTS global_status_snap ON global_status (snap_id)",
+    "CREATE INDEX IF NOT EXISTS global_variables_snap ON global_variables (snap_id)",
+    "CREATE INDEX IF NOT EXISTS digest_snap ON digest (snap_id)",
+    "CREATE INDEX IF NOT EXISTS table_size_snap ON table_size (snap_id)"
+)
 
-    if (Connections2-Connections1) != 0:
-        Thread_cache_hits1 = str(round((1 - (Threads_created2-Threads_created1)* 1.0 / (Connections2-Connections1)) * 100, 2)) + "%"
-    else:
-        Thread_cache_hits1 = '0.0%'
-    Thread_cache_hits2 = str(round((1 - Threads_created2 * 1.0 / Connections2) * 100, 2)) + "%"
+DIGEST_QUERY = """SELECT IFNULL(schema_name,''),IFNULL(digest,''),digest_text,count_star,sum_timer_wait,sum_rows_examined,
+                  sum_rows_sent,sum_created_tmp_tables,sum_created_tmp_disk_tables,sum_errors,first_seen,last_seen
+                  FROM performance_schema.events_statements_summary_by_digest"""
+
+TABLE_SIZE_QUERY = """SELECT table_schema,table_name,IFNULL(table_rows,0),IFNULL(data_length,0),IFNULL(index_length,0)
+                      FROM information_schema.tables
+                      WHERE table_schema NOT IN ('mysql','information_schema','performance_schema','sys')"""
+
+def f_format_time(picoseconds):
+    # same units as sys.format_time()
+    picoseconds = float(picoseconds or 0)
+    for unit, size in (('h', 3600e12), ('m', 60e12), ('s', 1e12), ('ms', 1e9), ('us', 1e6), ('ns', 1e3)):
+        if picoseconds >= size:
+            return '%.2f %s' % (picoseconds / size, unit)
+    return '%d ps' % picoseconds
+
+def f_format_bytes(num):
+    # same units as sys.format_bytes()
+    num = float(num or 0)
+    for unit, size in (('PiB', 1024.0 ** 5), ('TiB', 1024.0 ** 4), ('GiB', 1024.0 ** 3), ('MiB', 1024.0 ** 2), ('KiB', 1024.0)):
+        if abs(num) >= size:
+            return '%.2f %s' % (num / size, unit)
+    return '%d bytes' % num
+
+def f_sqlite_row(row):
+    # MySQLdb gives Decimal for SUM() columns and datetime for timestamps
+    values = []
+    for col in row:
+        if isinstance(col, Decimal):
+            values.append(int(col))
+        elif col is None or isinstance(col, (int, float, str)):
+            values.append(col)
+        else:
+            values.append(str(col))
+    return tuple(values)
+
+def f_open_repository(repository):
+    db = sqlite3.connect(repository)
+    for ddl in REPOSITORY_SCHEMA:
+        db.execute(ddl)
+    return db
+
+def f_save_snapshot(conn, repository, dbinfo):
+    mysqlstatus = f_get_query_record(conn, "SHOW GLOBAL STATUS")
+    variables = f_get_query_record(conn, "SHOW GLOBAL VARIABLES")
+    try:
+        digests = f_get_query_record(conn, DIGEST_QUERY)
+    except MySQLdb.Error:
+        digests = []
+    table_sizes = f_get_query_record(conn, TABLE_SIZE_QUERY)
+    db = f_open_repository(repository)
+    try:
+        with db:
+            snap_id = db.execute("INSERT INTO snapshot (host, port, snap_time) VALUES (?, ?, ?)",
+                                 (dbinfo[0], str(dbinfo[4]), time.time())).lastrowid
+            db.executemany("INSERT INTO global_status VALUES (?, ?, ?)", [(snap_id, k, v) for k, v in mysqlstatus])
+            db.executemany("INSERT INTO global_variables VALUES (?, ?, ?)", [(snap_id, k, v) for k, v in variables])
+            db.executemany("INSERT INTO digest VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                           [(snap_id,) + f_sqlite_row(row) for row in digests])
+            db.executemany("INSERT INTO table_size VALUES (?, ?, ?, ?, ?, ?)", [(snap_id,) + f_sqlite_row(row) for row in table_sizes])
+    finally:
+        db.close()
+    return snap_id
+
+def f_load_snapshot(db, snap_id):
+    snapshot = db.execute("SELECT snap_id, host, port, snap_time FROM snapshot WHERE snap_id = ?", (snap_id,)).fetchone()
+    if snapshot is None:
+        raise ValueError("snapshot %s not found" % snap_id)
+    return snapshot
+
+def f_get_digest_delta(digests1, digests2):
+    # digest rows as in DIGEST_QUERY, delta keyed by (schema, digest)
+    # a digest that is new, was evicted and came back (first_seen moved) or was reset
+    # (count went down) counts from zero; the NULL digest row collects whatever
+    # no longer fits once the digest table is full
+    before = dict(((row[0], row[1]), row) for row in digests1)
+    delta = []
+    for row in digests2:
+        old = before.get((row[0], row[1]))
+        if old is None or str(old[10]) != str(row[10]) or int(row[3]) < int(old[3]):
+            counters = [int(c) for c in row[3:10]]
+        else:
+            counters = [int(c2) - int(c1) for c1, c2 in zip(old[3:10], row[3:10])]
+        if counters[0] > 0:
+            text = row[2] if row[1] else '(digest table full, statements not tracked)'
+            delta.append([row[0], row[1], text] + counters)
+    return delta
+
+# digest delta columns to rank by: total latency, executions, rows examined, tmp tables (disk ones first)
+DIGEST_RANKINGS = (
+    ('latency', lambda row: row[4]),
+    ('executions', lambda row: row[3]),
+    ('rows examined', lambda row: row[5]),
+    ('tmp tables', lambda row: (row[8], row[7])),
+)
 
-    if (Innodb_buffer_pool_read_requests2-Innodb_buffer_pool_read_requests1) != 0:
-        Innodb_buffer_read_hits1 = str(round((1 - (Innodb_buffer_pool_reads2-Innodb_buffer_pool_reads1) * 1.0 / (Innodb_buffer_pool_read_requests2-Innodb_buffer_pool_read_requests1)) * 100, 2)) + "%"+ "%"+' (1-'+str(Innodb_buffer_pool_reads2-Innodb_buffer_pool_reads1)+'/'+str(Innodb_buffer_pool_read_requests2-Innodb_buffer_pool_read_requests1)+')'
-    else:
-        Innodb_buffer_read_hits1 = '0.0%'
-    Innodb_buffer_read_hits2 = str(round((1 - Innodb_buffer_pool_reads2* 1.0 / Innodb_buffer_pool_read_requests2) * 100, 2)) + "%"+' (1-'+str(Innodb_buffer_pool_reads2)+'/'+str(Innodb_buffer_pool_read_requests2)+')'
+def f_print_digest_delta(delta, topN, title, save_as, key=DIGEST_RANKINGS[0][1]):
+    style = {1: 'db,l', 2: 'QUERY,l', 3: 'exec_count,r', 4: 'total_latency,r', 5: 'avg_latency,r',
+             6: 'rows_examined,r', 7: 'rows_sent,r', 8: 'tmp_tables,r', 9: 'tmp_disk_tables,r', 10: 'errors,r'}
+    rows = []
+    for row in heapq.nlargest(topN, [row for row in delta if key(row)], key=key):
+        rows.append([row[0], (row[2] or '')[:64], row[3], f_format_time(row[4]), f_format_time(row[4] / row[3]),
+                     row[5], row[6], row[7], row[8], row[9]])
+    f_print_table(rows, title, style, save_as)
 
-    Innodb_buffer_pool_utilization1 = str(round((Innodb_buffer_pool_pages_total1 - Innodb_buffer_pool_pages_free1) * 1.0 / Innodb_buffer_pool_pages_total1 * 100,2)) + "%"+' ('+str(Innodb_buffer_pool_pages_total1 - Innodb_buffer_pool_pages_free1)+'/'+str(Innodb_buffer_pool_pages_total1)+')'
-    Innodb_buffer_pool_utilization2 = str(round((Innodb_buffer_pool_pages_total2 - Innodb_buffer_pool_pages_free2) * 1.0 / Innodb_buffer_pool_pages_total2 * 100,2)) + "%"+' ('+str(Innodb_buffer_pool_pages_total2 - Innodb_buffer_pool_pages_free2)+'/'+str(Innodb_buffer_pool_pages_total2)+')'
+def f_get_digests(conn):
+    return f_get_query_record(conn, DIGEST_QUERY)
+
+def f_print_digest_window(conn, digests1, start, interval, topN, save_as):
+    # statements of this run's sampling window instead of totals since server start
+    interval = f_wait_interval(start, interval)
+    delta = f_get_digest_delta(digests1, f_get_digests(conn))
+    for name, key in DIGEST_RANKINGS:
+        f_print_digest_delta(delta, topN, 'Statement ' + name + ' top' + str(topN) + ' in last ' + str(interval) + 's',
+                             save_as, key)
+
+# statement latency histograms (8.0): non empty buckets as (key..., bucket number, bucket upper bound ps, count)
+DIGEST_HISTOGRAM_QUERY = """SELECT IFNULL(schema_name,''),IFNULL(digest,''),bucket_number,bucket_timer_high,count_bucket
+                            FROM performance_schema.events_statements_histogram_by_digest WHERE count_bucket > 0"""
+GLOBAL_HISTOGRAM_QUERY = """SELECT bucket_number,bucket_timer_high,count_bucket
+                            FROM performance_schema.events_statements_histogram_global WHERE count_bucket > 0"""
+HISTOGRAM_QUANTILES = (50, 95, 99, 99.9)
+
+def f_get_histograms(conn):
+    return f_get_query_record(conn, DIGEST_HISTOGRAM_QUERY), f_get_query_record(conn, GLOBAL_HISTOGRAM_QUERY)
+
+def f_get_histogram_delta(rows1, rows2):
+    # {key: [(bucket upper bound, count)]} of what was added between the two reads;
+    # a key whose counts went down was reset (or evicted) and counts from zero
+    before = dict((tuple(row[:-2]), int(row[-1])) for row in rows1)
+    histograms = {}
+    for row in rows2:
+        histograms.setdefault(tuple(row[:-3]), []).append((row[-3], int(row[-2]), int(row[-1]), before.get(tuple(row[:-2]), 0)))
+    delta = {}
+    for key, buckets in histograms.items():
+        reset = any(count2 < count1 for bucket, high, count2, count1 in buckets)
+        counts = [(high, count2 if reset else count2 - count1) for bucket, high, count2, count1 in sorted(buckets)]
+        counts = [(high, count) for high, count in counts if count > 0]
+        if counts:
+            delta[key] = counts
+    return delta
+
+def f_get_histogram_percentiles(buckets, quantiles=HISTOGRAM_QUANTILES):
+    # (count, [upper bound ps of the bucket holding each quantile])
+    total = sum(count for high, count in buckets)
+    values = []
+    seen = 0
+    position = iter(buckets)
+    for quantile in quantiles:
+        while seen < quantile / 100.0 * total:
+            high, count = next(position)
+            seen += count
+        values.append(high)
+    return total, values
+
+def f_print_tail_latency(conn, histograms1, start, interval, topN, save_as):
+    # digest percentiles over the sampling window, since server start when nothing ran in it
+    interval = f_wait_interval(start, interval)
+    histograms2 = f_get_histograms(conn)
+    digests = f_get_histogram_delta(histograms1[0], histograms2[0])
+    overall = f_get_histogram_delta(histograms1[1], histograms2[1])
+    since = "in last " + str(interval) + "s"
+    if not digests:
+        digests = f_get_histogram_delta([], histograms2[0])
+        overall = f_get_histogram_delta([], histograms2[1])
+        since = "since server start"
+    names = ['p' + ('%g' % quantile).replace('.', '') for quantile in HISTOGRAM_QUANTILES]
+
+    style = dict([(1, 'exec_count,r')] + [(i + 2, name + ',r') for i, name in enumerate(names)])
+    rows = []
+    if () in overall:
+        total, values = f_get_histogram_percentiles(overall[()])
+        rows.append([total] + [f_format_time(value) for value in values])
+    f_print_table(rows, "Statement latency percentiles " + since, style, save_as)
+
+    top = heapq.nlargest(topN, ((key,) + f_get_histogram_percentiles(buckets) for key, buckets in digests.items()),
+                         key=lambda digest: (digest[2][2], digest[1]))
+    texts = {}
+    if top:
+        query = ("SELECT IFNULL(schema_name,''),digest,digest_text FROM performance_schema.events_statements_summary_by_digest "
+                 "WHERE digest IN ('" + "','".join(key[1] for key, total, values in top if key[1]) + "')")
+        texts = dict(((row[0], row[1]), row[2]) for row in f_get_query_record(conn, query))
+    rows = [[key[0], f_format_statement(texts.get(key) if key[1] else '(digest table full, statements not tracked)'), total] +
+            [f_format_time(value) for value in values] for key, total, values in top]
+    style = dict([(1, 'db,l'), (2, 'QUERY,l'), (3, 'exec_count,r')] + [(i + 4, name + ',r') for i, name in enumerate(names)])
+    f_print_table(rows, "Tail latency top" + str(topN) + " by p99 " + since, style, save_as)
+
+# SHOW ENGINE INNODB STATUS fields, every one picked up in a single pass over the text; the first
+# match wins, so the per instance buffer pool lines after the totals are ignored
+INNODB_STATUS_FIELD = re.compile(r'''
+    ^(?P<stamp>\d{4}-\d\d-\d\d[ ]\d\d:\d\d:\d\d)[ ](?:0x[0-9a-f]+[ ])?INNODB[ ]MONITOR[ ]OUTPUT
+  | ^Trx[ ]id[ ]counter[ ](?P<trx_id>\d+)
+  | ^History[ ]list[ ]length[ ](?P<history>\d+)
+  | ^Log[ ]sequence[ ]number\s+(?P<lsn>\d+)
+  | ^Log[ ]flushed[ ]up[ ]to\s+(?P<flushed>\d+)
+  | ^Last[ ]checkpoint[ ]at\s+(?P<checkpoint>\d+)
+  | ^(?P<log_flushes>\d+)[ ]pending[ ]log[ ]flushes,[ ](?P<chkp_writes>\d+)[ ]pending[ ]chkp[ ]writes
+  | ^Pending[ ]normal[ ]aio[ ]reads:(?P<aio_reads>[^,\[\n]*(?:\[[^\]\n]*\])?)\s*,[ ]aio[ ]writes:(?P<aio_writes>[^,\[\n]*(?:\[[^\]\n]*\])?)
+  | ^[ ]ibuf[ ]aio[ ]reads:[ ]?(?P<ibuf_reads>\d*),[ ]log[ ]i/o's:[ ]?(?P<log_ios>\d*),[ ]sync[ ]i/o's:[ ]?(?P<sync_ios>\d*)
+  | ^Pending[ ]flushes[ ]\(fsync\)[ ]log:[ ](?P<fsync_log>\d+);[ ]buffer[ ]pool:[ ](?P<fsync_pool>\d+)
+  | ^Pending[ ]reads\s+(?P<pool_reads>\d+)
+  | ^Pending[ ]writes:[ ]LRU[ ](?P<lru_writes>\d+),[ ]flush[ ]list[ ](?P<flush_list_writes>\d+)(?:,[ ]single[ ]page[ ](?P<single_page_writes>\d+))?
+  | ^OS[ ]WAIT[ ]ARRAY[ ]INFO:[ ]reservation[ ]count[ ](?P<reservations>\d+)
+  | ^RW-(?P<rw_kind>shared|excl|sx)[ ]spins[ ](?P<rw_spins>\d+),[ ]rounds[ ](?P<rw_rounds>\d+),[ ]OS[ ]waits[ ](?P<rw_waits>\d+)
+  | ^--Thread[ ](?P<sem_thread>\d+)[ ]has[ ]waited[ ]at[ ](?P<sem_where>\S+[ ]line[ ]\d+)[ ]for[ ](?P<sem_seconds>[\d.]+)[ ]seconds?[ ]the[ ]semaphore
+  | ^LATEST[ ]DETECTED[ ]DEADLOCK\n-+\n(?P<deadlock>(?s:.*?))(?=\n-+\n[A-Z][A-Z/ ]*\n-+$)
+''', re.M | re.X)
+
+# stamp and the counters/gauges are None when the server did not print them, rw is {kind: (spins, rounds, OS waits)},
+# semaphores [(thread, file line, seconds)] and deadlock the text of the latest detected deadlock
+InnodbStatus = namedtuple('InnodbStatus', ['time', 'stamp', 'trx_id', 'history', 'lsn', 'flushed', 'checkpoint',
+                                           'log_flushes', 'chkp_writes', 'aio_reads', 'aio_writes', 'ibuf_reads', 'log_ios',
+                                           'sync_ios', 'fsync_log', 'fsync_pool', 'pool_reads', 'lru_writes',
+                                           'flush_list_writes', 'single_page_writes', 'reservations', 'rw', 'semaphores',
+                                           'deadlock'])
+
+def f_sum_pending(text):
+    # 'N [a, b]' (5.6) carries the total, '[a, b]' only the per thread counts
+    total, _, threads = text.partition('[')
+    if total.strip():
+        return int(total)
+    return sum(int(n) for n in threads.rstrip(']').split(',') if n.strip())
+
+def f_parse_innodb_status(text):
+    fields = {}
+    rw = {}
+    semaphores = []
+    for match in INNODB_STATUS_FIELD.finditer(text):
+        found = dict((name, value) for name, value in match.groupdict().items() if value is not None)
+        if 'rw_kind' in found:
+            rw.setdefault(found['rw_kind'], (int(found['rw_spins']), int(found['rw_rounds']), int(found['rw_waits'])))
+        elif 'sem_thread' in found:
+            semaphores.append((int(found['sem_thread']), found['sem_where'], float(found['sem_seconds'])))
+        elif 'aio_reads' in found:
+            fields.setdefault('aio_reads', f_sum_pending(found['aio_reads']))
+            fields.setdefault('aio_writes', f_sum_pending(found['aio_writes']))
+        elif 'stamp' in found or 'deadlock' in found:
+            fields.update((name, value) for name, value in found.items() if name not in fields)
+        else:
+            fields.update((name, int(value) if value else None) for name, value in found.items() if name not in fields)
+    status = dict.fromkeys(InnodbStatus._fields)
+    status.update(fields, time=time.time(), rw=rw, semaphores=semaphores)
+    status['deadlock'] = status['deadlock'] or ''
+    return InnodbStatus(**status)
+
+def f_get_innodb_status(conn):
+    return f_parse_innodb_status(f_get_query_record(conn, "SHOW ENGINE INNODB STATUS")[0][2])
+
+def f_start_innodb_status(conn):
+    # one capture at each end of the interval, shared by all the InnoDB status sections
+    return {'begin': f_get_innodb_status(conn), 'end': None, 'lock': threading.Lock()}
+
+def f_end_innodb_status(conn, capture):
+    # the first section to close the interval takes the end capture, the others reuse it
+    with capture['lock']:
+        if capture['end'] is None:
+            capture['end'] = f_get_innodb_status(conn)
+    return capture['begin'], capture['end']
+
+def f_get_redo_capacity(conn):
+    # redo log size in bytes: 8.0.30+, then 5.7/8.0, then MariaDB 10.5+ with a single log file
+    for query in ("SELECT @@innodb_redo_log_capacity", "SELECT @@innodb_log_file_size*@@innodb_log_files_in_group",
+                  "SELECT @@innodb_log_file_size"):
+        try:
+            return int(f_get_query_record(conn, query)[0][0])
+        except MySQLdb.Error:
+            pass
+    return None
+
+def f_innodb_status_rows(status1, status2, metrics, seconds):
+    # [metric, begin, end, per second] for counters, per second left empty for gauges; unit 'bytes' formats
+    # all three, 'lsn' only the rate since log sequence numbers are positions
+    rows = []
+    for name, get, counter, unit in metrics:
+        begin, end = get(status1), get(status2)
+        if end is None:
+            continue
+        rate = (end - begin) / seconds if counter and begin is not None and end >= begin else None
+        if unit == 'bytes':
+            begin, end = f_format_bytes(begin) if begin is not None else None, f_format_bytes(end)
+        if unit in ('bytes', 'lsn'):
+            rate = f_format_bytes(rate) + '/s' if rate is not None else None
+        else:
+            rate = round(rate, 2) if rate is not None else None
+        rows.append([name, '' if begin is None else begin, end, '' if rate is None else rate])
+    return rows
+
+INNODB_STATUS_STYLE = {1: 'metric,l', 2: 'begin,r', 3: 'end,r', 4: 'per_second,r'}
+
+def f_print_innodb_checkpoint(conn, capture, start, interval, save_as):
+    interval = f_wait_interval(start, interval)
+    status1, status2 = f_end_innodb_status(conn, capture)
+    capacity = f_get_redo_capacity(conn)
+    age = lambda status: status.lsn - status.checkpoint if status.lsn is not None and status.checkpoint is not None else None
+    metrics = [('log sequence number', lambda status: status.lsn, True, 'lsn'),
+               ('log flushed up to', lambda status: status.flushed, True, 'lsn'),
+               ('last checkpoint at', lambda status: status.checkpoint, True, 'lsn'),
+               ('checkpoint age', age, False, 'bytes')]
+    if capacity:
+        metrics.append(('checkpoint age % of redo log',
+                        lambda status: round(age(status) * 100.0 / capacity, 2) if age(status) is not None else None, False, None))
+    metrics += [('history list length', lambda status: status.history, False, None),
+                ('trx id counter', lambda status: status.trx_id, True, None)]
+    rows = f_innodb_status_rows(status1, status2, metrics, max(status2.time - status1.time, 0.001))
+    f_print_table(rows, "InnoDB checkpoint age in last " + str(interval) + "s", INNODB_STATUS_STYLE, save_as)
+
+def f_print_innodb_pending_io(conn, capture, start, interval, save_as):
+    interval = f_wait_interval(start, interval)
+    status1, status2 = f_end_innodb_status(conn, capture)
+    metrics = [(label, lambda status, name=name: getattr(status, name), False, None)
+               for label, name in (('pending aio reads', 'aio_reads'), ('pending aio writes', 'aio_writes'),
+                                   ('pending ibuf aio reads', 'ibuf_reads'), ('pending log i/o', 'log_ios'),
+                                   ('pending sync i/o', 'sync_ios'), ('pending fsync log', 'fsync_log'),
+                                   ('pending fsync buffer pool', 'fsync_pool'), ('pending buffer pool reads', 'pool_reads'),
+                                   ('pending LRU writes', 'lru_writes'), ('pending flush list writes', 'flush_list_writes'),
+                                   ('pending single page writes', 'single_page_writes'),
+                                   ('pending log flushes', 'log_flushes'), ('pending checkpoint writes', 'chkp_writes'))]
+    metrics.append(('semaphore waits', lambda status: len(status.semaphores), False, None))
+    metrics.append(('OS wait reservations', lambda status: status.reservations, True, None))
+    for kind in sorted(status2.rw):
+        metrics.append(('RW-' + kind + ' OS waits', lambda status, kind=kind: status.rw.get(kind, (None,) * 3)[2], True, None))
+    rows = f_innodb_status_rows(status1, status2, metrics, max(status2.time - status1.time, 0.001))
+    f_print_table(rows, "InnoDB pending I/O in last " + str(interval) + "s", INNODB_STATUS_STYLE, save_as)
+
+    if status2.semaphores:
+        rows = [[thread, where, seconds] for thread, where, seconds in sorted(status2.semaphores, key=lambda s: s[2], reverse=True)]
+        f_print_table(rows, "InnoDB semaphore waits", {1: 'thread,r', 2: 'waited_at,l', 3: 'seconds,r'}, save_as)
+
+def f_print_innodb_deadlock(conn, capture, start, interval, save_as):
+    interval = f_wait_interval(start, interval)
+    status1, status2 = f_end_innodb_status(conn, capture)
+    title = "InnoDB latest deadlock"
+    if not status2.deadlock:
+        f_print_table([["no deadlock since server start"]], title, {1: 'note,l'}, save_as)
+        return
+    title += " (new in last " + str(interval) + "s)" if status2.deadlock != status1.deadlock else " (before the interval)"
+    # the physical record dumps ('0: len 4; hex ...') are left out
+    rows = [[line] for line in status2.deadlock.splitlines()
+            if line.strip() and not (line.lstrip().partition(':')[0].isdigit() and ': len ' in line)]
+    f_print_table(rows, title, {1: 'deadlock,l'}, save_as)
+
+def f_print_snapshot_list(repository, save_as):
+    db = f_open_repository(repository)
+    try:
+        records = db.execute("SELECT snap_id, host, port, snap_time FROM snapshot ORDER BY snap_id").fetchall()
+    finally:
+        db.close()
+    title = "Snapshots"
+    style = {1: 'snap_id,r', 2: 'host,l', 3: 'port,r', 4: 'snap_time,l'}
+    rows = [[r[0], r[1], r[2], time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(r[3]))] for r in records]
+    f_print_document_begin(save_as)
+    f_print_table(rows, title, style, save_as)
+    f_print_document_end(save_as)
 
-    """
-    if (Key_read_requests2-Key_read_requests1) != 0:
-        Key_buffer_read_hits1 = str(round((1 - (Key_reads2-Key_reads1) * 1.0 / (Key_read_requests2-Key_read_requests1)) * 100, 2)) + "%"
-    else:
-        Key_buffer_read_hits1 = '0.0%'
-    if Key_read_requests2 != 0:
-        Key_buffer_read_hits2 = str(round((1 - Key_reads2* 1.0 / Key_read_requests2) * 100, 2)) + "%"
-    else:
-        Key_buffer_read_hits2 = '0.0%'
+def f_print_repository_report(repository, begin_id, end_id, topN, save_as):
+    db = f_open_repository(repository)
+    try:
+        snapshot1 = f_load_snapshot(db, begin_id)
+        snapshot2 = f_load_snapshot(db, end_id)
+        # a repository may be shared by several instances, a delta across two of them means nothing
+        if snapshot1[1:3] != snapshot2[1:3]:
+            raise ValueError("snapshots %s (%s:%s) and %s (%s:%s) are of different instances"
+                             % (begin_id, snapshot1[1], snapshot1[2], end_id, snapshot2[1], snapshot2[2]))
+        mysqlstatus1 = dict(db.execute("SELECT name, value FROM global_status WHERE snap_id = ?", (begin_id,)).fetchall())
+        mysqlstatus2 = dict(db.execute("SELECT name, value FROM global_status WHERE snap_id = ?", (end_id,)).fetchall())
+        variables1 = dict(db.execute("SELECT name, value FROM global_variables WHERE snap_id = ?", (begin_id,)).fetchall())
+        variables2 = dict(db.execute("SELECT name, value FROM global_variables WHERE snap_id = ?", (end_id,)).fetchall())
+        digests1 = db.execute("SELECT * FROM digest WHERE snap_id = ?", (begin_id,)).fetchall()
+        digests2 = db.execute("SELECT * FROM digest WHERE snap_id = ?", (end_id,)).fetchall()
+        sizes1 = db.execute("SELECT table_schema, table_name, table_rows, data_length, index_length FROM table_size WHERE snap_id = ?", (begin_id,)).fetchall()
+        sizes2 = db.execute("SELECT table_schema, table_name, table_rows, data_length, index_length FROM table_size WHERE snap_id = ?", (end_id,)).fetchall()
+    finally:
+        db.close()
+
+    f_print_caption([snapshot2[1], '', '', '', snapshot2[2]], variables2.get('version', ''), save_as)
+
+    title = "Snapshot Range"
+    style = {1: 'snap,l', 2: 'snap_id,r', 3: 'snap_time,l'}
+    rows = [["Begin", begin_id, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(snapshot1[3]))],
+            ["End", end_id, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(snapshot2[3]))]]
+    f_print_table(rows, title, style, save_as)
 
-    if (Key_write_requests2-Key_write_requests1)!=0:
-        Key_buffer_write_hits1 = str(round((1 - (Key_writes2-Key_writes1)* 1.0 / (Key_write_requests2-Key_write_requests1)) * 100, 2)) + "%"
-    else:
-        Key_buffer_write_hits1 = '0.0%'
-    if Key_write_requests2!=0:
-        Key_buffer_write_hits2 = str(round((1 - Key_writes2* 1.0 / Key_write_requests2) * 100, 2)) + "%"
+    if int(mysqlstatus2["Uptime"]) < int(mysqlstatus1["Uptime"]):
+        f_print_table([["server restarted between the two snapshots, no delta available"]], "MySQL Overview", {1: 'note,l'}, save_as)
     else:
-        Key_buffer_write_hits2 = '0.0%'
-    """
-    if (Select_full_join2-Select_full_join1) > 0:
-        Select_full_join_per_second1 = str(round((Select_full_join2-Select_full_join1) * 1.0 / interval, 2))+' ('+str(Select_full_join2-Select_full_join1)+'/'+str(interval)+')'
-    else:
-        Select_full_join_per_second1 = '0.0%'
-    Select_full_join_per_second2 = str(round(Select_full_join2 * 1.0 / Uptime2, 2))+' ('+str(Select_full_join2)+'/'+str(Uptime2)+')'
+        f_print_mysql_overview(mysqlstatus1, mysqlstatus2, max(snapshot2[3] - snapshot1[3], 0.001), save_as)
+        f_print_digest_delta(f_get_digest_delta([row[1:] for row in digests1], [row[1:] for row in digests2]),
+                             topN, "Top SQL by total latency", save_as)
 
-    if (Com_select2-Com_select1) > 0:
-        full_select_in_all_select1 = str(round(((Select_full_join2-Select_full_join1) * 1.0 / (Com_select2-Com_select1)) * 100, 2)) + "%"+' ('+str(Select_full_join2-Select_full_join1)+'/'+str(Com_select2-Com_select1)+')'
-    else:
-        full_select_in_all_select1 = '0.0%'
-    full_select_in_all_select2 = str(round((Select_full_join2 * 1.0 / Com_select2) * 100, 2)) + "%"+' ('+str(Select_full_join2)+'/'+str(Com_select2)+')'
+    title = "Table growth"
+    style = {1: 'table_schema,l', 2: 'table_name,l', 3: 'rows_delta,r', 4: 'data_delta,r', 5: 'index_delta,r', 6: 'total_size,r'}
+    before = dict(((row[0], row[1]), row) for row in sizes1)
+    rows = []
+    for row in sizes2:
+        old = before.get((row[0], row[1]), (row[0], row[1], 0, 0, 0))
+        growth = row[3] + row[4] - old[3] - old[4]
+        if growth != 0 or row[2] != old[2]:
+            rows.append([growth, row[0], row[1], row[2] - old[2], f_format_bytes(row[3] - old[3]),
+                         f_format_bytes(row[4] - old[4]), f_format_bytes(row[3] + row[4])])
+    rows = [row[1:] for row in sorted(rows, key=lambda x: x[0], reverse=True)[:topN]]
+    f_print_table(rows, title, style, save_as)
 
-    #((Handler_read_rnd_next + Handler_read_rnd) / (Handler_read_rnd_next + Handler_read_rnd + Handler_read_first + Handler_read_next + Handler_read_key + Handler_read_prev)).
-    if (Handler_read_rnd_next2 -Handler_read_rnd_next1+ Handler_read_rnd2-Handler_read_rnd1 + Handler_read_first2 -Handler_read_first1+ Handler_read_next2-Handler_read_next1 + Handler_read_key2-Handler_read_key1 + Handler_read_prev2-Handler_read_prev1) > 0:
-        full_table_scans1=str(round((Handler_read_rnd_next2 + Handler_read_rnd2-Handler_read_rnd_next1 - Handler_read_rnd1)* 1.0 / (Handler_read_rnd_next2 -Handler_read_rnd_next1+ Handler_read_rnd2-Handler_read_rnd1 + Handler_read_first2 -Handler_read_first1+ Handler_read_next2-Handler_read_next1 + Handler_read_key2-Handler_read_key2 + Handler_read_prev2-Handler_read_prev1)* 100, 2)) + "%"
-    else:
-        full_table_scans1 = '0.0%'
-    full_table_scans2=str(round((Handler_read_rnd_next2 + Handler_read_rnd2)* 1.0 / (Handler_read_rnd_next2 + Handler_read_rnd2 + Handler_read_first2 + Handler_read_next2 + Handler_read_key2 + Handler_read_prev2)* 100, 2)) + "%"
-    """
-    if (Table_locks_immediate2-Table_locks_immediate1) > 0:
-        lock_contention1 = str(round(((Table_locks_waited2-Table_locks_waited1) * 1.00 / (Table_locks_immediate2-Table_locks_immediate1)) * 100, 2)) + "%"
-    else:
-        lock_contention1 = '0.0%'
-    lock_contention2 = str(round((Table_locks_waited2 * 1.00 / Table_locks_immediate2) * 100, 2)) + "%"
-    """
-    if (Created_tmp_tables2-Created_tmp_tables1) > 0:
-        Temp_tables_to_disk1 = str(round(((Created_tmp_disk_tables2-Created_tmp_disk_tables1) * 1.0 / (Created_tmp_tables2-Created_tmp_tables1)) * 100, 2)) + "%"+' ('+str(Created_tmp_disk_tables2-Created_tmp_disk_tables1)+'/'+str(Created_tmp_tables2-Created_tmp_tables1)+')'
-    else:
-        Temp_tables_to_disk1 = '0.0%'
-    Temp_tables_to_disk2 = str(round((Created_tmp_disk_tables2 * 1.0 / Created_tmp_tables2) * 100, 2)) + "%"+' ('+str(Created_tmp_disk_tables2)+'/'+str(Created_tmp_tables2)+')'
+    title = "Changed parameters"
+    style = {1: 'parameter_name,l', 2: 'begin value,l', 3: 'end value,l'}
+    rows = [[k, variables1.get(k, ''), v] for k, v in sorted(variables2.items())
+            if variables1.get(k) != v and k not in ('gtid_executed', 'gtid_purged', 'timestamp')]
+    f_print_table(rows, title, style, save_as)
 
-    ###打印参数###################################################################
-    title = "MySQL Overview"
-    style = {1: 'Key,l', 2: 'In '+Uptimes1+',r', 3: 'Total,r'}
-    rows=[
-          ["Uptimes",Uptimes1,Uptimes2],
-          ["QPS (Questions / Seconds)", QPS1, QPS2],
-          ["TPS ((Commit + Rollback)/ Seconds)", TPS1, TPS2],
-          ["Reads per second", ReadS1, ReadS2],
-          ["Writes per second", WriteS1, WriteS2],
-          ["Read/Writes", rwr1,rwr2],
-          ["Slow queries per second", Slow_queries_per_second1, Slow_queries_per_second2],
-          ["Slow_queries/Questions", SQ1,SQ2],
-          ["Threads connected", Threads_connected1, Threads_connected2],
-          ["Aborted connects", Aborted_connects1, Aborted_connects2],
-          ["Thread cache hits (>90%)", Thread_cache_hits1, Thread_cache_hits2],
-          ["Innodb buffer hits(96% - 99%)", Innodb_buffer_read_hits1,Innodb_buffer_read_hits2],
-          ["Innodb buffer pool utilization", Innodb_buffer_pool_utilization1,Innodb_buffer_pool_utilization2],
-          #["Key buffer read hits(99.3% - 99.9%)",str(Key_buffer_read_hits1), str(Key_buffer_read_hits2)],
-          #["Key buffer write hits(99.3% - 99.9%)", str(Key_buffer_write_hits1), str(Key_buffer_write_hits2)],
-          ["Select full join per second", Select_full_join_per_second1, Select_full_join_per_second2],
-          ["full select in all select", full_select_in_all_select1, full_select_in_all_select2],
-          ["full table scans", full_table_scans1, full_table_scans2],
-          #["MyISAM Lock waiting ratio", lock_contention1, lock_contention2],
-          ["Current open tables", str(Open_tables1), str(Open_tables2)],
-          ["Accumulative open tables", str(Opened_tables1), str(Opened_tables2)],
-          ["Temp tables to disk(<10%)", Temp_tables_to_disk1, Temp_tables_to_disk2]
-          ]
+    f_print_ending(save_as)
 
-    f_print_table(rows, title, style,save_as)
+SAMPLE_METRICS = tuple(metric for metric in MYSQL_METRICS
+                       if metric.key in ('qps', 'tps', 'reads_per_second', 'writes_per_second', 'innodb_buffer_hit_pct',
+                                         'tmp_tables_to_disk_pct'))
 
-if __name__=="__main__":
-    dbinfo=["127.0.0.1","root","","mysql",3306] #host,user,passwd,db,port
-    config_file="dbset.ini"
-    mysql_version=""
-    option = []
-    save_as = "txt"
+def f_print_status_samples(samples,save_as):
+    title = "Status samples"
+    style = {1: 'time,l', 2: 'seconds,r'}
+    for metric in SAMPLE_METRICS:
+        style[len(style) + 1] = metric.key + ',r'
+    style[len(style) + 1] = 'Threads_running,r'
+    rows = []
+    for (t, seconds, results), (t2, mysqlstatus) in zip(f_eval_metric_series(samples, SAMPLE_METRICS), samples[1:]):
+        rows.append([time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(t)), round(seconds, 1)] +
+                    [round(value, 2) for metric, value, text in results] + [mysqlstatus.get("Threads_running", '')])
+    f_print_table(rows, title, style, save_as)
 
-    opts, args = getopt.getopt(sys.argv[1:], "p:s:")
-    for o,v in opts:
-        if o == "-p":
-            config_file = v
-        elif o == "-s":
-            save_as = v
+def f_get_ring_window(ring, minutes):
+    # samples of the last minutes, oldest first
+    samples = list(ring)
+    if not samples:
+        return samples
+    since = samples[-1][0] - minutes * 60
+    return [sample for sample in samples if sample[0] >= since]
+
+def f_print_daemon_report(ring, minutes, save_as):
+    samples = f_get_ring_window(ring, minutes)
+    f_print_document_begin(save_as)
+    if len(samples) < 2:
+        f_print_table([["not enough samples yet, retry in a moment"]], "Status samples", {1: 'note,l'}, save_as)
+    else:
+        f_print_mysql_overview(samples[0][1], samples[-1][1], max(samples[-1][0] - samples[0][0], 0.001), save_as)
+        f_print_status_samples(samples, save_as)
+    f_print_document_end(save_as)
+
+def f_sample_mysql_status(dbinfo, ring, sample_interval, stop):
+    # keeps one connection open, reconnects on the next tick after an error;
+    # a sample is only the RING_COUNTERS as numbers, not the whole SHOW GLOBAL STATUS
+    conn = None
+    while not stop.is_set():
+        try:
+            if conn is None:
+                conn = f_connect(dbinfo)
+            sample_time, mysqlstatus = f_get_timed_mysql_status(conn)
+            ring.append((sample_time, f_status_vector(mysqlstatus, RING_COUNTERS)))
+        except MySQLdb.Error as e:
+            sys.stderr.write("Error %d: %s\n" % (e.args[0], e.args[1]))
+            if conn is not None:
+                conn.close()
+            conn = None
+        stop.wait(sample_interval)
+    if conn is not None:
+        conn.close()
+
+def f_take_snapshots(dbinfo, repository, snapshot_interval, stop):
+    # repository snapshots scan information_schema.tables, on their own thread so that sampling never stalls
+    conn = None
+    while not stop.is_set():
+        try:
+            if conn is None:
+                conn = f_connect(dbinfo)
+            f_save_snapshot(conn, repository, dbinfo)
+        except MySQLdb.Error as e:
+            sys.stderr.write("Error %d: %s\n" % (e.args[0], e.args[1]))
+            if conn is not None:
+                conn.close()
+            conn = None
+        stop.wait(snapshot_interval)
+    if conn is not None:
+        conn.close()
+
+# sys aggregates served on /metrics, each query returns the label values followed by the value
+ExporterQuery = namedtuple('ExporterQuery', ['name', 'kind', 'help', 'query', 'labels'], defaults=[()])
+
+EXPORTER_QUERIES = (
+    ExporterQuery('memory_allocated_bytes', 'gauge', 'Memory allocated by the server (sys.memory_global_total)',
+                  "SELECT total_allocated FROM sys.x$memory_global_total"),
+    ExporterQuery('innodb_lock_waits', 'gauge', 'Transactions waiting for an InnoDB row lock (sys.innodb_lock_waits)',
+                  "SELECT COUNT(*) FROM sys.x$innodb_lock_waits"),
+    ExporterQuery('io_read_bytes_total', 'counter', 'Bytes read by file IO waits (sys.io_global_by_wait_by_bytes)',
+                  "SELECT IFNULL(SUM(total_read),0) FROM sys.x$io_global_by_wait_by_bytes"),
+    ExporterQuery('io_written_bytes_total', 'counter', 'Bytes written by file IO waits (sys.io_global_by_wait_by_bytes)',
+                  "SELECT IFNULL(SUM(total_written),0) FROM sys.x$io_global_by_wait_by_bytes"),
+    ExporterQuery('user_statements_total', 'counter', 'Statements executed per user (sys.user_summary)',
+                  "SELECT user, statements FROM sys.x$user_summary", ('user',)),
+    ExporterQuery('user_statement_latency_seconds_total', 'counter', 'Statement latency per user (sys.user_summary)',
+                  "SELECT user, statement_latency/1000000000000 FROM sys.x$user_summary", ('user',)),
+    ExporterQuery('user_current_connections', 'gauge', 'Current connections per user (sys.user_summary)',
+                  "SELECT user, current_connections FROM sys.x$user_summary", ('user',)),
+    ExporterQuery('schema_rows_full_scanned_total', 'counter', 'Rows read by full table scans per schema (sys.schema_tables_with_full_table_scans)',
+                  """SELECT object_schema, SUM(rows_full_scanned) FROM sys.x$schema_tables_with_full_table_scans
+                     GROUP BY object_schema""", ('schema',)),
+)
 
-    config = configparser.ConfigParser()
-    config.read(config_file)
-    dbinfo[0] = config.get("database","host")
-    dbinfo[1] = config.get("database","user")
-    dbinfo[2] = config.get("database","passwd")
-    dbinfo[3] = config.get("database","db")
-    dbinfo[4] = config.get("database", "port")
+def f_prometheus_labels(names, values):
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(name + '="' + value + '"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def f_collect_exporter(dbinfo, exporter, exporter_interval, stop):
+    # sys aggregates on their own schedule, scrapes only read the cached lines
+    conn = None
+    while not stop.is_set():
+        start = time.time()
+        lines = []
+        try:
+            if conn is None:
+                conn = f_connect(dbinfo)
+            for item in EXPORTER_QUERIES:
+                try:
+                    rows = f_get_query_record(conn, item.query)
+                except MySQLdb.Error as e:
+                    # client errors (2000+) mean the connection is gone, anything else skips the metric
+                    if e.args[0] >= 2000:
+                        raise
+                    continue
+                lines.append('# HELP mysql_watcher_' + item.name + ' ' + item.help)
+                lines.append('# TYPE mysql_watcher_' + item.name + ' ' + item.kind)
+                for row in rows:
+                    lines.append('mysql_watcher_' + item.name + f_prometheus_labels(item.labels, row[:-1]) + ' ' + str(float(row[-1] or 0)))
+            exporter['lines'] = lines
+            exporter['up'] = 1
+        except MySQLdb.Error as e:
+            sys.stderr.write("Error %d: %s\n" % (e.args[0], e.args[1]))
+            if conn is not None:
+                conn.close()
+            conn = None
+            exporter['up'] = 0
+        exporter['time'] = time.time()
+        exporter['duration'] = exporter['time'] - start
+        stop.wait(exporter_interval)
+    if conn is not None:
+        conn.close()
+
+def f_get_prometheus_text(ring, exporter, window):
+    # MYSQL_METRICS over the last window seconds of the ring plus the cached sys aggregates
+    lines = ['# HELP mysql_watcher_up Whether the last sys aggregate collection succeeded',
+             '# TYPE mysql_watcher_up gauge',
+             'mysql_watcher_up ' + str(exporter.get('up', 0)),
+             '# HELP mysql_watcher_collect_duration_seconds Time the last sys aggregate collection took',
+             '# TYPE mysql_watcher_collect_duration_seconds gauge',
+             'mysql_watcher_collect_duration_seconds ' + str(round(exporter.get('duration', 0), 6)),
+             '# HELP mysql_watcher_collect_timestamp_seconds When the sys aggregates were last collected',
+             '# TYPE mysql_watcher_collect_timestamp_seconds gauge',
+             'mysql_watcher_collect_timestamp_seconds ' + str(round(exporter.get('time', 0), 3))]
+    samples = f_get_ring_window(ring, window / 60.0)
+    if samples:
+        # levels and the raw monotonic counters from the last sample, Prometheus derives rates itself
+        vector2 = f_status_vector(samples[-1][1])
+        lines += ['# HELP mysql_watcher_uptime_seconds Uptimes',
+                  '# TYPE mysql_watcher_uptime_seconds gauge',
+                  'mysql_watcher_uptime_seconds ' + str(float(vector2['Uptime']))]
+        for metric in MYSQL_METRICS:
+            if metric.kind not in ('gauge', 'level_pct'):
+                continue
+            value = f_sum_counters(vector2, metric.num)
+            if metric.kind == 'level_pct':
+                den = f_sum_counters(vector2, metric.den)
+                if not den:
+                    continue
+                value = value * 100.0 / den
+            name = 'mysql_watcher_' + metric.key
+            lines += ['# HELP ' + name + ' ' + metric.label, '# TYPE ' + name + ' gauge', name + ' ' + str(float(value))]
+        for counter in METRIC_COUNTERS:
+            if counter in LEVEL_COUNTERS or counter == 'Uptime':
+                continue
+            name = 'mysql_watcher_status_' + counter.lower() + '_total'
+            lines += ['# HELP ' + name + ' SHOW GLOBAL STATUS ' + counter, '# TYPE ' + name + ' counter',
+                      name + ' ' + str(float(vector2[counter]))]
+    if len(samples) >= 2:
+        # rates and ratios over the window, a ratio of an idle window (nothing in its denominator) is left out
+        seconds = max(samples[-1][0] - samples[0][0], 0.001)
+        vector1 = f_status_vector(samples[0][1])
+        for metric, value, text in f_eval_metrics(vector1, vector2, seconds, WINDOW_METRICS):
+            if metric.den and f_sum_counters(vector2, metric.den) == f_sum_counters(vector1, metric.den):
+                continue
+            name = 'mysql_watcher_' + metric.key
+            lines.append('# HELP ' + name + ' ' + metric.label + ' (last ' + str(int(round(seconds))) + 's)')
+            lines.append('# TYPE ' + name + ' gauge')
+            lines.append(name + ' ' + str(float(value)))
+    lines.extend(exporter.get('lines', []))
+    return '\n'.join(lines) + '\n'
+
+CONTENT_TYPES = {'html': 'text/html', 'json': 'application/json', 'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+class DaemonHandler(BaseHTTPRequestHandler):
+    # GET /report?minutes=10&format=html, GET /metrics
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        if url.path == '/metrics':
+            body = f_get_prometheus_text(self.server.ring, self.server.exporter, self.server.exporter_window).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if url.path != '/report':
+            self.send_error(404)
+            return
+        save_as = params.get('format', ['txt'])[0]
+        minutes = float(params.get('minutes', ['5'])[0])
+        body = f_capture(f_print_daemon_report, self.server.ring, minutes, save_as).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPES.get(save_as, 'text/plain') + '; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def f_run_daemon(config):
+    dbinfo = f_get_dbinfo(config)
+    sample_interval = float(f_get_option(config, "sample_interval", 10))
+    ring = deque(maxlen=int(f_get_option(config, "ring_size", 2160)))
+    if not isinstance(sys.stdout, ReportWriter):
+        sys.stdout = ReportWriter(sys.stdout.buffer)
+    stop = threading.Event()
+    sampler = threading.Thread(target=f_sample_mysql_status, args=(dbinfo, ring, sample_interval, stop))
+    sampler.daemon = True
+    sampler.start()
+    repository = f_get_option(config, "repository", "")
+    if repository:
+        snapshotter = threading.Thread(target=f_take_snapshots,
+                                       args=(dbinfo, repository, float(f_get_option(config, "snapshot_interval", 900)), stop))
+        snapshotter.daemon = True
+        snapshotter.start()
+    exporter = {}
+    exporter_interval = float(f_get_option(config, "exporter_interval", 60))
+    if exporter_interval > 0:
+        collector = threading.Thread(target=f_collect_exporter, args=(dbinfo, exporter, exporter_interval, stop))
+        collector.daemon = True
+        collector.start()
+    server = ThreadingHTTPServer((f_get_option(config, "daemon_host", "127.0.0.1"), int(f_get_option(config, "daemon_port", 8190))), DaemonHandler)
+    server.ring = ring
+    server.exporter = exporter
+    server.exporter_window = float(f_get_option(config, "exporter_window", 60))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+
+SECTIONS = (
+    Section('linux_info', 'Linux info', fn=f_print_linux_info, args=('save_as',), needs_conn=False),
+    Section('filesystem_info', 'Filesystem info', fn=f_print_filesystem_info, args=('save_as',), needs_conn=False),
+    Section('linux_overview', 'Linux Overview', fn=f_print_linux_status, args=('save_as',), needs_conn=False),
+    Section('host_timeseries', 'Host time series', fn=f_print_host_series, args=('start', 'interval', 'save_as'),
+            needs_conn=False, begin=f_start_host_sampler, deferred=True),
+    Section('host_memory_topN', 'Host memory and CPU top{topN}', fn=f_print_host_topN,
+            args=('start', 'interval', 'topN', 'save_as'), needs_conn=False, begin=f_get_process_cpu_times, deferred=True,
+            cost='medium'),
+    Section('mysql_overview', 'MySQL Overview', fn=f_print_mysql_status, args=('start', 'interval', 'save_as'),
+            begin=f_get_timed_mysql_status, deferred=True),
+    Section('innodb_checkpoint_age', 'InnoDB checkpoint age', fn=f_print_innodb_checkpoint, args=('start', 'interval', 'save_as'),
+            begin=f_start_innodb_status, deferred=True, cost='medium'),
+    Section('innodb_pending_io', 'InnoDB pending I/O', fn=f_print_innodb_pending_io, args=('start', 'interval', 'save_as'),
+            begin=f_start_innodb_status, deferred=True, cost='medium'),
+    Section('innodb_latest_deadlock', 'InnoDB latest deadlock', fn=f_print_innodb_deadlock,
+            args=('start', 'interval', 'save_as'), begin=f_start_innodb_status, deferred=True, cost='medium'),
+    Section('sys_parm', 'System Parameter ',
+            """SELECT variable_name,IF(INSTR(variable_name,'size'),
+               CASE
+               WHEN variable_value>=1024*1024*1024*1024*1024 THEN CONCAT(variable_value/1024/1024/1024/1024/1024,'P')
+               WHEN variable_value>=1024*1024*1024*1024 THEN CONCAT(variable_value/1024/1024/1024/1024,'T')
+               WHEN variable_value>=1024*1024*1024 THEN CONCAT(variable_value/1024/1024/1024,'G')
+               WHEN variable_value>=1024*1024 THEN CONCAT(variable_value/1024/1024,'M')
+               WHEN variable_value>=1024 THEN CONCAT(variable_value/1024,'K')
+               ELSE variable_value END ,
+               variable_value)
+               FROM {perfor_or_infor}.global_variables
+               where variable_name in ({sys_parm_filter})""",
+            {1: 'parameter_name,l', 2: 'value,r'}),
+    Section('sys_parm', 'Optimizer Switch', fn=f_print_optimizer_switch, args=('save_as', 'perfor_or_infor')),
+    Section('log_error_statistics', 'Log file Statistics', fn=f_print_log_error, args=('perfor_or_infor', 'state_dir', 'save_as'),
+            cost='medium'),
+    Section('slow_log_topN', 'Slow log top{topN}', fn=f_print_slow_log, args=('state_dir', 'topN', 'save_as'),
+            cost='medium'),
+    Section('replication', 'Replication',
+            """SELECT USER,HOST,command,CONCAT(FLOOR(TIME/86400),'d',FLOOR(TIME/3600)%24,'h',FLOOR(TIME/60)%60,'m',TIME%60,'s') TIMES,state
+               FROM information_schema.processlist WHERE COMMAND = 'Binlog Dump' OR COMMAND = 'Binlog Dump GTID'""",
+            {1: 'USER,l', 2: 'HOST,l', 3: 'command,l', 4: 'TIMES,r', 5: 'state,r'},
+            cost='light'),
+    Section('replication_lag', 'Replication lag', fn=f_print_replication_lag, args=('start', 'interval', 'save_as'),
+            needs_conn=False, begin=f_start_replication_sampler, begin_args=('dbinfo',), deferred=True),
+    Section('connect_count', 'Connect Count',
+            """SELECT SUBSTRING_INDEX(HOST,':',1) HOSTS,USER,db,command,COUNT(*),SUM(TIME)
+               FROM information_schema.processlist
+               WHERE Command !='' AND DB !='information_schema'
+               GROUP BY HOSTS,USER,db,command""",
+            {1: 'HOSTS,l', 2: 'USER,l', 3: 'db,l', 4: 'command,l', 5: 'COUNT(*),r', 6: 'SUM(TIME),r'},
+            cost='light'),
+    Section('avg_query_time', 'Avg Query Time',
+            """SELECT schema_name,SUM(count_star) COUNT, ROUND((SUM(sum_timer_wait)/SUM(count_star))/1000000) avg_microsec
+               FROM performance_schema.events_statements_summary_by_digest
+               WHERE schema_name IS NOT NULL
+               GROUP BY schema_name""",
+            {1: 'schema_name,l', 2: 'COUNT,r', 3: 'avg_microsec,r'},
+            min_version=(5, 7), cost='medium'),
+    Section('digest_delta_topN', 'Statement digests in interval', fn=f_print_digest_window,
+            args=('start', 'interval', 'topN', 'save_as'), begin=f_get_digests, deferred=True, cost='medium'),
+    Section('mysqld_thread_cpu_topN', 'mysqld thread CPU top{topN}', fn=f_print_mysqld_thread_cpu,
+            args=('start', 'interval', 'topN', 'save_as'), begin=f_get_mysqld_task_cpu, deferred=True,
+            min_version=(5, 7)),
+    Section('tail_latency_topN', 'Tail latency top{topN}', fn=f_print_tail_latency,
+            args=('start', 'interval', 'topN', 'save_as'), begin=f_get_histograms, deferred=True,
+            min_version=(8, 0), cost='medium'),
+    Section('slow_query_topN', 'Slow Query Top{topN}',
+            """SELECT QUERY,db,exec_count,total_latency,max_latency,avg_latency FROM sys.statements_with_runtimes_in_95th_percentile LIMIT {topN}""",
+            {1: 'QUERY,l', 2: 'db,r', 3: 'exec_count,r', 4: 'total_latency,r', 5: 'max_latency,r', 6: 'avg_latency,r'},
+            units={1: 'text', 4: 'time', 5: 'time', 6: 'time'}, needs_sys=True, cost='heavy'),
+    Section('err_sql_count', 'Err Sql Count',
+            """SELECT schema_name,SUM(sum_errors) err_count
+               FROM performance_schema.events_statements_summary_by_digest
+               WHERE sum_errors > 0
+               GROUP BY schema_name""",
+            {1: 'schema_name,l', 2: 'err_count,r'},
+            min_version=(5, 7), max_version=(5, 7), cost='medium'),
+    Section('err_sql_topN', 'Err SQL Top{topN}',
+            """SELECT QUERY,db,exec_count,ERRORS FROM sys.statements_with_errors_or_warnings ORDER BY ERRORS DESC LIMIT {topN}""",
+            {1: 'QUERY,l', 2: 'db,r', 3: 'exec_count,r', 4: 'ERRORS,r'},
+            units={1: 'text'}, needs_sys=True, cost='medium'),
+    Section('query_analysis_topN', 'query analysis top{topN}',
+            """SELECT QUERY,full_scan,exec_count,total_latency,lock_latency,rows_sent_avg,rows_examined_avg,
+               tmp_tables,tmp_disk_tables,rows_sorted,last_seen
+               FROM sys.statement_analysis
+               where db='{db}' ORDER BY total_latency DESC  LIMIT {topN}""",
+            {1: 'QUERY,l', 2: 'fscan,l', 3: 'ex_cot,r', 4: 'total_ltc,r', 5:'lock_ltc,r', 6: 'rw_st_avg,r', 7: 'rw_exm_avg,9,r',8: 'tmp_table,9,r',9: 'tp_dk_tab,9,r',10: 'rows_sort,9,r',11: 'last_seen,19,r'},
+            units={1: 'text', 4: 'time', 5: 'time'}, needs_sys=True, cost='medium'),
+    Section('query_full_table_scans_topN', 'query full table scans top{topN}',
+            """SELECT QUERY,exec_count,total_latency,no_index_used_count,no_good_index_used_count,no_index_used_pct,rows_sent_avg,rows_examined_avg,last_seen
+               FROM sys.statements_with_full_table_scans
+               where db='{db}' ORDER BY total_latency DESC  LIMIT {topN}""",
+            {1: 'QUERY,l', 2: 'ex_cot,r', 3: 'total_ltc,r', 4:'no_idx_use,r', 5: 'n_g_idx_use,r',6: 'n_i_u_pct,r', 7: 'rw_st_avg,r',8: 'rw_exm_avg,r',9: 'last_seen,r'},
+            units={1: 'text', 3: 'time'}, needs_sys=True, cost='medium'),
+    Section('query_sorting_topN', 'query sorting top{topN}',
+            """SELECT QUERY,exec_count,total_latency,sort_merge_passes,avg_sort_merges,sorts_using_scans,sort_using_range,
+               rows_sorted,avg_rows_sorted,last_seen
+               FROM sys.statements_with_sorting
+               where db='{db}' ORDER BY avg_rows_sorted DESC  LIMIT {topN}""",
+            {1: 'QUERY,l', 2: 'ex_cot,r', 3: 'total_ltc,r', 4:'st_mg_ps,r', 5: 'avg_st_mg,r',6: 'st_us_scan,r', 7: 'st_us_rag,r',8: 'rows_sort,r',9: 'avg_rw_st,r',10: 'last_seen,r'},
+            units={1: 'text', 3: 'time'}, needs_sys=True, cost='medium'),
+    Section('query_with_temp_tables_topN', 'query with temp tables top{topN}',
+            """SELECT QUERY,exec_count,total_latency,memory_tmp_tables,disk_tmp_tables,avg_tmp_tables_per_query,tmp_tables_to_disk_pct,last_seen
+               FROM sys.statements_with_temp_tables
+               where db='{db}' ORDER BY avg_tmp_tables_per_query DESC  LIMIT {topN}""",
+            {1: 'QUERY,l', 2: 'ex_cot,r', 3: 'total_ltc,r', 4:'mem_tmp_tab,r', 5: 'dsk_tmp_tab,r',6: 'avg_tt_per_qry,r', 7: 'tt_to_dk_pct,r',8:'last_seen,r'},
+            units={1: 'text', 3: 'time'}, needs_sys=True, cost='medium'),
+    Section('database_size', 'Database Size',
+            """SELECT table_schema,
+               CONCAT(ROUND(SUM(data_length)/(1024*1024),2),'MB') AS 'Table Size',
+               CONCAT(ROUND(SUM(index_length)/(1024*1024),2),'MB') AS 'Index Size' ,
+               CONCAT(ROUND(SUM(data_length)/(1024*1024),2) + ROUND(SUM(index_length)/(1024*1024),2),'MB') AS 'DB Size'
+               FROM information_schema.tables GROUP BY table_schema
+               UNION
+               SELECT '*** all ***' table_schema,
+               CONCAT(ROUND(SUM(data_length)/(1024*1024),2),'MB') AS 'Table Size',
+               CONCAT(ROUND(SUM(index_length)/(1024*1024),2),'MB') AS 'Index Size' ,
+               CONCAT(ROUND(SUM(data_length)/(1024*1024),2) + ROUND(SUM(index_length)/(1024*1024),2),'MB') AS 'DB Size'
+               FROM information_schema.tables""",
+            {1: 'table_schema,l', 2: 'Table Size,r', 3: 'Index Size,r', 4: 'DB Size,r'},
+            cost='heavy', cacheable=True),
+    Section('object_count', 'Object Count',
+            """SELECT information_schema.routines.ROUTINE_TYPE AS object_type, COUNT(0) AS COUNT FROM information_schema.routines
+               WHERE information_schema.routines.ROUTINE_SCHEMA='{db}' GROUP BY information_schema.routines.ROUTINE_TYPE UNION
+               SELECT information_schema.tables.TABLE_TYPE AS object_type, COUNT(0) AS COUNT FROM information_schema.tables
+               WHERE information_schema.tables.TABLE_SCHEMA='{db}' GROUP BY information_schema.tables.TABLE_TYPE UNION
+               SELECT CONCAT('INDEX (',information_schema.statistics.INDEX_TYPE,')') AS object_type,COUNT(0) AS COUNT FROM information_schema.statistics
+               WHERE information_schema.statistics.TABLE_SCHEMA='{db}' GROUP BY information_schema.statistics.INDEX_TYPE UNION
+               SELECT 'TRIGGER' AS `TRIGGER`,COUNT(0) AS COUNT FROM information_schema.triggers
+               WHERE information_schema.triggers.TRIGGER_SCHEMA='{db}' UNION
+               SELECT 'EVENT' AS object_type, COUNT(0) AS COUNT FROM information_schema.events
+               WHERE information_schema.events.EVENT_SCHEMA='{db}'""",
+            {1:'object_type,l',2: 'COUNT,r'},
+            formats=('txt',), cost='heavy', cacheable=True),
+    Section('table_info', 'Table Info',
+            """select table_name,engine,row_format as format,table_rows,avg_row_length as avg_row,
+               round((data_length)/1024/1024,2) as data_mb,
+               round((index_length)/1024/1024,2) as index_mb,
+               round((data_length+index_length)/1024/1024,2) as total_mb
+               from information_schema.tables
+               where table_schema='{db}'""",
+            {1: 'table_name,l', 2: 'engine,l', 3: 'format,l', 4: 'table_rows,r', 5: 'avg_row,r', 6: 'data_mb,r', 7: 'index_mb,r', 8: 'total_mb,r'},
+            cost='heavy', cacheable=True),
+    Section('index_info', 'Index Info',
+            """select index_name,non_unique,seq_in_index,column_name,collation,cardinality,nullable,index_type
+               from information_schema.statistics
+               where table_schema='{db}'""",
+            {1: 'index_name,l', 2: 'non_unique,l', 3: 'seq_in_index,l', 4: 'column_name,l', 5: 'collation,r', 6: 'cardinality,r', 7: 'nullable,r', 8: 'index_type,r'},
+            cost='heavy', cacheable=True),
+    Section('schema_index_statistics', 'schema_index_statistics',
+            """SELECT table_name,index_name ,rows_selected,select_latency,rows_inserted,insert_latency,rows_updated,
+               update_latency,rows_deleted,delete_latency
+               FROM sys.schema_index_statistics where table_schema='{db}' ORDER BY table_name""",
+            {1: 'table_name,l', 2: 'index_name,l', 3: 'rows_selected,r', 4: 'select_latency,r',5: 'rows_inserted,r', 6: 'insert_latency,r', 7: 'rows_updated,r', 8: 'update_latency,r', 9: 'rows_deleted,r',10: 'delete_latency,r'},
+            units={4: 'time', 6: 'time', 8: 'time', 10: 'time'}, needs_sys=True, cost='heavy'),
+    Section('schema_table_statistics', 'schema_table_statistics',
+            """SELECT table_name,total_latency ,rows_fetched,fetch_latency,rows_inserted,insert_latency,rows_updated,
+               update_latency,rows_deleted,delete_latency,io_read_requests,io_read,io_read_latency,io_write_requests,
+               io_write,io_write_latency,io_misc_requests,io_misc_latency
+               FROM sys.schema_table_statistics  where table_schema='{db}' ORDER BY table_name""",
+            {1: 'table_name,l', 2: 'tal_ltc,r', 3: 'rw_ftc,r', 4: 'ftc_ltc,r', 5: 'rw_ins,r', 6: 'ins_ltc,r', 7: 'rw_upd,r', 8: 'upd_ltc,r', 9: 'rw_del,r', 10: 'del_ltc,r', 11: 'io_rd_rq,r', 12: 'io_read,r', 13: 'io_rd_ltc,r', 14: 'io_wt_rq,r', 15: 'io_write,r',16: 'io_wt_ltc,r', 17: 'io_ms_rq,r',18: 'io_ms_ltc,r'},
+            units={2: 'time', 4: 'time', 6: 'time', 8: 'time', 10: 'time', 12: 'bytes', 13: 'time', 15: 'bytes', 16: 'time', 18: 'time'},
+            needs_sys=True, cost='heavy'),
+    Section('schema_table_statistics_with_buffer', 'schema_table_statistics_with_buffer',
+            """SELECT table_name,innodb_buffer_allocated,innodb_buffer_data,innodb_buffer_free,innodb_buffer_pages,
+               innodb_buffer_pages_hashed,innodb_buffer_pages_old,innodb_buffer_rows_cached
+               FROM sys.schema_table_statistics_with_buffer where table_schema='{db}' ORDER BY table_name""",
+            {1: 'table_name,l', 2: 'indb_buf_alc,r', 3: 'indb_buf_data,r', 4: 'indb_buf_free,r', 5: 'indb_buf_page,r', 6: 'indb_buf_page_hash,r', 7: 'indb_buf_page_old,r', 8: 'indb_buf_rw_cach,r'},
+            units={2: 'bytes', 3: 'bytes', 4: 'bytes'}, needs_sys=True, cost='heavy'),
+    Section('schema_tables_with_full_table_scans', 'schema_tables_with_full_table_scans',
+            """SELECT object_schema,object_name,rows_full_scanned,latency FROM sys.schema_tables_with_full_table_scans
+               where object_schema='{db}' ORDER BY object_name""",
+            {1: 'object_schema,l', 2: 'object_name,l', 3: 'rows_full_scanned,r', 4: 'latency,r'},
+            units={4: 'time'}, needs_sys=True, cost='heavy'),
+    Section('schema_unused_indexes', 'Schema Unused Indexes',
+            """SELECT object_schema,object_name,index_name FROM sys.schema_unused_indexes where object_schema='{db}'""",
+            {1: 'object_schema,l', 2: 'object_name,l', 3: 'index_name,l'},
+            needs_sys=True, cost='heavy'),
+    #host 监听连接过的主机 statements 当前主机执行的语句总数 statement_latency 语句等待时间（延迟时间） statement_avg_latency 执行语句平均延迟时间 table_scans 表扫描次数
+    #file_ios io时间总数 file_io_latency 文件io延迟 current_connections 当前连接数 total_connections 总链接数 unique_users 该主机的唯一用户数 current_memory 当前账户分配的内存
+    #total_memory_allocated 该主机分配的内存总数
+    Section('host_summary', 'host_summary',
+            """SELECT host,statements,statement_latency,statement_avg_latency,table_scans,file_ios,file_io_latency,current_connections,
+               total_connections,unique_users
+               FROM sys.host_summary""",
+            {1: 'host,l', 2: 'statements,r', 3: 'st_ltc,r', 4: 'st_avg_ltc,r', 5: 'table_scan,r', 6: 'file_ios,r',
+             7: 'f_io_ltc,r', 8: 'cur_conns,r', 9: 'total_conn,r', 10: 'unq_users,r'},
+            max_version=(5, 6), units={3: 'time', 4: 'time', 7: 'time'}, needs_sys=True, cost='medium'),
+    Section('host_summary', 'host_summary',
+            """SELECT host,statements,statement_latency,statement_avg_latency,table_scans,file_ios,file_io_latency,current_connections,
+               total_connections,unique_users,current_memory,total_memory_allocated
+               FROM sys.host_summary""",
+            {1: 'host,l', 2: 'statements,r', 3: 'st_ltc,r', 4: 'st_avg_ltc,r', 5: 'table_scan,r', 6: 'file_ios,r',
+             7: 'f_io_ltc,r', 8: 'cur_conns,r', 9: 'total_conn,r', 10: 'unq_users,r', 11: 'cur_mem,r',
+             12: 'tal_mem_alc,r'},
+            min_version=(5, 7), units={3: 'time', 4: 'time', 7: 'time', 11: 'bytes', 12: 'bytes'}, needs_sys=True, cost='medium'),
+    #•host 主机 event_name IO事件名称 total 该主机发生的事件 total_latency 该主机发生IO事件总延迟时间 max_latency 该主机IO事件中最大的延迟时间
+    Section('host_summary_by_file_io_type', 'host_summary_by_file_io_type',
+            """SELECT host,event_name,total,total_latency,max_latency
+               FROM sys.host_summary_by_file_io_type""",
+            {1: 'host,l', 2: 'event_name,l', 3: 'total,r', 4: 'total_ltc,r', 5: 'max_ltc,r'},
+            units={4: 'time', 5: 'time'}, needs_sys=True, cost='medium'),
+    #•host 主机 ios IO事件总数 io_latency IO总的延迟时间
+    Section('host_summary_by_file_io', 'host_summary_by_file_io_type',
+            """SELECT host,ios,io_latency
+               FROM sys.host_summary_by_file_io""",
+            {1: 'host,l', 2: 'ios,r', 3: 'io_latency,r'},
+            units={3: 'time'}, needs_sys=True, cost='medium'),
+    #•host 主机  event_name stage event名称 total stage event发生的总数 total_latency stage event总的延迟时间 avg_latency stage event平均延迟时间
+    Section('host_summary_by_stages', 'host_summary_by_stages',
+            """SELECT host,event_name,total,total_latency,avg_latency
+               FROM sys.host_summary_by_stages""",
+            {1: 'host,l', 2: 'event_name,l', 3: 'total,r', 4: 'total_latency,r', 5: 'avg_latency,r'},
+            units={4: 'time', 5: 'time'}, needs_sys=True, cost='medium'),
+    #host 主机  total 这个主机的语句总数  total_latency 这个主机总的延迟时间 max_latency 主机最大的延迟时间 lock_latency 等待锁的锁延迟时间
+    #rows_sent 该主机通过语句返回的总行数 rows_examined 在存储引擎上通过语句返回的行数 rows_affected 该主机通过语句影响的总行数 full_scans 全表扫描的语句总数
+    Section('host_summary_by_statement_latency', 'host_summary_by_statement_latency',
+            """SELECT host,total,total_latency,max_latency,lock_latency,rows_sent,rows_examined,rows_affected,full_scans
+               FROM sys.host_summary_by_statement_latency""",
+            {1: 'host,l', 2: 'total,r', 3: 'total_latency,r', 4: 'max_latency,r', 5: 'lock_latency,r', 6: 'rows_sent,r', 7: 'rows_examined,r', 8: 'rows_affected,r',9: 'full_scans,r'},
+            units={3: 'time', 4: 'time', 5: 'time'}, needs_sys=True, cost='medium'),
+    #host 主机  statement 最后的语句事件名称 total sql语句总数 total_latency sql语句总延迟数 max_latency 最大的sql语句延迟数
+    # lock_latency 锁延迟总数 rows_sent 语句返回的行总数 rows_examined 通过存储引擎的sql语句的读取的总行数 rows_affected 语句影响的总行数 full_scans 全表扫描的语句事件总数
+    Section('host_summary_by_statement_type', 'host_summary_by_statement_type',
+            """SELECT host,statement,total,total_latency,max_latency,lock_latency,rows_sent,rows_examined,rows_affected,full_scans
+               FROM sys.host_summary_by_statement_type""",
+            {1: 'host,l', 2: 'statement,l', 3: 'total,r', 4: 'total_latency,r', 5: 'max_latency,r', 6: 'lock_latency,r', 7: 'rows_sent,r', 8: 'rows_examined,r',9: 'rows_affected,r',10: 'full_scans,r'},
+            units={4: 'time', 5: 'time', 6: 'time'}, needs_sys=True, cost='medium'),
+    # statements 当前用户执行的语句总数 statement_latency 语句等待时间（延迟时间） statement_avg_latency 执行语句平均延迟时间 table_scans 表扫描次数
+    #file_ios io时间总数 file_io_latency 文件io延迟 current_connections 当前连接数 total_connections 总链接数 unique_users 该用户的唯一主机数 current_memory 当前账户分配的内存
+    #total_memory_allocated 该主机分配的内存总数
+    Section('user_summary', 'user_summary',
+            """SELECT user,statements,statement_latency,statement_avg_latency,table_scans,file_ios,file_io_latency,current_connections,
+               total_connections,unique_hosts
+               FROM sys.user_summary""",
+            {1: 'user,l', 2: 'statements,r', 3: 'st_ltc,r', 4: 'st_avg_ltc,r', 5: 'table_scan,r', 6: 'file_ios,r',
+             7: 'f_io_ltc,r', 8: 'cur_conns,r', 9: 'total_conn,r', 10: 'unq_hosts,r'},
+            max_version=(5, 6), units={3: 'time', 4: 'time', 7: 'time'}, needs_sys=True, cost='medium'),
+    Section('user_summary', 'user_summary',
+            """SELECT user,statements,statement_latency,statement_avg_latency,table_scans,file_ios,file_io_latency,current_connections,
+               total_connections,unique_hosts,current_memory,total_memory_allocated
+               FROM sys.user_summary""",
+            {1: 'user,l', 2: 'statements,r', 3: 'st_ltc,r', 4: 'st_avg_ltc,r', 5: 'table_scan,r', 6: 'file_ios,r',
+             7: 'f_io_ltc,r', 8: 'cur_conns,r', 9: 'total_conn,r', 10: 'unq_hosts,r', 11: 'cur_mem,r', 12: 'tal_mem_alc,r'},
+            min_version=(5, 7), units={3: 'time', 4: 'time', 7: 'time', 11: 'bytes', 12: 'bytes'}, needs_sys=True, cost='medium'),
+    #event_name IO事件名称 total 该用户发生的事件 total_latency 该用户发生IO事件总延迟时间 max_latency 该用户IO事件中最大的延迟时间
+    Section('user_summary_by_file_io_type', 'user_summary_by_file_io_type',
+            """SELECT user,event_name,total,latency,max_latency
+               FROM sys.user_summary_by_file_io_type""",
+            {1: 'user,l', 2: 'event_name,l', 3: 'total,r', 4: 'latency,r', 5: 'max_ltc,r'},
+            units={4: 'time', 5: 'time'}, needs_sys=True, cost='medium'),
+    # ios IO事件总数 io_latency IO总的延迟时间
+    Section('user_summary_by_file_io', 'user_summary_by_file_io_type',
+            """SELECT user,ios,io_latency
+               FROM sys.user_summary_by_file_io""",
+            {1: 'user,l', 2: 'ios,r', 3: 'io_latency,r'},
+            units={3: 'time'}, needs_sys=True, cost='medium'),
+    #  event_name stage event名称 total stage event发生的总数 total_latency stage event总的延迟时间 avg_latency stage event平均延迟时间
+    Section('user_summary_by_stages', 'user_summary_by_stages',
+            """SELECT user,event_name,total,total_latency,avg_latency
+               FROM sys.user_summary_by_stages""",
+            {1: 'user,l', 2: 'event_name,l', 3: 'total,r', 4: 'total_latency,r', 5: 'avg_latency,r'},
+            units={4: 'time', 5: 'time'}, needs_sys=True, cost='medium'),
+    #  total 这个主机的语句总数  total_latency 这个主机总的延迟时间 max_latency 主机最大的延迟时间 lock_latency 等待锁的锁延迟时间
+    #rows_sent 该主机通过语句返回的总行数 rows_examined 在存储引擎上通过语句返回的行数 rows_affected 该主机通过语句影响的总行数 full_scans 全表扫描的语句总数
+    Section('user_summary_by_statement_latency', 'user_summary_by_statement_latency',
+            """SELECT user,total,total_latency,max_latency,lock_latency,rows_sent,rows_examined,rows_affected,full_scans
+               FROM sys.user_summary_by_statement_latency""",
+            {1: 'user,l', 2: 'total,r', 3: 'total_latency,r', 4: 'max_latency,r', 5: 'lock_latency,r', 6: 'rows_sent,r', 7: 'rows_examined,r', 8: 'rows_affected,r',9: 'full_scans,r'},
+            units={3: 'time', 4: 'time', 5: 'time'}, needs_sys=True, cost='medium'),
+    #statement 最后的语句事件名称 total sql语句总数 total_latency sql语句总延迟数 max_latency 最大的sql语句延迟数
+    # lock_latency 锁延迟总数 rows_sent 语句返回的行总数 rows_examined 通过存储引擎的sql语句的读取的总行数 rows_affected 语句影响的总行数 full_scans 全表扫描的语句事件总数
+    Section('user_summary_by_statement_type', 'user_summary_by_statement_type',
+            """SELECT user,statement,total,total_latency,max_latency,lock_latency,rows_sent,rows_examined,rows_affected,full_scans
+               FROM sys.user_summary_by_statement_type""",
+            {1: 'user,l', 2: 'statement,l', 3: 'total,r', 4: 'total_latency,r', 5: 'max_latency,r', 6: 'lock_latency,r', 7: 'rows_sent,r', 8: 'rows_examined,r',9: 'rows_affected,r',10: 'full_scans,r'},
+            units={4: 'time', 5: 'time', 6: 'time'}, needs_sys=True, cost='medium'),
+    #object_schema 数据库名称 allocated 分配给当前数据库的总的字节数 data 分配给当前数据库的数据字节数 pages 分配给当前数据库的总页数
+    # pages_hashed 分配给当前数据库的hash页数 pages_old 分配给当前数据库的旧页数  rows_cached 当前数据库缓存的行数
+    Section('innodb_buffer_stats_by_schema', 'innodb_buffer_stats_by_schema',
+            """SELECT object_schema,allocated,data,pages,pages_hashed,pages_old,rows_cached
+               FROM sys.innodb_buffer_stats_by_schema""",
+            {1: 'object_schema,l', 2: 'allocated,r', 3: 'data,r', 4: 'pages,r', 5: 'pages_hashed,r', 6: 'pages_old,r', 7: 'rows_cached,r'},
+            units={2: 'bytes', 3: 'bytes'}, needs_sys=True, cost='heavy'),
+    # object_schema 数据库名称 object_name 表名称 allocated 分配给表的总字节数 data 分配该表的数据字节数 pages 分配给表的页数
+    #  pages_hashed 分配给表的hash页数 pages_old 分配给表的旧页数 rows_cached 表的行缓存数
+    Section('innodb_buffer_stats_by_table', 'innodb_buffer_stats_by_table',
+            """SELECT object_schema,object_name,allocated,data,pages,pages_hashed,pages_old,rows_cached
+               FROM sys.innodb_buffer_stats_by_table""",
+            {1: 'object_schema,l', 2: 'object_name,l', 3: 'allocated,r', 4: 'data,r', 5: 'pages,r', 6: 'pages_hashed,r', 7: 'pages_old,r', 8: 'rows_cached,r'},
+            units={3: 'bytes', 4: 'bytes'}, needs_sys=True, cost='heavy'),
+    #user 对于当前线程来说，这个值是线程被分配的账户，对于后台线程来讲，就是线程的名称 total IO事件的总数 total_latency IO事件的总延迟
+    # min_latency 单个最小的IO事件延迟 avg_latency 平均IO延迟 max_latency 最大IO延迟 thread_id 线程ID processlist_id 对于当前线程就是此时的ID，对于后台就是null
+    Section('io_by_thread_by_latency_topN', 'io_by_thread_by_latency top{topN}',
+            """SELECT user,total,total_latency,min_latency,avg_latency,max_latency,thread_id,processlist_id
+               FROM sys.io_by_thread_by_latency  LIMIT {topN}""",
+            {1: 'user,l', 2: 'total,r', 3: 'total_latency,r', 4: 'min_latency,r', 5: 'avg_latency,r', 6: 'max_latency,r', 7: 'thread_id,r', 8: 'processlist_id,r'},
+            units={3: 'time', 4: 'time', 5: 'time', 6: 'time'}, needs_sys=True, cost='medium'),
+    Section('io_global_by_file_by_bytes_topN', 'io_global_by_file_by_bytes top{topN}',
+            """SELECT file,count_read,total_read,avg_read,count_write,total_written,avg_write,total,write_pct
+               FROM sys.io_global_by_file_by_bytes  LIMIT {topN}""",
+            {1: 'file,l', 2: 'count_read,r', 3: 'total_read,r', 4: 'avg_read,r', 5: 'count_write,r', 6: 'total_written,r', 7: 'avg_write,r', 8: 'total,r', 9: 'write_pct,r'},
+            units={3: 'bytes', 4: 'bytes', 6: 'bytes', 7: 'bytes', 8: 'bytes'}, needs_sys=True, cost='heavy'),
+    Section('io_global_by_file_by_latency_topN', 'io_global_by_file_by_latency top{topN}',
+            """SELECT file,total,total_latency,count_read,read_latency,count_write,write_latency,count_misc,misc_latency
+               FROM sys.io_global_by_file_by_latency  LIMIT {topN}""",
+            {1: 'file,l', 2: 'total,r', 3: 'total_latency,r', 4: 'count_read,r', 5: 'read_latency,r', 6: 'count_write,r', 7: 'write_latency,r', 8: 'count_misc,r', 9: 'misc_latency,r'},
+            units={3: 'time', 5: 'time', 7: 'time', 9: 'time'}, needs_sys=True, cost='heavy'),
+    Section('io_global_by_wait_by_bytes_topN', 'io_global_by_wait_by_bytes top{topN}',
+            """SELECT event_name,total,total_latency,min_latency,avg_latency,max_latency,count_read,total_read,avg_read,count_write,
+               total_written,avg_written,total_requested
+               FROM sys.io_global_by_wait_by_bytes  LIMIT {topN}""",
+            {1: 'event_name,l', 2: 'total,r', 3: 'total_latency,r', 4: 'min_latency,r', 5: 'avg_latency,r', 6: 'max_latency,r', 7: 'count_read,r', 8: 'total_read,r', 9: 'avg_read,r', 10: 'count_write,r', 11: 'total_written,r', 12: 'avg_written,r', 13: 'total_requested,r'},
+            units={3: 'time', 4: 'time', 5: 'time', 6: 'time', 8: 'bytes', 9: 'bytes', 11: 'bytes', 12: 'bytes', 13: 'bytes'},
+            needs_sys=True, cost='medium'),
+    Section('io_global_by_wait_by_latency_topN', 'io_global_by_wait_by_latency top{topN}',
+            """SELECT event_name,total,total_latency,avg_latency,max_latency,read_latency,write_latency,misc_latency,count_read,
+               total_read,avg_read,count_write,total_written,avg_written
+               FROM sys.io_global_by_wait_by_latency  LIMIT {topN}""",
+            {1: 'event_name,l', 2: 'total,r', 3: 'total_latency,r', 4: 'avg_latency,r', 5: 'max_latency,r', 6: 'read_latency,r', 7: 'write_latency,r', 8: 'misc_latency,r', 9: 'count_read,r', 10: 'total_read,r', 11: 'avg_read,r', 12: 'count_write,r', 13: 'total_written,r', 14: 'avg_written,r'},
+            units={3: 'time', 4: 'time', 5: 'time', 6: 'time', 7: 'time', 8: 'time', 10: 'bytes', 11: 'bytes', 13: 'bytes', 14: 'bytes'},
+            needs_sys=True, cost='medium'),
+    Section('wait_classes_global_by_avg_latency', 'wait_classes_global_by_avg_latency',
+            """SELECT event_class,total,total_latency,min_latency,avg_latency,max_latency
+               FROM sys.wait_classes_global_by_avg_latency""",
+            {1: 'event_class,l', 2: 'total,r', 3: 'total_latency,r',4: 'min_latency,r', 5: 'avg_latency,r', 6: 'max_latency,r'},
+            units={3: 'time', 4: 'time', 5: 'time', 6: 'time'}, needs_sys=True, cost='medium'),
+    Section('wait_classes_global_by_latency', 'wait_classes_global_by_latency',
+            """SELECT event_class,total,total_latency,min_latency,avg_latency,max_latency
+               FROM sys.wait_classes_global_by_latency""",
+            {1: 'event_class,l', 2: 'total,r', 3: 'total_latency,r',4: 'min_latency,r', 5: 'avg_latency,r', 6: 'max_latency,r'},
+            units={3: 'time', 4: 'time', 5: 'time', 6: 'time'}, needs_sys=True, cost='medium'),
+    Section('waits_by_host_by_latency', 'waits_by_host_by_latency',
+            """SELECT HOST,EVENT,total,total_latency,avg_latency,max_latency
+               FROM sys.waits_by_host_by_latency""",
+            {1: 'host,l',2: 'event,l', 3: 'total,r', 4: 'total_latency,r',5: 'avg_latency,r', 6: 'max_latency,r'},
+            units={4: 'time', 5: 'time', 6: 'time'}, needs_sys=True, cost='medium'),
+    Section('waits_by_user_by_latency', 'waits_by_user_by_latency',
+            """SELECT USER,EVENT,total,total_latency,avg_latency,max_latency
+               FROM sys.waits_by_user_by_latency""",
+            {1: 'user,l',2: 'event,l', 3: 'total,r', 4: 'total_latency,r',5: 'avg_latency,r', 6: 'max_latency,r'},
+            units={4: 'time', 5: 'time', 6: 'time'}, needs_sys=True, cost='medium'),
+    Section('waits_global_by_latency', 'waits_global_by_latency',
+            """SELECT EVENTS,total,total_latency,avg_latency,max_latency
+               FROM sys.waits_global_by_latency""",
+            {1: 'event,l', 2: 'total,r', 3: 'total_latency,r',4: 'avg_latency,r', 5: 'max_latency,r'},
+            units={3: 'time', 4: 'time', 5: 'time'}, needs_sys=True, cost='medium'),
+    #,sql_kill_blocking_query,sql_kill_blocking_connection
+    Section('schema_table_lock_waits', 'schema_table_lock_waits',
+            """SELECT object_schema,object_name,waiting_account,waiting_lock_type,
+               waiting_lock_duration,waiting_query,waiting_query_secs,waiting_query_rows_affected,waiting_query_rows_examined,
+               blocking_account,blocking_lock_type,blocking_lock_duration
+               FROM sys.schema_table_lock_waits""",
+            {1: 'object_schema,l', 2: 'object_name,r', 3: 'wait_account,r', 4: 'wt_lk_tp,l', 5: 'w_l_dur,l', 6: 'waiting_query,l', 7: 'w_qry_s,l', 8: 'w_q_r_a,l',9: 'w_q_r_e,l',10: 'blk_account,l', 11: 'bk_lk_tp,l',12: 'b_l_dur,l'},
+            min_version=(5, 7), units={6: 'text'}, needs_sys=True, cost='medium'),
+    #wait_started 锁等待发生的时间 wait_age 锁已经等待了多长时间 wait_age_secs 以秒为单位显示锁已经等待的时间
+    #locked_table 被锁的表 locked_index 被锁住的索引 locked_type 锁类型 waiting_trx_id 正在等待的事务ID waiting_trx_started 等待事务开始的时间
+    #waiting_trx_age 已经等待事务多长时间 waiting_trx_rows_locked 正在等待的事务被锁的行数量 waiting_trx_rows_modified 正在等待行重定义的数量
+    #waiting_pid 正在等待事务的线程id waiting_query 正在等待锁的查询 waiting_lock_id 正在等待锁的ID waiting_lock_mode 等待锁的模式
+    #blocking_trx_id 阻塞等待锁的事务id blocking_pid 正在锁的线程id blocking_query 正在锁的查询 blocking_lock_id 正在阻塞等待锁的锁id.
+    #blocking_lock_mode 阻塞锁模式 blocking_trx_started 阻塞事务开始的时间 blocking_trx_age 阻塞的事务已经执行的时间 blocking_trx_rows_locked 阻塞事务锁住的行的数量
+    # blocking_trx_rows_modified 阻塞事务重定义行的数量 sql_kill_blocking_query kill 语句杀死正在运行的阻塞事务 sql_kill_blocking_connection kill 语句杀死会话中正在运行的阻塞事务
+    Section('innodb_lock_waits', 'innodb_lock_waits',
+            """SELECT wait_started,wait_age,locked_table,locked_index,locked_type,waiting_query,waiting_lock_mode,blocking_query,blocking_lock_mode
+               FROM sys.innodb_lock_waits""",
+            {1: 'wait_start,l', 2: 'wait_age,r', 3: 'locked_table,r', 4: 'locked_index,l', 5: 'locked_type,l', 6: 'waiting_query,l', 7: 'wt_lk_md,l', 8: 'blocking_query,l',9: 'bk_lk_md,l'},
+            units={6: 'text', 8: 'text'}, needs_sys=True, cost='medium'),
+    Section('memory_by_host_by_current_bytes', 'memory_by_host_by_current_bytes',
+            """SELECT HOST,current_count_used,current_allocated,current_avg_alloc,current_max_alloc,total_allocated
+               FROM sys.memory_by_host_by_current_bytes""",
+            {1: 'HOST,l', 2: 'crt_count_used,r', 3: 'crt_allocatedc,r',4: 'crt_avg_alloc,r', 5: 'crt_max_alloc,r',6: 'tal_alloc,r'},
+            min_version=(5, 7), units={3: 'bytes', 4: 'bytes', 5: 'bytes', 6: 'bytes'}, needs_sys=True, cost='medium'),
+    Section('memory_by_thread_by_current_bytes', 'memory_by_thread_by_current_bytes',
+            """SELECT thread_id,USER,current_count_used,current_allocated,current_avg_alloc,current_max_alloc,total_allocated
+               FROM sys.memory_by_thread_by_current_bytes ORDER BY thread_id""",
+            {1: 'thread_id,r', 2: 'USER,l', 3: 'crt_count_used,r', 4: 'crt_allocatedc,r',5: 'crt_avg_alloc,r', 6: 'crt_max_alloc,r',7: 'tal_alloc,r'},
+            min_version=(5, 7), units={4: 'bytes', 5: 'bytes', 6: 'bytes', 7: 'bytes'}, needs_sys=True, cost='heavy'),
+    Section('memory_by_user_by_current_bytes', 'memory_by_user_by_current_bytes',
+            """SELECT USER,current_count_used,current_allocated,current_avg_alloc,current_max_alloc,total_allocated
+               FROM sys.memory_by_user_by_current_bytes""",
+            {1: 'USER,l', 2: 'crt_count_used,r', 3: 'crt_alloc,r',4: 'crt_avg_alloc,r', 5: 'crt_max_alloc,r',6: 'tal_alloc,r'},
+            min_version=(5, 7), units={3: 'bytes', 4: 'bytes', 5: 'bytes', 6: 'bytes'}, needs_sys=True, cost='medium'),
+    Section('memory_global_by_current_bytes', 'memory_global_by_current_bytes',
+            """SELECT event_name,current_count,current_alloc,current_avg_alloc,high_count,high_alloc,high_avg_alloc
+               FROM sys.memory_global_by_current_bytes ORDER BY current_alloc DESC""",
+            {1: 'event_name,l', 2: 'crt_count,r', 3: 'crt_alloc,r',4: 'crt_avg_alloc,r', 5: 'high_count,r',6: 'high_alloc,r',7: 'high_avg_alloc,r'},
+            min_version=(5, 7), units={3: 'bytes', 4: 'bytes', 6: 'bytes', 7: 'bytes'}, needs_sys=True, cost='medium'),
+    Section('memory_global_total', 'memory_global_total',
+            """SELECT total_allocated FROM sys.memory_global_total""",
+            {1: 'total_allocated,r'},
+            min_version=(5, 7), units={1: 'bytes'}, needs_sys=True, cost='light'),
+    Section('processlist', 'processlist',
+            """SELECT thd_id,USER,command,TIME,current_statement,statement_latency,full_scan,last_statement,last_statement_latency
+               FROM sys.processlist
+               where db='{db}'""",
+            {1: 'thd_id,r', 2: 'USER,l', 3: 'command,r', 4:'TIME,r', 5: 'current_sql,r',6: 'sql_ltc,r', 7: 'fscan,r',8: 'last_sql,r',9: 'lsql_ltc,r'},
+            units={5: 'text', 6: 'time', 8: 'text', 9: 'time'}, needs_sys=True, cost='medium'),
+    Section('session', 'session',
+            """SELECT thd_id,USER,command,TIME,current_statement,statement_latency,lock_latency,full_scan,last_statement,last_statement_latency
+               FROM sys.session
+               where db='{db}'""",
+            {1: 'thd_id,r', 2: 'USER,l', 3: 'command,r', 4:'TIME,r', 5: 'current_sql,r',6: 'sql_ltc,r', 7: 'lock_ltc,r',8: 'fscan,r',9: 'last_sql,r',10: 'lsql_ltc,r'},
+            units={5: 'text', 6: 'time', 7: 'time', 9: 'text', 10: 'time'}, needs_sys=True, cost='medium'),
+    Section('metrics', 'metrics',
+            """SELECT Variable_name,Variable_value,TYPE,Enabled
+               FROM sys.metrics
+               WHERE Variable_name!='rsa_public_key'  and Variable_name!='ssl_cipher_list' and Enabled='YES'""",
+            {1: 'Variable_name,l', 2: 'Variable_value,r', 3: 'TYPE,l', 4:'Enabled,r'},
+            needs_sys=True, cost='light'),
+
+)
+
+def f_version_tuple(mysql_version):
+    return tuple(int(x) for x in re.findall(r'\d+', mysql_version)[:3])
+
+def f_plan_sections(config, mysql_version, sys_schema_exist, save_as):
+    # [(section, topN, reason)], reason is None for the sections that will run
+    version = f_version_tuple(mysql_version)
+    plan = []
+    for section in SECTIONS:
+        value = f_get_option(config, section.option, 'OFF').strip()
+        topN = int(value) if value.isdigit() else None
+        if value != 'ON' and topN is None:
+            reason = 'OFF'
+        elif section.min_version and version[:len(section.min_version)] < section.min_version:
+            reason = 'needs MySQL ' + '.'.join(map(str, section.min_version)) + '+'
+        elif section.max_version and version[:len(section.max_version)] > section.max_version:
+            reason = 'only up to MySQL ' + '.'.join(map(str, section.max_version))
+        elif section.needs_sys and not sys_schema_exist:
+            reason = 'sys schema not installed'
+        elif section.formats and save_as not in section.formats:
+            reason = 'only in ' + ','.join(section.formats)
+        else:
+            reason = None
+        plan.append((section, topN, reason))
+    return plan
+
+def f_print_section_plan(plan, save_as):
+    title = "Section Plan"
+    style = {1: 'order,r', 2: 'option,l', 3: 'title,l', 4: 'status,l', 5: 'cost,l', 6: 'cacheable,l'}
+    runnable = [section for section, topN, reason in plan if reason is None and not section.deferred]
+    order = dict((id(section), i + 1) for i, section in
+                 enumerate(sorted(runnable, key=lambda x: COST_ORDER[x.cost])))
+    rows = []
+    for section, topN, reason in plan:
+        if reason is not None:
+            status = 'skip: ' + reason
+        elif section.deferred:
+            status = 'run at end of interval'
+        else:
+            status = 'run'
+        rows.append([order.get(id(section), ''), section.option, section.title.format(topN=topN or 'N'), status,
+                     section.cost, 'YES' if section.cacheable else ''])
+    f_print_table(rows, title, style, save_as)
+
+def f_print_report(config, save_as):
+    dbinfo = f_get_dbinfo(config)
     interval  = int(config.get("option", "interval"))
+    parallelism = max(1, int(f_get_option(config, "parallelism", 1)))
+    state_dir = os.path.expanduser(f_get_option(config, "state_dir", "~/.mysql_watcher"))
 
+    if not isinstance(sys.stdout, ReportWriter):
+        sys.stdout = ReportWriter(sys.stdout.buffer)
+    jobs = []
     conn = f_get_conn(dbinfo)
     query ="select @@version"
     mysql_version = f_get_query_value(conn, query)
@@ -787,550 +2780,175 @@ if __name__=="__main__":
         perfor_or_infor = "performance_schema"
         
     sys_schema_exist = f_is_sys_schema_exist(conn)
-
-    if config.get("option","linux_info")=='ON':
-        f_print_linux_info(save_as)
-
-    if config.get("option","filesystem_info")=='ON':
-        f_print_filesystem_info(save_as)
-
-    if config.get("option","linux_overview")=='ON':
-        f_print_linux_status(save_as)
-
-    if config.get("option","host_memory_topN")!='OFF':
-        topN=int(config.get("option","host_memory_topN"))
-        f_print_host_memory_topN(topN,save_as)
-
-    if config.get("option","mysql_overview")=='ON':
-        f_print_mysql_status(conn,perfor_or_infor,interval,save_as)
-
-    if config.get("option","sys_parm")=='ON':
-        title = "System Parameter "
-        query = "SELECT variable_name,IF(INSTR(variable_name,'size'), \
-                 CASE  \
-                 WHEN variable_value>=1024*1024*1024*1024*1024 THEN CONCAT(variable_value/1024/1024/1024/1024/1024,'P') \
-                 WHEN variable_value>=1024*1024*1024*1024 THEN CONCAT(variable_value/1024/1024/1024/1024,'T') \
-                 WHEN variable_value>=1024*1024*1024 THEN CONCAT(variable_value/1024/1024/1024,'G') \
-                 WHEN variable_value>=1024*1024 THEN CONCAT(variable_value/1024/1024,'M') \
-                 WHEN variable_value>=1024 THEN CONCAT(variable_value/1024,'K') \
-                 ELSE variable_value END , \
-                 variable_value)  \
-                 FROM "+perfor_or_infor+".global_variables  \
-                 where variable_name in ('" + "','".join(list(SYS_PARM_FILTER)) + "')"
-        style = {1: 'parameter_name,l', 2: 'value,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-        f_print_optimizer_switch(conn,save_as,perfor_or_infor)
-
-    if config.get("option","log_error_statistics")=='ON':
-        f_print_log_error(conn,perfor_or_infor,save_as)
-
-    if config.get ( "option", "replication" ) == 'ON':
-        title = "Replication"
-        query = """SELECT USER,HOST,command,CONCAT(FLOOR(TIME/86400),'d',FLOOR(TIME/3600)%24,'h',FLOOR(TIME/60)%60,'m',TIME%60,'s') TIMES,state
-                   FROM information_schema.processlist WHERE COMMAND = 'Binlog Dump' OR COMMAND = 'Binlog Dump GTID'"""
-        style = {1: 'USER,l', 2: 'HOST,l', 3: 'command,l', 4: 'TIMES,r', 5: 'state,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get ( "option", "connect_count" ) == 'ON':
-        title = "Connect Count"
-        query = """SELECT SUBSTRING_INDEX(HOST,':',1) HOSTS,USER,db,command,COUNT(*),SUM(TIME)
-                   FROM information_schema.processlist
-                   WHERE Command !='' AND DB !='information_schema'
-                   GROUP BY HOSTS,USER,db,command"""
-        style = {1: 'HOSTS,l', 2: 'USER,l', 3: 'db,l', 4: 'command,l', 5: 'COUNT(*),r', 6: 'SUM(TIME),r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get ( "option", "avg_query_time" ) == 'ON' and not ("5.6" in mysql_version):
-        title = "Avg Query Time"
-        query = """SELECT schema_name,SUM(count_star) COUNT, ROUND((SUM(sum_timer_wait)/SUM(count_star))/1000000) avg_microsec
-                   FROM performance_schema.events_statements_summary_by_digest
-                   WHERE schema_name IS NOT NULL
-                   GROUP BY schema_name"""
-        style = {1: 'schema_name,l', 2: 'COUNT,r', 3: 'avg_microsec,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get ( "option", "slow_query_topN" ) != 'OFF' and sys_schema_exist:
-        topN = int(config.get("option", "slow_query_topN"))
-        title = "Slow Query Top"+str(topN)
-        query = "SELECT QUERY,db,exec_count,total_latency,max_latency,avg_latency FROM sys.statements_with_runtimes_in_95th_percentile LIMIT "+str(topN)
-        style = {1: 'QUERY,l', 2: 'db,r', 3: 'exec_count,r', 4: 'total_latency,r', 5: 'max_latency,r', 6: 'avg_latency,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get ( "option", "err_sql_count" ) == 'ON' and ("5.7" in mysql_version):
-        title = "Err Sql Count"
-        query = """SELECT schema_name,SUM(sum_errors) err_count
-                   FROM performance_schema.events_statements_summary_by_digest
-                   WHERE sum_errors > 0
-                   GROUP BY schema_name"""
-        style = {1: 'schema_name,l', 2: 'err_count,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get ( "option", "err_sql_topN" ) != 'OFF' and sys_schema_exist:
-        topN = int(config.get("option", "err_sql_topN"))
-        title = "Err SQL Top"+str(topN)
-        query = "SELECT QUERY,db,exec_count,ERRORS FROM sys.statements_with_errors_or_warnings ORDER BY ERRORS DESC LIMIT "+str(topN)
-        style = {1: 'QUERY,l', 2: 'db,r', 3: 'exec_count,r', 4: 'ERRORS,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get ( "option", "query_analysis_topN" ) != 'OFF' and sys_schema_exist:
-        topN = int(config.get("option", "query_analysis_topN"))
-        title = "query analysis top"+str(topN)
-        query = """SELECT QUERY,full_scan,exec_count,total_latency,lock_latency,rows_sent_avg,rows_examined_avg,
-                 tmp_tables,tmp_disk_tables,rows_sorted,last_seen
-                   FROM sys.statement_analysis
-                   where db='""" + dbinfo[3] + "' ORDER BY total_latency DESC  LIMIT "+str(topN)
-        style = {1: 'QUERY,l', 2: 'fscan,l', 3: 'ex_cot,r', 4: 'total_ltc,r', 5:'lock_ltc,r', 6: 'rw_st_avg,r',
-                 7: 'rw_exm_avg,9,r',8: 'tmp_table,9,r',9: 'tp_dk_tab,9,r',10: 'rows_sort,9,r',11: 'last_seen,19,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get ( "option", "query_full_table_scans_topN" ) != 'OFF' and sys_schema_exist:
-        topN = int(config.get("option", "query_full_table_scans_topN"))
-        title = "query full table scans top"+str(topN)
-        query = """SELECT QUERY,exec_count,total_latency,no_index_used_count,no_good_index_used_count,no_index_used_pct,rows_sent_avg,rows_examined_avg,last_seen
-                    FROM sys.statements_with_full_table_scans
-                    where db='""" + dbinfo[3] + "' ORDER BY total_latency DESC  LIMIT "+str(topN)
-        style = {1: 'QUERY,l', 2: 'ex_cot,r', 3: 'total_ltc,r', 4:'no_idx_use,r', 5: 'n_g_idx_use,r',6: 'n_i_u_pct,r',
-                 7: 'rw_st_avg,r',8: 'rw_exm_avg,r',9: 'last_seen,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get ( "option", "query_sorting_topN" ) != 'OFF' and sys_schema_exist:
-        topN = int(config.get("option", "query_sorting_topN"))
-        title = "query sorting top"+str(topN)
-        query = """SELECT QUERY,exec_count,total_latency,sort_merge_passes,avg_sort_merges,sorts_using_scans,sort_using_range,
-                    rows_sorted,avg_rows_sorted,last_seen
-                    FROM sys.statements_with_sorting
-                    where db='""" + dbinfo[3] + "' ORDER BY avg_rows_sorted DESC  LIMIT "+str(topN)
-        style = {1: 'QUERY,l', 2: 'ex_cot,r', 3: 'total_ltc,r', 4:'st_mg_ps,r', 5: 'avg_st_mg,r',6: 'st_us_scan,r',
-                 7: 'st_us_rag,r',8: 'rows_sort,r',9: 'avg_rw_st,r',10: 'last_seen,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get ( "option", "query_with_temp_tables_topN" ) != 'OFF' and sys_schema_exist:
-        topN = int(config.get("option", "query_with_temp_tables_topN"))
-        title = "query with temp tables top"+str(topN)
-        query = """SELECT QUERY,exec_count,total_latency,memory_tmp_tables,disk_tmp_tables,avg_tmp_tables_per_query,tmp_tables_to_disk_pct,last_seen
-                    FROM sys.statements_with_temp_tables
-                    where db='""" + dbinfo[3] + "' ORDER BY avg_tmp_tables_per_query DESC  LIMIT "+str(topN)
-        style = {1: 'QUERY,l', 2: 'ex_cot,r', 3: 'total_ltc,r', 4:'mem_tmp_tab,r', 5: 'dsk_tmp_tab,r',6: 'avg_tt_per_qry,r',
-                 7: 'tt_to_dk_pct,r',8:'last_seen,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get ( "option", "database_size" ) == 'ON':
-        title = "Database Size"
-        query = """SELECT table_schema,
-                   CONCAT(ROUND(SUM(data_length)/(1024*1024),2),'MB') AS 'Table Size',
-                   CONCAT(ROUND(SUM(index_length)/(1024*1024),2),'MB') AS 'Index Size' ,
-                   CONCAT(ROUND(SUM(data_length)/(1024*1024),2) + ROUND(SUM(index_length)/(1024*1024),2),'MB') AS 'DB Size'
-                   FROM information_schema.tables GROUP BY table_schema
-                   UNION
-                   SELECT '*** all ***' table_schema,
-                   CONCAT(ROUND(SUM(data_length)/(1024*1024),2),'MB') AS 'Table Size',
-                   CONCAT(ROUND(SUM(index_length)/(1024*1024),2),'MB') AS 'Index Size' ,
-                   CONCAT(ROUND(SUM(data_length)/(1024*1024),2) + ROUND(SUM(index_length)/(1024*1024),2),'MB') AS 'DB Size'
-                   FROM information_schema.tables"""
-        style = {1: 'table_schema,l', 2: 'Table Size,r', 3: 'Index Size,r', 4: 'DB Size,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option","object_count")=='ON':
-        title = "Object Count"
-        query = "SELECT information_schema.routines.ROUTINE_TYPE AS object_type, COUNT(0) AS COUNT FROM information_schema.routines \
-                 WHERE information_schema.routines.ROUTINE_SCHEMA='" + dbinfo[3] + "' GROUP BY information_schema.routines.ROUTINE_TYPE UNION \
-                 SELECT information_schema.tables.TABLE_TYPE AS object_type, COUNT(0) AS COUNT FROM information_schema.tables  \
-                 WHERE information_schema.tables.TABLE_SCHEMA='" + dbinfo[3] + "' GROUP BY information_schema.tables.TABLE_TYPE UNION \
-                 SELECT CONCAT('INDEX (',information_schema.statistics.INDEX_TYPE,')') AS object_type,COUNT(0) AS COUNT FROM information_schema.statistics \
-                 WHERE information_schema.statistics.TABLE_SCHEMA='" + dbinfo[3] + "' GROUP BY information_schema.statistics.INDEX_TYPE UNION \
-                 SELECT 'TRIGGER' AS `TRIGGER`,COUNT(0) AS COUNT FROM information_schema.triggers \
-                 WHERE information_schema.triggers.TRIGGER_SCHEMA='" + dbinfo[3] + "' UNION \
-                 SELECT 'EVENT' AS object_type, COUNT(0) AS COUNT FROM information_schema.events \
-                 WHERE information_schema.events.EVENT_SCHEMA='" + dbinfo[3] + "'"
-        style = {1:'object_type,l',2: 'COUNT,r'}
-        if save_as == "txt":
-            f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get ( "option", "table_info" ) == 'ON':
-        title = "Table Info"
-        query = """select table_name,engine,row_format as format,table_rows,avg_row_length as avg_row,
-                   round((data_length)/1024/1024,2) as data_mb,
-                   round((index_length)/1024/1024,2) as index_mb,
-                   round((data_length+index_length)/1024/1024,2) as total_mb
-                   from information_schema.tables
-                   where table_schema='""" + dbinfo[3] + "'"
-        style = {1: 'table_name,l', 2: 'engine,l', 3: 'format,l', 4: 'table_rows,r', 5: 'avg_row,r',
-                 6: 'data_mb,r', 7: 'index_mb,r', 8: 'total_mb,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get ( "option", "index_info" ) == 'ON':
-        title = "Index Info"
-        query = """select index_name,non_unique,seq_in_index,column_name,collation,cardinality,nullable,index_type
-                   from information_schema.statistics
-                   where table_schema='""" + dbinfo[3] + "'"
-        style = {1: 'index_name,l', 2: 'non_unique,l', 3: 'seq_in_index,l', 4: 'column_name,l',
-                 5: 'collation,r', 6: 'cardinality,r', 7: 'nullable,r', 8: 'index_type,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "schema_index_statistics") == 'ON' and sys_schema_exist:
-        title = "schema_index_statistics"
-        query = """SELECT table_name,index_name ,rows_selected,select_latency,rows_inserted,insert_latency,rows_updated,
-                    update_latency,rows_deleted,delete_latency
-                    FROM sys.schema_index_statistics where table_schema='""" +  dbinfo[3] + "' ORDER BY table_name"
-        style = {1: 'table_name,l', 2: 'index_name,l', 3: 'rows_selected,r', 4: 'select_latency,r',5: 'rows_inserted,r',
-                 6: 'insert_latency,r', 7: 'rows_updated,r', 8: 'update_latency,r', 9: 'rows_deleted,r',10: 'delete_latency,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "schema_table_statistics") == 'ON' and sys_schema_exist:
-        title = "schema_table_statistics"
-        query = """SELECT table_name,total_latency ,rows_fetched,fetch_latency,rows_inserted,insert_latency,rows_updated,
-                    update_latency,rows_deleted,delete_latency,io_read_requests,io_read,io_read_latency,io_write_requests,
-                    io_write,io_write_latency,io_misc_requests,io_misc_latency
-                    FROM sys.schema_table_statistics  where table_schema='""" +  dbinfo[3] + "' ORDER BY table_name"
-        style = {1: 'table_name,l', 2: 'tal_ltc,r', 3: 'rw_ftc,r', 4: 'ftc_ltc,r',
-                 5: 'rw_ins,r', 6: 'ins_ltc,r', 7: 'rw_upd,r', 8: 'upd_ltc,r',
-                 9: 'rw_del,r', 10: 'del_ltc,r', 11: 'io_rd_rq,r', 12: 'io_read,r',
-                 13: 'io_rd_ltc,r', 14: 'io_wt_rq,r', 15: 'io_write,r',16: 'io_wt_ltc,r',
-                 17: 'io_ms_rq,r',18: 'io_ms_ltc,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "schema_table_statistics_with_buffer") == 'ON' and sys_schema_exist:
-        title = "schema_table_statistics_with_buffer"
-        query = """SELECT table_name,innodb_buffer_allocated,innodb_buffer_data,innodb_buffer_free,innodb_buffer_pages,
-                    innodb_buffer_pages_hashed,innodb_buffer_pages_old,innodb_buffer_rows_cached
-                    FROM sys.schema_table_statistics_with_buffer where table_schema='""" + dbinfo[3] + "' ORDER BY table_name"
-        style = {1: 'table_name,l', 2: 'indb_buf_alc,r', 3: 'indb_buf_data,r', 4: 'indb_buf_free,r', 5: 'indb_buf_page,r',
-                 6: 'indb_buf_page_hash,r', 7: 'indb_buf_page_old,r', 8: 'indb_buf_rw_cach,r'}
-        f_print_query_table(conn, title, query, style, save_as)
-
-    if config.get("option", "schema_tables_with_full_table_scans") == 'ON' and sys_schema_exist:
-        title = "schema_tables_with_full_table_scans"
-        query = """SELECT object_schema,object_name,rows_full_scanned,latency FROM sys.schema_tables_with_full_table_scans
-                    where object_schema='""" + dbinfo[3] + "' ORDER BY object_name"
-        style = {1: 'object_schema,l', 2: 'object_name,l', 3: 'rows_full_scanned,r', 4: 'latency,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "schema_unused_indexes") == 'ON' and sys_schema_exist:
-        title = "Schema Unused Indexes"
-        query = "SELECT object_schema,object_name,index_name FROM sys.schema_unused_indexes where object_schema='" +  dbinfo[3] + "'"
-        style = {1: 'object_schema,l', 2: 'object_name,l', 3: 'index_name,l'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "host_summary") == 'ON' and sys_schema_exist:
-        title = "host_summary"
-        #host 监听连接过的主机 statements 当前主机执行的语句总数 statement_latency 语句等待时间（延迟时间） statement_avg_latency 执行语句平均延迟时间 table_scans 表扫描次数
-        #file_ios io时间总数 file_io_latency 文件io延迟 current_connections 当前连接数 total_connections 总链接数 unique_users 该主机的唯一用户数 current_memory 当前账户分配的内存
-        #total_memory_allocated 该主机分配的内存总数
-        if "5.6" in mysql_version:
-            query = """SELECT host,statements,statement_latency,statement_avg_latency,table_scans,file_ios,file_io_latency,current_connections,
-                        total_connections,unique_users
-                        FROM sys.host_summary"""
-            style = {1: 'host,l', 2: 'statements,r', 3: 'st_ltc,r', 4: 'st_avg_ltc,r', 5: 'table_scan,r', 6: 'file_ios,r',
-                     7: 'f_io_ltc,r', 8: 'cur_conns,r', 9: 'total_conn,r', 10: 'unq_users,r'}
-        else:
-            query = """SELECT host,statements,statement_latency,statement_avg_latency,table_scans,file_ios,file_io_latency,current_connections,
-                    total_connections,unique_users,current_memory,total_memory_allocated
-                    FROM sys.host_summary"""
-            style = {1: 'host,l', 2: 'statements,r', 3: 'st_ltc,r', 4: 'st_avg_ltc,r', 5: 'table_scan,r', 6: 'file_ios,r',
-                     7: 'f_io_ltc,r', 8: 'cur_conns,r', 9: 'total_conn,r', 10: 'unq_users,r', 11: 'cur_mem,r',
-                     12: 'tal_mem_alc,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "host_summary_by_file_io_type") == 'ON' and sys_schema_exist:
-        title = "host_summary_by_file_io_type"
-        #•host 主机 event_name IO事件名称 total 该主机发生的事件 total_latency 该主机发生IO事件总延迟时间 max_latency 该主机IO事件中最大的延迟时间
-        query = """SELECT host,event_name,total,total_latency,max_latency
-                    FROM sys.host_summary_by_file_io_type"""
-        style = {1: 'host,l', 2: 'event_name,l', 3: 'total,r', 4: 'total_ltc,r', 5: 'max_ltc,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "host_summary_by_file_io") == 'ON' and sys_schema_exist:
-        title = "host_summary_by_file_io_type"
-        #•host 主机 ios IO事件总数 io_latency IO总的延迟时间
-        query = """SELECT host,ios,io_latency
-                    FROM sys.host_summary_by_file_io"""
-        style = {1: 'host,l', 2: 'ios,r', 3: 'io_latency,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "host_summary_by_stages") == 'ON' and sys_schema_exist:
-        title = "host_summary_by_stages"
-        #•host 主机  event_name stage event名称 total stage event发生的总数 total_latency stage event总的延迟时间 avg_latency stage event平均延迟时间
-        query = """SELECT host,event_name,total,total_latency,avg_latency
-                    FROM sys.host_summary_by_stages"""
-        style = {1: 'host,l', 2: 'event_name,l', 3: 'total,r', 4: 'total_latency,r', 5: 'avg_latency,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "host_summary_by_statement_latency") == 'ON' and sys_schema_exist:
-        title = "host_summary_by_statement_latency"
-        #host 主机  total 这个主机的语句总数  total_latency 这个主机总的延迟时间 max_latency 主机最大的延迟时间 lock_latency 等待锁的锁延迟时间
-        #rows_sent 该主机通过语句返回的总行数 rows_examined 在存储引擎上通过语句返回的行数 rows_affected 该主机通过语句影响的总行数 full_scans 全表扫描的语句总数
-        query = """SELECT host,total,total_latency,max_latency,lock_latency,rows_sent,rows_examined,rows_affected,full_scans
-                    FROM sys.host_summary_by_statement_latency"""
-        style = {1: 'host,l', 2: 'total,r', 3: 'total_latency,r', 4: 'max_latency,r', 5: 'lock_latency,r',
-                 6: 'rows_sent,r', 7: 'rows_examined,r', 8: 'rows_affected,r',9: 'full_scans,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "host_summary_by_statement_type") == 'ON' and sys_schema_exist:
-        title = "host_summary_by_statement_type"
-        #host 主机  statement 最后的语句事件名称 total sql语句总数 total_latency sql语句总延迟数 max_latency 最大的sql语句延迟数
-        # lock_latency 锁延迟总数 rows_sent 语句返回的行总数 rows_examined 通过存储引擎的sql语句的读取的总行数 rows_affected 语句影响的总行数 full_scans 全表扫描的语句事件总数
-        query = """SELECT host,statement,total,total_latency,max_latency,lock_latency,rows_sent,rows_examined,rows_affected,full_scans
-                    FROM sys.host_summary_by_statement_type"""
-        style = {1: 'host,l', 2: 'statement,l', 3: 'total,r', 4: 'total_latency,r', 5: 'max_latency,r',
-                 6: 'lock_latency,r', 7: 'rows_sent,r', 8: 'rows_examined,r',9: 'rows_affected,r',10: 'full_scans,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "user_summary") == 'ON' and sys_schema_exist:
-        title = "user_summary"
-        # statements 当前用户执行的语句总数 statement_latency 语句等待时间（延迟时间） statement_avg_latency 执行语句平均延迟时间 table_scans 表扫描次数
-        #file_ios io时间总数 file_io_latency 文件io延迟 current_connections 当前连接数 total_connections 总链接数 unique_users 该用户的唯一主机数 current_memory 当前账户分配的内存
-        #total_memory_allocated 该主机分配的内存总数
-        if "5.6" in mysql_version:
-
-            query = """SELECT user,statements,statement_latency,statement_avg_latency,table_scans,file_ios,file_io_latency,current_connections,
-                    total_connections,unique_hosts
-                    FROM sys.user_summary"""
-            style = {1: 'user,l', 2: 'statements,r', 3: 'st_ltc,r', 4: 'st_avg_ltc,r', 5: 'table_scan,r', 6: 'file_ios,r',
-                     7: 'f_io_ltc,r', 8: 'cur_conns,r', 9: 'total_conn,r', 10: 'unq_hosts,r'}
+    # the MAX_EXECUTION_TIME optimizer hint exists since MySQL 5.7.8
+    max_execution_time = f_version_tuple(mysql_version) >= (5, 7, 8) and 'MariaDB' not in mysql_version
+
+    plan = f_plan_sections(config, mysql_version, sys_schema_exist, save_as)
+    if f_get_option(config, "section_plan", "OFF") == 'ON':
+        f_print_section_plan(plan, save_as)
+
+    # expensive sections are shed while any of these thresholds is crossed, 0 turns a check off
+    guard = {'threads_running': int(f_get_option(config, "guard_threads_running", 0)),
+             'replica_lag': int(f_get_option(config, "guard_replica_lag", 0)),
+             'load_per_cpu': float(f_get_option(config, "guard_load_per_cpu", 0)),
+             'replica_status': "SHOW REPLICA STATUS" if f_version_tuple(mysql_version) >= (8, 0, 22) and 'MariaDB' not in mysql_version
+                               else "SHOW SLAVE STATUS"}
+    fast_path = f_get_option(config, "fast_path", "OFF") == 'ON'
+    guard_cost = COST_ORDER[f_get_option(config, "guard_cost", "heavy")]
+    shed = []
+    failed = []
+    begun = {}
+
+    ctx = {'save_as': save_as, 'perfor_or_infor': perfor_or_infor, 'state_dir': state_dir, 'interval': interval,
+           'db': dbinfo[3], 'dbinfo': dbinfo, 'sys_parm_filter': "'" + "','".join(SYS_PARM_FILTER) + "'", 'start': time.time()}
+    for section, topN, reason in plan:
+        if reason is not None:
+            continue
+        ctx['topN'] = topN
+        title = section.title.format(**ctx)
+        ttl = int(f_get_option(config, section.option + "_ttl", f_get_option(config, "cache_ttl", 0)))
+        timeout = float(f_get_option(config, section.option + "_timeout", f_get_option(config, "query_timeout", 0)))
+        limits = (timeout, dbinfo, max_execution_time)
+        if section.query and section.cacheable and ttl > 0:
+            key = '_'.join([dbinfo[0], str(dbinfo[4]), dbinfo[3], section.option])
+            jobs.append(Job(f_print_cached_query_table, (title, section.query.format(**ctx), section.style, save_as, state_dir,
+                                                         key, ttl, limits),
+                            True, False, section.cost, section.option))
+        elif section.query and fast_path and section.units is not None:
+            jobs.append(Job(f_print_query_table, (title, f_fast_query(section.query.format(**ctx)), section.style, save_as,
+                                                  limits, section.units), True, False, section.cost, section.option))
+        elif section.query:
+            jobs.append(Job(f_print_query_table, (title, section.query.format(**ctx), section.style, save_as, limits),
+                            True, False, section.cost, section.option))
         else:
-            query = """SELECT user,statements,statement_latency,statement_avg_latency,table_scans,file_ios,file_io_latency,current_connections,
-                        total_connections,unique_hosts,current_memory,total_memory_allocated
-                        FROM sys.user_summary"""
-            style = {1: 'user,l', 2: 'statements,r', 3: 'st_ltc,r', 4: 'st_avg_ltc,r', 5: 'table_scan,r', 6: 'file_ios,r',
-                     7: 'f_io_ltc,r', 8: 'cur_conns,r', 9: 'total_conn,r', 10: 'unq_hosts,r', 11: 'cur_mem,r', 12: 'tal_mem_alc,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "user_summary_by_file_io_type") == 'ON' and sys_schema_exist:
-        title = "user_summary_by_file_io_type"
-        #event_name IO事件名称 total 该用户发生的事件 total_latency 该用户发生IO事件总延迟时间 max_latency 该用户IO事件中最大的延迟时间
-        query = """SELECT user,event_name,total,latency,max_latency
-                    FROM sys.user_summary_by_file_io_type"""
-        style = {1: 'user,l', 2: 'event_name,l', 3: 'total,r', 4: 'latency,r', 5: 'max_ltc,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "user_summary_by_file_io") == 'ON' and sys_schema_exist:
-        title = "user_summary_by_file_io_type"
-        # ios IO事件总数 io_latency IO总的延迟时间
-        query = """SELECT user,ios,io_latency
-                    FROM sys.user_summary_by_file_io"""
-        style = {1: 'user,l', 2: 'ios,r', 3: 'io_latency,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "user_summary_by_stages") == 'ON' and sys_schema_exist:
-        title = "user_summary_by_stages"
-        #  event_name stage event名称 total stage event发生的总数 total_latency stage event总的延迟时间 avg_latency stage event平均延迟时间
-        query = """SELECT user,event_name,total,total_latency,avg_latency
-                    FROM sys.user_summary_by_stages"""
-        style = {1: 'user,l', 2: 'event_name,l', 3: 'total,r', 4: 'total_latency,r', 5: 'avg_latency,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "user_summary_by_statement_latency") == 'ON' and sys_schema_exist:
-        title = "user_summary_by_statement_latency"
-        #  total 这个主机的语句总数  total_latency 这个主机总的延迟时间 max_latency 主机最大的延迟时间 lock_latency 等待锁的锁延迟时间
-        #rows_sent 该主机通过语句返回的总行数 rows_examined 在存储引擎上通过语句返回的行数 rows_affected 该主机通过语句影响的总行数 full_scans 全表扫描的语句总数
-        query = """SELECT user,total,total_latency,max_latency,lock_latency,rows_sent,rows_examined,rows_affected,full_scans
-                    FROM sys.user_summary_by_statement_latency"""
-        style = {1: 'user,l', 2: 'total,r', 3: 'total_latency,r', 4: 'max_latency,r', 5: 'lock_latency,r',
-                 6: 'rows_sent,r', 7: 'rows_examined,r', 8: 'rows_affected,r',9: 'full_scans,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "user_summary_by_statement_type") == 'ON' and sys_schema_exist:
-        title = "user_summary_by_statement_type"
-        #statement 最后的语句事件名称 total sql语句总数 total_latency sql语句总延迟数 max_latency 最大的sql语句延迟数
-        # lock_latency 锁延迟总数 rows_sent 语句返回的行总数 rows_examined 通过存储引擎的sql语句的读取的总行数 rows_affected 语句影响的总行数 full_scans 全表扫描的语句事件总数
-        query = """SELECT user,statement,total,total_latency,max_latency,lock_latency,rows_sent,rows_examined,rows_affected,full_scans
-                    FROM sys.user_summary_by_statement_type"""
-        style = {1: 'user,l', 2: 'statement,l', 3: 'total,r', 4: 'total_latency,r', 5: 'max_latency,r',
-                 6: 'lock_latency,r', 7: 'rows_sent,r', 8: 'rows_examined,r',9: 'rows_affected,r',10: 'full_scans,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "innodb_buffer_stats_by_schema") == 'ON' and sys_schema_exist:
-        title = "innodb_buffer_stats_by_schema"
-        #object_schema 数据库名称 allocated 分配给当前数据库的总的字节数 data 分配给当前数据库的数据字节数 pages 分配给当前数据库的总页数
-        # pages_hashed 分配给当前数据库的hash页数 pages_old 分配给当前数据库的旧页数  rows_cached 当前数据库缓存的行数
-        query = """SELECT object_schema,allocated,data,pages,pages_hashed,pages_old,rows_cached
-                    FROM sys.innodb_buffer_stats_by_schema"""
-        style = {1: 'object_schema,l', 2: 'allocated,r', 3: 'data,r', 4: 'pages,r', 5: 'pages_hashed,r',
-                 6: 'pages_old,r', 7: 'rows_cached,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "innodb_buffer_stats_by_table") == 'ON' and sys_schema_exist:
-        title = "innodb_buffer_stats_by_table"
-        # object_schema 数据库名称 object_name 表名称 allocated 分配给表的总字节数 data 分配该表的数据字节数 pages 分配给表的页数
-        #  pages_hashed 分配给表的hash页数 pages_old 分配给表的旧页数 rows_cached 表的行缓存数
-        query = """SELECT object_schema,object_name,allocated,data,pages,pages_hashed,pages_old,rows_cached
-                    FROM sys.innodb_buffer_stats_by_table"""
-        style = {1: 'object_schema,l', 2: 'object_name,l', 3: 'allocated,r', 4: 'data,r', 5: 'pages,r',
-                 6: 'pages_hashed,r', 7: 'pages_old,r', 8: 'rows_cached,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "io_by_thread_by_latency_topN")  != 'OFF' and sys_schema_exist:
-        topN = int(config.get("option", "io_by_thread_by_latency_topN"))
-        title = "io_by_thread_by_latency top"+str(topN)
-        #user 对于当前线程来说，这个值是线程被分配的账户，对于后台线程来讲，就是线程的名称 total IO事件的总数 total_latency IO事件的总延迟
-        # min_latency 单个最小的IO事件延迟 avg_latency 平均IO延迟 max_latency 最大IO延迟 thread_id 线程ID processlist_id 对于当前线程就是此时的ID，对于后台就是null
-        query = """SELECT user,total,total_latency,min_latency,avg_latency,max_latency,thread_id,processlist_id
-                    FROM sys.io_by_thread_by_latency  LIMIT """+str(topN)
-        style = {1: 'user,l', 2: 'total,r', 3: 'total_latency,r', 4: 'min_latency,r', 5: 'avg_latency,r',
-                 6: 'max_latency,r', 7: 'thread_id,r', 8: 'processlist_id,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "io_global_by_file_by_bytes_topN")  != 'OFF' and sys_schema_exist:
-        topN = int(config.get("option", "io_global_by_file_by_bytes_topN"))
-        title = "io_global_by_file_by_bytes top"+str(topN)
-        query = """SELECT file,count_read,total_read,avg_read,count_write,total_written,avg_write,total,write_pct
-                    FROM sys.io_global_by_file_by_bytes  LIMIT """+str(topN)
-        style = {1: 'file,l', 2: 'count_read,r', 3: 'total_read,r', 4: 'avg_read,r', 5: 'count_write,r',
-                 6: 'total_written,r', 7: 'avg_write,r', 8: 'total,r', 9: 'write_pct,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "io_global_by_file_by_latency_topN")  != 'OFF' and sys_schema_exist:
-        topN = int(config.get("option", "io_global_by_file_by_latency_topN"))
-        title = "io_global_by_file_by_latency top"+str(topN)
-        query = """SELECT file,total,total_latency,count_read,read_latency,count_write,write_latency,count_misc,misc_latency
-                    FROM sys.io_global_by_file_by_latency  LIMIT """+str(topN)
-        style = {1: 'file,l', 2: 'total,r', 3: 'total_latency,r', 4: 'count_read,r', 5: 'read_latency,r',
-                 6: 'count_write,r', 7: 'write_latency,r', 8: 'count_misc,r', 9: 'misc_latency,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "io_global_by_wait_by_bytes_topN")  != 'OFF' and sys_schema_exist:
-        topN = int(config.get("option", "io_global_by_wait_by_bytes_topN"))
-        title = "io_global_by_wait_by_bytes top"+str(topN)
-        query = """SELECT event_name,total,total_latency,min_latency,avg_latency,max_latency,count_read,total_read,avg_read,count_write,
-                    total_written,avg_written,total_requested
-                    FROM sys.io_global_by_wait_by_bytes  LIMIT """+str(topN)
-        style = {1: 'event_name,l', 2: 'total,r', 3: 'total_latency,r', 4: 'min_latency,r', 5: 'avg_latency,r',
-                 6: 'max_latency,r', 7: 'count_read,r', 8: 'total_read,r', 9: 'avg_read,r', 10: 'count_write,r',
-                 11: 'total_written,r', 12: 'avg_written,r', 13: 'total_requested,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "io_global_by_wait_by_latency_topN")  != 'OFF' and sys_schema_exist:
-        topN = int(config.get("option", "io_global_by_wait_by_latency_topN"))
-        title = "io_global_by_wait_by_latency top"+str(topN)
-        query = """SELECT event_name,total,total_latency,avg_latency,max_latency,read_latency,write_latency,misc_latency,count_read,
-                    total_read,avg_read,count_write,total_written,avg_written
-                    FROM sys.io_global_by_wait_by_latency  LIMIT """+str(topN)
-        style = {1: 'event_name,l', 2: 'total,r', 3: 'total_latency,r', 4: 'avg_latency,r', 5: 'max_latency,r',
-                 6: 'read_latency,r', 7: 'write_latency,r', 8: 'misc_latency,r', 9: 'count_read,r', 10: 'total_read,r',
-                 11: 'avg_read,r', 12: 'count_write,r', 13: 'total_written,r', 14: 'avg_written,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "wait_classes_global_by_avg_latency") == 'ON' and sys_schema_exist:
-        title = "wait_classes_global_by_avg_latency"
-        query = """SELECT event_class,total,total_latency,min_latency,avg_latency,max_latency
-                    FROM sys.wait_classes_global_by_avg_latency"""
-        style = {1: 'event_class,l', 2: 'total,r', 3: 'total_latency,r',4: 'min_latency,r', 5: 'avg_latency,r', 6: 'max_latency,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "wait_classes_global_by_latency") == 'ON' and sys_schema_exist:
-        title = "wait_classes_global_by_latency"
-        query = """SELECT event_class,total,total_latency,min_latency,avg_latency,max_latency
-                    FROM sys.wait_classes_global_by_latency"""
-        style = {1: 'event_class,l', 2: 'total,r', 3: 'total_latency,r',4: 'min_latency,r', 5: 'avg_latency,r', 6: 'max_latency,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "waits_by_host_by_latency") == 'ON' and sys_schema_exist:
-        title = "waits_by_host_by_latency"
-        query = """SELECT HOST,EVENT,total,total_latency,avg_latency,max_latency
-                    FROM sys.waits_by_host_by_latency """
-        style = {1: 'host,l',2: 'event,l', 3: 'total,r', 4: 'total_latency,r',5: 'avg_latency,r', 6: 'max_latency,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "waits_by_user_by_latency") == 'ON' and sys_schema_exist:
-        title = "waits_by_user_by_latency"
-        query = """SELECT USER,EVENT,total,total_latency,avg_latency,max_latency
-                    FROM sys.waits_by_user_by_latency """
-        style = {1: 'user,l',2: 'event,l', 3: 'total,r', 4: 'total_latency,r',5: 'avg_latency,r', 6: 'max_latency,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "waits_global_by_latency") == 'ON' and sys_schema_exist:
-        title = "waits_global_by_latency"
-        query = """SELECT EVENTS,total,total_latency,avg_latency,max_latency
-                    FROM sys.waits_global_by_latency """
-        style = {1: 'event,l', 2: 'total,r', 3: 'total_latency,r',4: 'avg_latency,r', 5: 'max_latency,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "schema_table_lock_waits") == 'ON' and sys_schema_exist and not "5.6" in mysql_version:
-        title = "schema_table_lock_waits"
-        query = """SELECT object_schema,object_name,waiting_account,waiting_lock_type,
-                    waiting_lock_duration,waiting_query,waiting_query_secs,waiting_query_rows_affected,waiting_query_rows_examined,
-                    blocking_account,blocking_lock_type,blocking_lock_duration
-                    FROM sys.schema_table_lock_waits"""
-        #,sql_kill_blocking_query,sql_kill_blocking_connection
-        style = {1: 'object_schema,l', 2: 'object_name,r', 3: 'wait_account,r', 4: 'wt_lk_tp,l', 5: 'w_l_dur,l',
-                 6: 'waiting_query,l', 7: 'w_qry_s,l', 8: 'w_q_r_a,l',9: 'w_q_r_e,l',10: 'blk_account,l',
-                 11: 'bk_lk_tp,l',12: 'b_l_dur,l'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "innodb_lock_waits") == 'ON' and sys_schema_exist:
-        title = "innodb_lock_waits"
-        #wait_started 锁等待发生的时间 wait_age 锁已经等待了多长时间 wait_age_secs 以秒为单位显示锁已经等待的时间
-        #locked_table 被锁的表 locked_index 被锁住的索引 locked_type 锁类型 waiting_trx_id 正在等待的事务ID waiting_trx_started 等待事务开始的时间
-        #waiting_trx_age 已经等待事务多长时间 waiting_trx_rows_locked 正在等待的事务被锁的行数量 waiting_trx_rows_modified 正在等待行重定义的数量
-        #waiting_pid 正在等待事务的线程id waiting_query 正在等待锁的查询 waiting_lock_id 正在等待锁的ID waiting_lock_mode 等待锁的模式
-        #blocking_trx_id 阻塞等待锁的事务id blocking_pid 正在锁的线程id blocking_query 正在锁的查询 blocking_lock_id 正在阻塞等待锁的锁id.
-        #blocking_lock_mode 阻塞锁模式 blocking_trx_started 阻塞事务开始的时间 blocking_trx_age 阻塞的事务已经执行的时间 blocking_trx_rows_locked 阻塞事务锁住的行的数量
-        # blocking_trx_rows_modified 阻塞事务重定义行的数量 sql_kill_blocking_query kill 语句杀死正在运行的阻塞事务 sql_kill_blocking_connection kill 语句杀死会话中正在运行的阻塞事务
-        query = """SELECT wait_started,wait_age,locked_table,locked_index,locked_type,waiting_query,waiting_lock_mode,blocking_query,blocking_lock_mode
-                    FROM sys.innodb_lock_waits"""
-        style = {1: 'wait_start,l', 2: 'wait_age,r', 3: 'locked_table,r', 4: 'locked_index,l', 5: 'locked_type,l',
-                 6: 'waiting_query,l', 7: 'wt_lk_md,l', 8: 'blocking_query,l',9: 'bk_lk_md,l'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "memory_by_host_by_current_bytes") == 'ON' and sys_schema_exist and not "5.6" in mysql_version:
-        title = "memory_by_host_by_current_bytes"
-        query = """SELECT HOST,current_count_used,current_allocated,current_avg_alloc,current_max_alloc,total_allocated
-                    FROM sys.memory_by_host_by_current_bytes"""
-        style = {1: 'HOST,l', 2: 'crt_count_used,r', 3: 'crt_allocatedc,r',4: 'crt_avg_alloc,r', 5: 'crt_max_alloc,r',6: 'tal_alloc,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "memory_by_thread_by_current_bytes") == 'ON' and sys_schema_exist and not "5.6" in mysql_version:
-        title = "memory_by_thread_by_current_bytes"
-        query = """SELECT thread_id,USER,current_count_used,current_allocated,current_avg_alloc,current_max_alloc,total_allocated
-                    FROM sys.memory_by_thread_by_current_bytes ORDER BY thread_id"""
-        style = {1: 'thread_id,r', 2: 'USER,l', 3: 'crt_count_used,r', 4: 'crt_allocatedc,r',5: 'crt_avg_alloc,r', 6: 'crt_max_alloc,r',7: 'tal_alloc,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "memory_by_user_by_current_bytes") == 'ON' and sys_schema_exist  and not "5.6" in mysql_version:
-        title = "memory_by_user_by_current_bytes"
-        query = """SELECT USER,current_count_used,current_allocated,current_avg_alloc,current_max_alloc,total_allocated
-                    FROM sys.memory_by_user_by_current_bytes"""
-        style = {1: 'USER,l', 2: 'crt_count_used,r', 3: 'crt_alloc,r',4: 'crt_avg_alloc,r', 5: 'crt_max_alloc,r',6: 'tal_alloc,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "memory_global_by_current_bytes") == 'ON' and sys_schema_exist  and not "5.6" in mysql_version:
-        title = "memory_global_by_current_bytes"
-        query = """SELECT event_name,current_count,current_alloc,current_avg_alloc,high_count,high_alloc,high_avg_alloc
-                    FROM sys.memory_global_by_current_bytes ORDER BY current_alloc DESC"""
-        style = {1: 'event_name,l', 2: 'crt_count,r', 3: 'crt_alloc,r',4: 'crt_avg_alloc,r', 5: 'high_count,r',6: 'high_alloc,r',7: 'high_avg_alloc,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get("option", "memory_global_total") == 'ON' and sys_schema_exist  and not "5.6" in mysql_version:
-        title = "memory_global_total"
-        query = """SELECT total_allocated FROM sys.memory_global_total"""
-        style = {1: 'total_allocated,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get ( "option", "processlist" ) == 'ON' and sys_schema_exist:
-        title = "processlist"
-        query = """SELECT thd_id,USER,command,TIME,current_statement,statement_latency,full_scan,last_statement,last_statement_latency
-                    FROM sys.processlist
-                    where db='""" + dbinfo[3] + "'"
-        style = {1: 'thd_id,r', 2: 'USER,l', 3: 'command,r', 4:'TIME,r', 5: 'current_sql,r',6: 'sql_ltc,r',
-                 7: 'fscan,r',8: 'last_sql,r',9: 'lsql_ltc,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get ( "option", "session" ) == 'ON' and sys_schema_exist:
-        title = "session"
-        query = """SELECT thd_id,USER,command,TIME,current_statement,statement_latency,lock_latency,full_scan,last_statement,last_statement_latency
-                    FROM sys.session
-                    where db='""" + dbinfo[3] + "'"
-        style = {1: 'thd_id,r', 2: 'USER,l', 3: 'command,r', 4:'TIME,r', 5: 'current_sql,r',6: 'sql_ltc,r',
-                 7: 'lock_ltc,r',8: 'fscan,r',9: 'last_sql,r',10: 'lsql_ltc,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    if config.get ( "option", "metrics" ) == 'ON' and sys_schema_exist:
-        title = "metrics"
-        query = """SELECT Variable_name,Variable_value,TYPE,Enabled
-                    FROM sys.metrics
-                    WHERE Variable_name!='rsa_public_key'  and Variable_name!='ssl_cipher_list' and Enabled='YES'"""
-        style = {1: 'Variable_name,l', 2: 'Variable_value,r', 3: 'TYPE,l', 4:'Enabled,r'}
-        f_print_query_table(conn, title, query, style,save_as)
-
-    conn.close()
-    f_print_ending(save_as)
\ No newline at end of file
+            args = tuple(ctx[name] for name in section.args)
+            if section.begin:
+                if (section.begin, section.begin_args) not in begun:
+                    begin_args = tuple(ctx[name] for name in section.begin_args)
+                    begun[(section.begin, section.begin_args)] = (section.begin(conn, *begin_args) if section.needs_conn
+                                                                  else section.begin(*begin_args))
+                args = (begun[(section.begin, section.begin_args)],) + args
+            jobs.append(Job(section.fn, args, section.needs_conn, section.deferred, section.cost, section.option))
+        if COST_ORDER[section.cost] <= guard_cost and any(guard[name] > 0 for name in ('threads_running', 'replica_lag', 'load_per_cpu')):
+            key = '_'.join([dbinfo[0], str(dbinfo[4]), dbinfo[3], section.option]) if section.cacheable else None
+            jobs[-1] = Job(f_print_guarded, (guard, shed, failed, title, section.style, save_as, state_dir, key, jobs[-1]),
+                           True, jobs[-1].deferred, section.cost, section.option)
+
+    repository = f_get_option(config, "repository", "")
+    if repository:
+        jobs.append(Job(f_save_snapshot, (repository, dbinfo), True, True, name='repository'))
+
+    pool = f_get_conn_pool(conn, dbinfo, parallelism)
+    try:
+        costs = f_run_jobs(pool, jobs, parallelism)
+    finally:
+        f_close_conn_pool(pool)
+    if shed or failed:
+        f_print_shed_sections(shed, failed, save_as)
+    if f_get_option(config, "self_cost", "OFF") == 'ON':
+        f_print_self_cost(costs, save_as)
+    self_cost_json = f_get_option(config, "self_cost_json", "")
+    if self_cost_json:
+        f_save_self_cost(costs, os.path.expanduser(self_cost_json))
+    f_print_ending(save_as)
+
+def f_fleet_report(config_file, save_as, out_dir, compress):
+    # one fleet worker process: the report of one instance goes to its own file
+    name = os.path.splitext(os.path.basename(config_file))[0]
+    report_file = os.path.join(out_dir, 'mysql_watcher_' + name + '_' + time.strftime('%Y-%m-%d_%H-%M') + '.' + save_as)
+    if compress:
+        report_file += '.gz'
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    with open(report_file, 'wb') as f:
+        sys.stdout = ReportWriter(f, compress)
+        try:
+            f_print_report(config, save_as)
+        except SystemExit:
+            return config_file, report_file, 'failed'
+        except Exception as e:
+            print (str(e))
+            return config_file, report_file, 'failed'
+        finally:
+            sys.stdout.close()
+            sys.stdout = sys.__stdout__
+    return config_file, report_file, 'ok'
+
+def f_fleet_report_star(args):
+    return f_fleet_report(*args)
+
+def f_get_fleet_files(fleet):
+    # comma separated dbset files and/or directories holding *.ini files
+    config_files = []
+    for item in fleet.split(','):
+        if os.path.isdir(item):
+            config_files.extend(sorted(glob.glob(os.path.join(item, '*.ini'))))
+        elif item:
+            config_files.append(item)
+    return config_files
+
+def f_run_fleet(fleet, save_as, out_dir, fleet_parallelism, compress):
+    config_files = f_get_fleet_files(fleet)
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    pool = multiprocessing.Pool(processes=max(1, min(fleet_parallelism, len(config_files))))
+    try:
+        for config_file, report_file, status in pool.imap_unordered(f_fleet_report_star, [(c, save_as, out_dir, compress) for c in config_files]):
+            print (status.ljust(8) + config_file + ' -> ' + report_file)
+    finally:
+        pool.close()
+        pool.join()
+
+if __name__=="__main__":
+    config_file="dbset.ini"
+    save_as = "txt"
+    fleet = ""
+    out_dir = "."
+    fleet_parallelism = 4
+    daemon = False
+    begin_id = None
+    end_id = None
+    list_snapshots = False
+    compress = False
+
+    opts, args = getopt.getopt(sys.argv[1:], "p:s:f:o:n:db:e:lz")
+    for o,v in opts:
+        if o == "-p":
+            config_file = v
+        elif o == "-s":
+            save_as = v
+        elif o == "-f":
+            fleet = v
+        elif o == "-o":
+            out_dir = v
+        elif o == "-n":
+            fleet_parallelism = int(v)
+        elif o == "-d":
+            daemon = True
+        elif o == "-b":
+            begin_id = int(v)
+        elif o == "-e":
+            end_id = int(v)
+        elif o == "-l":
+            list_snapshots = True
+        elif o == "-z":
+            compress = True
+
+    if fleet:
+        f_run_fleet(fleet, save_as, out_dir, fleet_parallelism, compress)
+    else:
+        sys.stdout = ReportWriter(sys.stdout.buffer, compress)
+        config = configparser.ConfigParser()
+        config.read(config_file)
+        try:
+            if daemon:
+                f_run_daemon(config)
+            elif list_snapshots:
+                f_print_snapshot_list(config.get("option", "repository"), save_as)
+            elif begin_id is not None and end_id is not None:
+                f_print_repository_report(config.get("option", "repository"), begin_id, end_id,
+                                          int(f_get_option(config, "repository_topN", 10)), save_as)
+            else:
+                f_print_report(config, save_as)
+        finally:
+            sys.stdout.close()